@@ -0,0 +1,104 @@
+"""
+Command-line ingestion of many files or whole directories, without going through the API.
+Files are ingested concurrently (bounded by --concurrency) with the same pipeline as the ingestion
+workers, and all their embedding calls share the rate-limited embedding scheduler.
+
+    python app/cli.py ingest docs/ reports/2024.pdf --strategy semantic --concurrency 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+from app.config import settings  # noqa: E402
+from core import database  # noqa: E402
+from core.chunking import CHUNK_STRATEGIES  # noqa: E402
+from core.pipeline import ingest_file  # noqa: E402
+from core.vector_store import VectorStore, get_vector_store  # noqa: E402
+
+EXTENSIONS = (".pdf", ".txt")
+
+
+def iter_files(paths: List[str]) -> Iterator[Tuple[str, str]]:
+    """
+    (path, file_name) of every PDF/TXT file among paths, walking directories recursively.
+    Files found in a directory are named by their path relative to it, so equal base names in
+    different subdirectories stay distinct documents.
+    """
+    for path in paths:
+        if os.path.isfile(path):
+            yield path, os.path.basename(path)
+            continue
+        for directory, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith(EXTENSIONS):
+                    full_path = os.path.join(directory, name)
+                    yield full_path, os.path.relpath(full_path, path).replace(os.sep, "/")
+
+
+def ingest_one(path: str, file_name: str, chunk_strategy: str, tags: List[str], vector_store: VectorStore) -> Dict:
+    db = database.SessionLocal()
+    try:
+        stats = ingest_file(path=path, file_name=file_name, chunk_strategy=chunk_strategy,
+                            vector_store=vector_store, db=db, tags=tags)
+        db.commit()
+        stats.pop("vector_ids")
+        return {"file_name": file_name, "stage": "done", **stats}
+    except Exception as e:
+        db.rollback()
+        return {"file_name": file_name, "stage": "failed", "error": str(e)}
+    finally:
+        db.close()
+
+
+def ingest(paths: List[str], chunk_strategy: str, concurrency: int, tags: List[str]) -> List[Dict]:
+    files = list(iter_files(paths))
+    database.Base.metadata.create_all(bind=database.engine)
+    database.create_indexes()
+    vector_store = get_vector_store()
+    vector_store.connect()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(ingest_one, path, file_name, chunk_strategy, tags, vector_store) for path, file_name in files]
+        for n, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            detail = result.get("error") or f"{result['new_chunks']}/{result['total_chunks']} chunks embedded"
+            print(f"[{n}/{len(files)}] {result['stage']:6} {result['file_name']}: {detail}", file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Palm Mind RAG command-line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ingest_parser = commands.add_parser("ingest", help="ingest PDF/TXT files and directories")
+    ingest_parser.add_argument("paths", nargs="+")
+    ingest_parser.add_argument("--strategy", default="fixed", choices=sorted(CHUNK_STRATEGIES))
+    ingest_parser.add_argument("--concurrency", type=int, default=max(settings.INGEST_WORKERS, 4),
+                               help="files ingested at the same time")
+    ingest_parser.add_argument("--tag", action="append", default=[], dest="tags",
+                               help="label stored with every chunk, usable as a search filter (repeatable)")
+    ingest_parser.add_argument("--output", help="write per-file results as JSON")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = ingest(args.paths, args.strategy, args.concurrency, args.tags)
+    elapsed = time.perf_counter() - started
+    failed = sum(result["stage"] == "failed" for result in results)
+    chunks = sum(result.get("new_chunks", 0) for result in results)
+    print(f"{len(results)} files, {failed} failed, {chunks} chunks embedded in {elapsed:.1f}s", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,105 @@ import os
 class Settings:
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     MAX_TURNS = int(os.getenv("MAX_TURNS", "10"))
+    CHAT_MEMORY_TTL = int(os.getenv("CHAT_MEMORY_TTL", str(7 * 24 * 3600)))  # seconds of inactivity before a session expires
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "your_openai_api_key")
     QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 
+    # Ingestion batching
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "128"))
+    EMBEDDING_BATCH_MAX_CHARS = int(os.getenv("EMBEDDING_BATCH_MAX_CHARS", "200000"))
+    QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", "256"))
+
+    # Streaming ingestion pipeline
+    PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0"))  # 0 = cpu count
+    PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+    INGEST_MAX_INFLIGHT_BATCHES = int(os.getenv("INGEST_MAX_INFLIGHT_BATCHES", "4"))  # per file
+    INGEST_BATCH_THREADS = int(os.getenv("INGEST_BATCH_THREADS", "16"))  # embed/upsert threads shared by all files
+
+    # Embedding scheduler: every ingestion embedding call is packed and paced against the API limits
+    EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "3000"))  # requests per minute
+    EMBEDDING_TPM = float(os.getenv("EMBEDDING_TPM", "1000000"))  # tokens per minute
+    EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))  # requests in flight
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))  # on 429
+    EMBEDDING_LINGER_MS = float(os.getenv("EMBEDDING_LINGER_MS", "20"))  # wait to fill a partial batch
+    EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "600"))  # seconds a caller waits, queueing and retries included
+
+    # Query embeddings of concurrent requests are sent as one request, after the first one waited
+    # QUERY_EMBEDDING_LINGER_MS (0 = no batching) or once QUERY_EMBEDDING_MAX_BATCH texts are waiting
+    QUERY_EMBEDDING_LINGER_MS = float(os.getenv("QUERY_EMBEDDING_LINGER_MS", "5"))
+    QUERY_EMBEDDING_MAX_BATCH = int(os.getenv("QUERY_EMBEDDING_MAX_BATCH", "64"))
+
+    # Embedding cache
+    EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_MAX_ITEMS = int(os.getenv("EMBEDDING_CACHE_MAX_ITEMS", "50000"))
+    EMBEDDING_CACHE_MAX_BYTES = int(os.getenv("EMBEDDING_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+    # Semantic answer cache: answers reused for similar queries that retrieve the same chunks (per process)
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))  # query embedding cosine similarity
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))  # seconds
+    ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "2000"))
+
+    # Retrieval
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")  # vector | hybrid | lexical | auto
+    LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", ".cache/lexical_index.sqlite3")
+
+    # Post-retrieval diversification: none | mmr (maximal marginal relevance) | dedup (overlap-aware)
+    RERANK_METHOD = os.getenv("RERANK_METHOD", "none")
+    RERANK_OVERSAMPLING = int(os.getenv("RERANK_OVERSAMPLING", "4"))  # candidates fetched per returned hit
+    MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))  # 1 = pure relevance, 0 = pure diversity
+    RERANK_DIMS = int(os.getenv("RERANK_DIMS", "0"))  # leading dimensions compared between candidates, 0 = all
+    DEDUP_MAX_OVERLAP = float(os.getenv("DEDUP_MAX_OVERLAP", "0.5"))  # of the shorter chunk's span
+    DEDUP_MAX_SIMILARITY = float(os.getenv("DEDUP_MAX_SIMILARITY", "0.95"))
+
+    # Small-to-big: add this many chunks on each side of every hit to the context, 0 = off
+    NEIGHBOR_WINDOW = int(os.getenv("NEIGHBOR_WINDOW", "0"))
+    MAX_NEIGHBOR_WINDOW = int(os.getenv("MAX_NEIGHBOR_WINDOW", "5"))
+
+    # Vector store backend: "qdrant" (remote) or "local" (in-process memory-mapped index)
+    VECTOR_STORE = os.getenv("VECTOR_STORE", "qdrant")
+    LOCAL_VECTOR_STORE_PATH = os.getenv("LOCAL_VECTOR_STORE_PATH", ".cache/vector_store")
+    LOCAL_VECTOR_STORE_DTYPE = os.getenv("LOCAL_VECTOR_STORE_DTYPE", "float32")  # float32 | float16
+
+    # Qdrant collection: text-embedding-3-small vectors have 1536 dimensions
+    VECTOR_SIZE = int(os.getenv("VECTOR_SIZE", "1536"))
+    QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")  # none | scalar | binary
+    QDRANT_ON_DISK = os.getenv("QDRANT_ON_DISK", "false").lower() == "true"  # keep originals on disk
+    QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", "16"))
+    QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", "100"))
+    QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "128"))
+    QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
+    # Ingestion job queue
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", ".cache/ingest_spool")
+    INGEST_JOB_TTL = int(os.getenv("INGEST_JOB_TTL", str(7 * 24 * 3600)))
+    INGEST_WORKER_LEASE = int(os.getenv("INGEST_WORKER_LEASE", "30"))  # seconds a silent worker keeps its jobs
+    INGEST_BATCH_MAX_FILES = int(os.getenv("INGEST_BATCH_MAX_FILES", "500"))  # files per /ingest/batch request
+
+    # Uploads are streamed to the spool directory in bounded chunks
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+    # Prompt assembly
+    CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
+    SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-3.5-turbo")
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+    PROMPT_CONTEXT_SHARE = float(os.getenv("PROMPT_CONTEXT_SHARE", "0.6"))
+    SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+
+    # Shared clients: the API lifespan opens one connection to OpenAI, Redis and Qdrant before serving
+    WARM_CONNECTIONS = os.getenv("WARM_CONNECTIONS", "true").lower() == "true"
+
+    # Keyset-paginated listings and streamed exports
+    PAGE_SIZE = int(os.getenv("PAGE_SIZE", "100"))
+    MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+    EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))  # rows per query and streamed chunk
+
+    # Observability
+    SERVER_TIMING = os.getenv("SERVER_TIMING", "false").lower() == "true"  # add a Server-Timing header to responses
+
 settings = Settings()
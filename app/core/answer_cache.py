@@ -0,0 +1,152 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+from app.config import settings
+from core import metrics
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    chunk_ids: FrozenSet[str]
+    documents: FrozenSet[str]
+    expires_at: float
+
+
+class AnswerCache:
+    """
+    In-process semantic cache of generated answers, keyed by query embedding and retrieved context.
+    A query is answered from the cache when an entry's query embedding has cosine similarity >= threshold
+    with it and the entry was generated from exactly the chunks the query retrieved; since chunk ids are
+    derived from the chunk text, a changed document can never serve an answer built from its old text.
+    Entries expire after ttl seconds and the least recently used one is evicted when the cache is full.
+    The normalized query embeddings live in one preallocated matrix, so a lookup is a single
+    matrix-vector product over all entries.
+    """
+
+    def __init__(self, max_items: int = settings.ANSWER_CACHE_MAX_ITEMS, ttl: float = settings.ANSWER_CACHE_TTL,
+                 threshold: float = settings.ANSWER_CACHE_THRESHOLD):
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError("The answer cache threshold must be in (0, 1].")
+        self.max_items = max_items
+        self.ttl = ttl
+        self.threshold = threshold
+        self._vectors: Optional[np.ndarray] = None  # allocated on the first put, once the dimension is known
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()  # slot -> entry, least recently used first
+        self._free: List[int] = []
+        self._by_document: Dict[str, Set[int]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = {"lru": 0, "expired": 0, "invalidated": 0}
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _drop(self, slot: int, reason: str) -> None:
+        entry = self._entries.pop(slot)
+        self._vectors[slot] = 0.0  # similarity 0: never above the threshold again
+        self._free.append(slot)
+        for document in entry.documents:
+            slots = self._by_document.get(document)
+            if slots is not None:
+                slots.discard(slot)
+                if not slots:
+                    del self._by_document[document]
+        self.evictions[reason] += 1
+
+    def get(self, query_vector: List[float], chunk_ids: Iterable[str]) -> Optional[CachedAnswer]:
+        """ The freshest matching entry generated from exactly chunk_ids, most similar first """
+        chunk_ids = frozenset(chunk_ids)
+        with self._lock:
+            if self._entries and len(query_vector) == self._vectors.shape[1]:
+                similarity = self._vectors @ self._normalize(query_vector)
+                candidates = np.flatnonzero(similarity >= self.threshold)
+                now = time.time()
+                for slot in candidates[np.argsort(-similarity[candidates])].tolist():
+                    entry = self._entries.get(slot)
+                    if entry is None:
+                        continue
+                    if entry.expires_at <= now:
+                        self._drop(slot, "expired")
+                    elif entry.chunk_ids == chunk_ids:
+                        self._entries.move_to_end(slot)
+                        self.hits += 1
+                        return entry
+            self.misses += 1
+            return None
+
+    def put(self, query_vector: List[float], chunk_ids: Iterable[str], documents: Iterable[str], answer: str) -> None:
+        """ Remember an answer generated from the chunks chunk_ids of the documents `documents` """
+        vector = self._normalize(query_vector)
+        entry = CachedAnswer(answer, frozenset(chunk_ids), frozenset(documents), time.time() + self.ttl)
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._reset(len(vector))
+            if self._free:
+                slot = self._free.pop()
+            else:
+                self._drop(next(iter(self._entries)), "lru")
+                slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._entries[slot] = entry
+            for document in entry.documents:
+                self._by_document.setdefault(document, set()).add(slot)
+
+    def invalidate_documents(self, file_names: Iterable[str]) -> int:
+        """ Drop the answers generated from any chunk of these documents; returns how many were dropped """
+        with self._lock:
+            slots = set()
+            for file_name in file_names:
+                slots |= self._by_document.get(file_name, set())
+            for slot in slots:
+                self._drop(slot, "invalidated")
+            return len(slots)
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._vectors is not None:
+                self._reset(self._vectors.shape[1])
+
+    def _reset(self, dims: int) -> None:
+        self._vectors = np.zeros((self.max_items, dims), dtype=np.float32)
+        self._entries.clear()
+        self._free = list(range(self.max_items - 1, -1, -1))
+        self._by_document.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "items": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": dict(self.evictions),
+        }
+
+
+answer_cache = AnswerCache()
+
+
+def _collect_cache_metrics():
+    """ Expose the cache's own counters at scrape time, keeping lookups free of metric updates """
+    stats = answer_cache.stats()
+    yield "# HELP rag_answer_cache_lookups_total Semantic answer cache lookups by result"
+    yield "# TYPE rag_answer_cache_lookups_total counter"
+    for result in ("hits", "misses"):
+        yield f'rag_answer_cache_lookups_total{{result="{result}"}} {stats[result]}'
+    yield "# HELP rag_answer_cache_evictions_total Answers dropped from the cache by reason"
+    yield "# TYPE rag_answer_cache_evictions_total counter"
+    for reason, count in stats["evictions"].items():
+        yield f'rag_answer_cache_evictions_total{{reason="{reason}"}} {count}'
+    yield "# HELP rag_answer_cache_items Answers held in the cache"
+    yield "# TYPE rag_answer_cache_items gauge"
+    yield f"rag_answer_cache_items {stats['items']}"
+
+
+metrics.register_collector(_collect_cache_metrics)
@@ -1,8 +1,133 @@
-from typing import List
-import re 
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+import re
+
+from core.tokens import token_offsets
+
+CHUNK_STRATEGIES = ("fixed", "semantic", "token")
+
+# (start, end) character offsets of a chunk in the original text
+Span = Tuple[int, int]
+
+_PARAGRAPH = re.compile(r'[^\n]+')
+
+
+class Chunk(NamedTuple):
+    text: str
+    start: int
+    end: int
+
+
+def _strip_span(text: str, start: int, end: int) -> Span:
+    """ Shrink a span so it does not start or end with whitespace """
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def fixed_spans(text_length: int, chunk_size: int = 500, overlap: int = 50) -> List[Span]:
+    """
+     Offsets of fixed size chunks; computed from the length alone, no text is copied
+
+
+     args:
+        text_length (int): The length of the text to be chunked
+        chunk_size (int): The size of each chunk
+        overlap (int): The number of overlapping characters between chunks
+
+    returns:
+        List[Span]: (start, end) offsets of each chunk
+    """
+
+    spans = []
+    start = 0
+    step = max(chunk_size - overlap, 1)
+
+    while start < text_length:
+        spans.append((start, min(start + chunk_size, text_length)))
+        start += step
+    return spans
+
+
+def semantic_spans(text: str, min_chunk_size: int = 200, max_chunk_size: int = 1000) -> List[Span]:
+    """
+    Offsets of chunks split by paragraphs/sentences, kept between min and max size.
+    Single pass over the paragraph boundaries; a chunk covers the original text between its
+    first and last paragraph, so its length includes the newlines between them.
+
+    args:
+        text (str): text to be chunked
+        min_chunk_size (int): The minimum size of each chunk
+        max_chunk_size (int): The maximum size of each chunk
+
+    returns:
+        List[Span]: (start, end) offsets of each chunk
+    """
+
+    spans = []
+    start = end = None
+
+    for paragraph in _PARAGRAPH.finditer(text):
+        p_start, p_end = paragraph.span()
+        if start is None:
+            start, end = p_start, p_end
+        elif p_end - start <= max_chunk_size:
+            end = p_end
+        elif end - start >= min_chunk_size:
+            spans.append((start, end))
+            start, end = p_start, p_end
+        else:
+            end = p_end
+
+        while end - start > max_chunk_size:
+            split_point = text.rfind('.', start, start + max_chunk_size)
+            if split_point == -1 or split_point - start < min_chunk_size:
+                split_point = start + max_chunk_size - 1
+            spans.append(_strip_span(text, start, split_point + 1))
+            start, _ = _strip_span(text, split_point + 1, end)
+
+    if start is not None and end > start:
+        spans.append((start, end))
+
+    return spans
+
+
+def token_spans(text: str, max_tokens: int = 512, overlap_tokens: int = 64) -> List[Span]:
+    """
+    Offsets of chunks holding at most max_tokens embedding-model tokens each,
+    so chunks line up with the embedding input limit instead of a character count.
+
+    args:
+        text (str): text to be chunked
+        max_tokens (int): The maximum number of tokens in each chunk
+        overlap_tokens (int): The number of overlapping tokens between chunks
+
+    returns:
+        List[Span]: (start, end) offsets of each chunk
+    """
+
+    offsets = token_offsets(text)
+    spans = []
+    step = max(max_tokens - overlap_tokens, 1)
+
+    for first in range(0, len(offsets), step):
+        last = first + max_tokens
+        end = offsets[last] if last < len(offsets) else len(text)
+        spans.append(_strip_span(text, offsets[first], end))
+        if last >= len(offsets):
+            break
+    return spans
+
+
+def materialize(text: str, spans: Iterable[Span]) -> Iterator[str]:
+    """ Lazily turn spans into chunk strings """
+    for start, end in spans:
+        yield text[start:end]
+
 
 def fixed_chunk(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
-    """ 
+    """
      Split text into fixed size chunks
 
 
@@ -15,22 +140,11 @@ def fixed_chunk(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str
         List[str]: A list of text chunks
     """
 
-    chunks = []
-    start = 0
-    text_length = len(text)
-
-    while start < text_length:
-        end = start + chunk_size
-        chunk = text[start:end]
-        chunks.append(chunk)
-        start = end - overlap
-        if start < 0:
-            start = 0
-    return chunks
+    return list(materialize(text, fixed_spans(len(text), chunk_size, overlap)))
 
 
 def semantic_chunk(text: str, min_chunk_size: int = 200, max_chunk_size: int = 1000) -> List[str]:
-    """ 
+    """
     Split text into semantically by paragraphs/sentences while keeping chunks between min and max size.
 
     args:
@@ -42,55 +156,121 @@ def semantic_chunk(text: str, min_chunk_size: int = 200, max_chunk_size: int = 1
         List[str]: list of semantically split text chunks.
     """
 
-    paragraphs = re.split(r'\n+', text)
-    chunks = []
-    current_chunk = ""
+    return list(materialize(text, semantic_spans(text, min_chunk_size, max_chunk_size)))
 
-    for paragraph in paragraphs:
-        if len(current_chunk) + len(paragraph) + 1 <= max_chunk_size:
-            if current_chunk:
-                current_chunk += "\n" + paragraph
-            else:
-                current_chunk = paragraph
-        else:
-            if len(current_chunk) >= min_chunk_size:
-                chunks.append(current_chunk)
-                current_chunk = paragraph
-            else:
-                if current_chunk:
-                    current_chunk += "\n" + paragraph
-                else:
-                    current_chunk = paragraph
 
-            while len(current_chunk) > max_chunk_size:
-                split_point = current_chunk.rfind('.', 0, max_chunk_size)
-                if split_point == -1 or split_point < min_chunk_size:
-                    split_point = max_chunk_size
-                chunks.append(current_chunk[:split_point + 1].strip())
-                current_chunk = current_chunk[split_point + 1:].strip()
+def token_chunk(text: str, max_tokens: int = 512, overlap_tokens: int = 64) -> List[str]:
+    """
+    Split text into chunks of at most max_tokens tokens.
+
+    args:
+        text (str): text to be chunked
+        max_tokens (int): The maximum number of tokens in each chunk
+        overlap_tokens (int): The number of overlapping tokens between chunks
+
+    returns:
+        List[str]: list of token-bounded text chunks.
+    """
+
+    return list(materialize(text, token_spans(text, max_tokens, overlap_tokens)))
 
-    if current_chunk:
-        chunks.append(current_chunk)
 
-    return chunks
+def chunk_spans(text: str, strategy: str = "fixed", **kwargs) -> List[Span]:
+    """
+    main interface for chunk offsets using different strategies.
+
+    args:
+        text (str): The text to be chunked
+        strategy (str): The chunking strategy to use ("fixed", "semantic" or "token")
+        **kwargs: Additional arguments for the chunking function
+
+    returns:
+        List[Span]: (start, end) offsets of each chunk
+    """
+
+    if strategy == "fixed":
+        return fixed_spans(len(text), **kwargs)
+    elif strategy == "semantic":
+        return semantic_spans(text, **kwargs)
+    elif strategy == "token":
+        return token_spans(text, **kwargs)
+    else:
+        raise ValueError("Invalid chunking strategy. Use 'fixed', 'semantic' or 'token'.")
 
 
 def chunk_text(text: str, strategy: str = "fixed", **kwargs) -> List[str]:
-    """ 
+    """
     main interface for chunking text using different strategies.
 
     args:
         text (str): The text to be chunked
-        strategy (str): The chunking strategy to use ("fixed" or "semantic")
+        strategy (str): The chunking strategy to use ("fixed", "semantic" or "token")
         **kwargs: Additional arguments for the chunking function
 
     returns:
         List[str]: A list of text chunks
     """
 
+    return list(materialize(text, chunk_spans(text, strategy, **kwargs)))
+
+
+def _stream_boundary(buffer: str, strategy: str) -> int:
+    """ Position up to which the buffer can be chunked without seeing the following text """
     if strategy == "fixed":
-        return fixed_chunk(text, **kwargs)
-    elif strategy == "semantic":
-        return semantic_chunk(text, **kwargs)
-    else:
-        raise ValueError("Invalid chunking strategy. Use 'fixed' or 'semantic'.")
\ No newline at end of file
+        return len(buffer)
+    if strategy == "semantic":
+        return buffer.rfind("\n")
+    return max(buffer.rfind(" "), buffer.rfind("\n"))
+
+
+def stream_chunks(blocks: Iterable[str], strategy: str = "fixed", window: int = 64 * 1024,
+                  max_buffer: int = 1024 * 1024, **kwargs) -> Iterator[Chunk]:
+    """
+    Incrementally chunk text that arrives in blocks (e.g. PDF pages).
+    Once the buffer holds `window` characters, it is chunked up to the last position where no chunk can
+    depend on the following text; the chunks ending before that position are final and are yielded
+    with their offsets in the whole document, the same chunks chunk_text returns for the whole text.
+    The buffer is then cut at the start of the first chunk kept, so memory does not grow with the document.
+    Semantic and token input without a newline (or space) for `max_buffer` characters is cut there anyway.
+
+    args:
+        blocks (Iterable[str]): text blocks in document order
+        strategy (str): The chunking strategy to use ("fixed", "semantic" or "token")
+        window (int): buffered characters that trigger chunking
+        max_buffer (int): buffered characters at which the buffer is chunked even without a boundary
+        **kwargs: Additional arguments for the chunking function
+
+    returns:
+        Iterator[Chunk]: chunks with document offsets, yielded as soon as they are complete
+    """
+
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError("Invalid chunking strategy. Use 'fixed', 'semantic' or 'token'.")
+
+    buffer = ""
+    offset = 0  # document offset of buffer[0]
+
+    for block in blocks:
+        buffer += block
+        if len(buffer) < window:
+            continue
+        boundary = _stream_boundary(buffer, strategy)
+        if boundary <= 0:
+            if len(buffer) < max_buffer:
+                continue
+            boundary = len(buffer)
+        spans = chunk_spans(buffer[:boundary], strategy, **kwargs)
+        # The last chunk may grow with the following text, and a chunk reaching the boundary may be cut by it
+        final = 0
+        while final < len(spans) - 1 and spans[final][1] < boundary:
+            final += 1
+        if not final:
+            continue
+        for start, end in spans[:final]:
+            yield Chunk(buffer[start:end], offset + start, offset + end)
+        carry = spans[final][0]
+        buffer = buffer[carry:]
+        offset += carry
+
+    for start, end in chunk_spans(buffer, strategy, **kwargs):
+        yield Chunk(buffer[start:end], offset + start, offset + end)
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, List
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+
+    from core.memory import RedisChatMemory
+    from core.vector_store import VectorStore
+
+
+class ClientRegistry:
+    """
+    The process-wide network clients, created on first use and shared by every module: one OpenAI
+    connection pool (sync and async) and one Qdrant client pair per process instead of one per module.
+    The SDKs are imported by the factories, so importing the app, the CLI or a benchmark does not pay
+    for openai / qdrant_client until a client is needed. The API's lifespan warms the registry before
+    serving and closes it on shutdown.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # factories may use other clients (the vector store uses Qdrant)
+        self._clients: Dict[str, Any] = {}
+
+    def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = factory()
+        return client
+
+    @property
+    def openai(self) -> "OpenAI":
+        def create():
+            from openai import OpenAI
+            return OpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._get("openai", create)
+
+    @property
+    def aopenai(self) -> "AsyncOpenAI":
+        def create():
+            from openai import AsyncOpenAI
+            return AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+        return self._get("aopenai", create)
+
+    @property
+    def qdrant(self) -> "QdrantClient":
+        def create():
+            from qdrant_client import QdrantClient
+            return QdrantClient(url=settings.QDRANT_URL)
+        return self._get("qdrant", create)
+
+    @property
+    def aqdrant(self) -> "AsyncQdrantClient":
+        def create():
+            from qdrant_client import AsyncQdrantClient
+            return AsyncQdrantClient(url=settings.QDRANT_URL)
+        return self._get("aqdrant", create)
+
+    @property
+    def vector_store(self) -> "VectorStore":
+        """ Vector store selected by settings.VECTOR_STORE ("qdrant" or "local") """
+        def create():
+            if settings.VECTOR_STORE == "local":
+                from core.vector_store import LocalVectorStore
+                return LocalVectorStore()
+            from core.qdrant_client import QdrantClientWrapper
+            return QdrantClientWrapper()
+        return self._get("vector_store", create)
+
+    @property
+    def chat_memory(self) -> "RedisChatMemory":
+        def create():
+            from core.memory import RedisChatMemory
+            return RedisChatMemory()
+        return self._get("chat_memory", create)
+
+    async def awarm(self) -> List[str]:
+        """
+        Create the clients the API uses and connect the vector store, before the first request pays for it.
+        With settings.WARM_CONNECTIONS, also open one connection to OpenAI and Redis (and Qdrant's async
+        client); those are best effort, failures are returned as warnings rather than raised.
+        """
+        vector_store = self.vector_store
+        memory = self.chat_memory
+        for name in ("openai", "aopenai"):
+            getattr(self, name)  # imports the SDK and builds the clients (TLS context included)
+        await asyncio.to_thread(vector_store.connect)
+        if not settings.WARM_CONNECTIONS:
+            return []
+
+        async def warm(name, connect):
+            try:
+                await connect()
+            except Exception as e:
+                return f"{name}: {e}"
+
+        probes = [warm("redis", memory.aping), warm("openai", self._awarm_openai)]
+        if settings.VECTOR_STORE == "qdrant":
+            probes.append(warm("qdrant", self.aqdrant.get_collections))
+        return [warning for warning in await asyncio.gather(*probes) if warning]
+
+    async def _awarm_openai(self) -> None:
+        from openai import APIStatusError
+        try:
+            await self.aopenai.with_options(max_retries=0, timeout=10.0).models.list()
+        except APIStatusError:
+            pass  # any HTTP answer (e.g. a key without model access) leaves the connection pooled
+
+    async def aclose(self) -> None:
+        """ Close every client created so far; they are created again if used afterwards """
+        with self._lock:
+            created, self._clients = self._clients, {}
+        if "chat_memory" in created:
+            created["chat_memory"].close()
+            await created["chat_memory"].aclose()
+        if "vector_store" in created:
+            await created["vector_store"].aclose()
+        for name in ("openai", "qdrant"):
+            if name in created:
+                created[name].close()
+        for name in ("aopenai", "aqdrant"):
+            if name in created:
+                await created[name].close()
+
+        from core.memory import adisconnect_pools
+        await adisconnect_pools()
+
+
+clients = ClientRegistry()
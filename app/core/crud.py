@@ -1,5 +1,8 @@
-from sqlalchemy.orm import Session
-from typing import List, Dict
+from datetime import datetime
+from sqlalchemy import Row, Select, and_, insert, delete, select, tuple_, update
+from sqlalchemy.orm import Session, aliased
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+from app.config import settings
 from core import models
 
 # ---------------- Document Metadata ----------------
@@ -9,22 +12,160 @@ def save_document_metadata(
     chunks: List[str],
     vector_ids: List[str],
     chunk_strategy: str,
-    additional_metadata: Dict = None
-) -> None:
-    for idx, (chunk, vec_id) in enumerate(zip(chunks, vector_ids)):
-        db_obj = models.DocumentMetadata(
-            file_name=file_name,
-            chunk_text=chunk,
-            chunk_index=idx,
-            vector_id=vec_id,
-            chunk_strategy=chunk_strategy,
-            additional_metadata=additional_metadata or {}
+    additional_metadata: Dict = None,
+    start_index: int = 0,
+    spans: Optional[List[Tuple[int, int]]] = None,
+    chunk_indices: Optional[List[int]] = None
+) -> List[int]:
+    """
+    Bulk insert all chunk rows of a document.
+    Bypasses the ORM unit of work: rows are sent as multi-row INSERT ... RETURNING statements,
+    and the generated ids are returned in chunk order.
+    `spans` are the (start, end) offsets of each chunk in the document, stored as citation offsets.
+    Chunks are numbered from start_index, or by `chunk_indices` when they are not contiguous.
+    """
+    rows = [
+        {
+            "file_name": file_name,
+            "chunk_text": chunk,
+            "chunk_index": idx,
+            "vector_id": vec_id,
+            "chunk_strategy": chunk_strategy,
+            "additional_metadata": additional_metadata or {},
+        }
+        for idx, (chunk, vec_id) in zip(
+            chunk_indices or range(start_index, start_index + len(chunks)), zip(chunks, vector_ids)
         )
-        db.add(db_obj)
+    ]
+    if spans:
+        for row, (start, end) in zip(rows, spans):
+            row["additional_metadata"] = {**row["additional_metadata"], "start": start, "end": end}
+    if not rows:
+        return []
+    stmt = insert(models.DocumentMetadata).returning(models.DocumentMetadata.id, sort_by_parameter_order=True)
+    return list(db.scalars(stmt, rows))
 
 
-def get_document_chunks(db: Session, file_name: str) -> List[models.DocumentMetadata]:
-    return db.query(models.DocumentMetadata).filter_by(file_name=file_name).order_by(models.DocumentMetadata.chunk_index).all()
+def delete_document_metadata(db: Session, file_name: str) -> int:
+    """ Bulk delete all chunk rows of a document in one statement, returns the number of rows deleted """
+    stmt = delete(models.DocumentMetadata).where(models.DocumentMetadata.file_name == file_name)
+    return db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+
+
+def delete_chunks_by_vector_ids(db: Session, vector_ids: List[str]) -> int:
+    """ Bulk delete chunk rows by their Qdrant vector ids, returns the number of rows deleted """
+    if not vector_ids:
+        return 0
+    stmt = delete(models.DocumentMetadata).where(models.DocumentMetadata.vector_id.in_(vector_ids))
+    return db.execute(stmt, execution_options={"synchronize_session": False}).rowcount
+
+
+def get_chunk_positions(db: Session, file_name: str) -> Dict[str, Tuple[int, int, Optional[int], Optional[int]]]:
+    """ vector id -> (row id, chunk index, start, end) of every stored chunk of a document """
+    stmt = select(
+        models.DocumentMetadata.vector_id,
+        models.DocumentMetadata.id,
+        models.DocumentMetadata.chunk_index,
+        models.DocumentMetadata.additional_metadata
+    ).where(models.DocumentMetadata.file_name == file_name)
+    return {
+        vector_id: (row_id, chunk_index, (meta or {}).get("start"), (meta or {}).get("end"))
+        for vector_id, row_id, chunk_index, meta in db.execute(stmt)
+    }
+
+
+def update_chunk_positions(db: Session, positions: List[Tuple[int, int, int, int]]) -> None:
+    """ Bulk update (row id, chunk index, start, end) of chunks that moved within their document """
+    if not positions:
+        return
+    rows = db.execute(
+        select(models.DocumentMetadata.id, models.DocumentMetadata.additional_metadata)
+        .where(models.DocumentMetadata.id.in_([row_id for row_id, _, _, _ in positions]))
+    ).all()
+    metadata = dict(rows)
+    db.execute(
+        update(models.DocumentMetadata),
+        [
+            {"id": row_id, "chunk_index": index,
+             "additional_metadata": {**(metadata.get(row_id) or {}), "start": start, "end": end}}
+            for row_id, index, start, end in positions
+        ],
+        execution_options={"synchronize_session": False}
+    )
+
+
+def get_document(db: Session, file_name: str) -> Optional[models.Document]:
+    return db.scalars(select(models.Document).where(models.Document.file_name == file_name)).first()
+
+
+def save_document(db: Session, file_name: str, content_hash: str, chunk_strategy: str, total_chunks: int) -> models.Document:
+    """ Record the content hash of the last ingested version of a document """
+    document = get_document(db, file_name)
+    if document is None:
+        document = models.Document(file_name=file_name)
+        db.add(document)
+    document.content_hash = content_hash
+    document.chunk_strategy = chunk_strategy
+    document.total_chunks = total_chunks
+    db.flush()
+    return document
+
+
+def _iter_keyset(db: Session, query: Callable[[Optional[tuple]], Select], key: Callable[[Row], tuple],
+                 batch_size: int) -> Iterator[List[Row]]:
+    """ Pages of a keyset-ordered query, each fetched by seeking past the previous page's last key """
+    after = None
+    while True:
+        rows = db.execute(query(after).limit(batch_size)).all()
+        if rows:
+            yield rows
+        if len(rows) < batch_size:
+            return
+        after = key(rows[-1])
+
+
+def document_chunks_query(file_name: str, after: Optional[Tuple[int, int]] = None) -> Select:
+    """
+    Chunks of a document ordered by (chunk_index, id), starting after that key; a range scan of
+    ix_document_metadata_file_name_chunk_index however deep the page.
+    """
+    chunk = models.DocumentMetadata
+    stmt = select(chunk.id, chunk.chunk_index, chunk.vector_id, chunk.chunk_strategy, chunk.chunk_text,
+                  chunk.additional_metadata).where(chunk.file_name == file_name)
+    if after is not None:
+        stmt = stmt.where(tuple_(chunk.chunk_index, chunk.id) > tuple_(*after))
+    return stmt.order_by(chunk.chunk_index, chunk.id)
+
+
+def get_document_chunks(db: Session, file_name: str, limit: Optional[int] = None,
+                        after: Optional[Tuple[int, int]] = None) -> List[Row]:
+    """ Up to `limit` chunk rows of a document after the (chunk_index, id) key `after`, all of them by default """
+    stmt = document_chunks_query(file_name, after)
+    return db.execute(stmt.limit(limit) if limit else stmt).all()
+
+
+def iter_document_chunks(db: Session, file_name: str, batch_size: int = settings.EXPORT_BATCH_SIZE) -> Iterator[List[Row]]:
+    return _iter_keyset(db, lambda after: document_chunks_query(file_name, after),
+                        lambda row: (row.chunk_index, row.id), batch_size)
+
+
+def get_chunk_neighbors(db: Session, vector_ids: List[str], window: int) -> List[Row]:
+    """
+    The chunks within `window` chunk indexes of each of the chunks vector_ids (included), in one query
+    however many ids: a self-join from the vector_id index to ix_document_metadata_file_name_chunk_index.
+    Rows are ordered by (file_name, chunk_index); chunks near several hits come back once per hit.
+    """
+    if not vector_ids:
+        return []
+    hit, chunk = aliased(models.DocumentMetadata), models.DocumentMetadata
+    stmt = (
+        select(chunk.vector_id, chunk.file_name, chunk.chunk_index, chunk.chunk_text, chunk.additional_metadata)
+        .join(hit, and_(hit.file_name == chunk.file_name,
+                        chunk.chunk_index.between(hit.chunk_index - window, hit.chunk_index + window)))
+        .where(hit.vector_id.in_(vector_ids))
+        .order_by(chunk.file_name, chunk.chunk_index)
+    )
+    return db.execute(stmt).all()
 
 
 # ---------------- Interview Booking ----------------
@@ -49,9 +190,33 @@ def save_booking(
     return booking
 
 
-def get_bookings(db: Session, email: str = None) -> List[models.InterviewBooking]:
-    query = db.query(models.InterviewBooking)
+def bookings_query(email: Optional[str] = None, after: Optional[Tuple[datetime, int]] = None,
+                   full: bool = False) -> Select:
+    """
+    Bookings ordered by (interview_date, id), starting after that key. The listing columns (id, name,
+    interview_date, time_slot) are covered by the booking indexes, so on Postgres a page is an index-only
+    scan; `full` selects every column (exports), an index scan without a sort.
+    """
+    booking = models.InterviewBooking
+    columns = [booking.id, booking.name, booking.interview_date, booking.time_slot]
+    if full:
+        columns += [booking.email, booking.notes, booking.created_at]
+    stmt = select(*columns)
     if email:
-        query = query.filter_by(email=email)
-    return query.order_by(models.InterviewBooking.interview_date).all()
+        stmt = stmt.where(booking.email == email)
+    if after is not None:
+        stmt = stmt.where(tuple_(booking.interview_date, booking.id) > tuple_(*after))
+    return stmt.order_by(booking.interview_date, booking.id)
+
+
+def get_bookings(db: Session, email: str = None, limit: Optional[int] = None,
+                 after: Optional[Tuple[datetime, int]] = None) -> List[Row]:
+    """ Up to `limit` bookings (listing columns) after the (interview_date, id) key `after`, all of them by default """
+    stmt = bookings_query(email, after)
+    return db.execute(stmt.limit(limit) if limit else stmt).all()
+
+
+def iter_bookings(db: Session, email: str = None, batch_size: int = settings.EXPORT_BATCH_SIZE) -> Iterator[List[Row]]:
+    return _iter_keyset(db, lambda after: bookings_query(email, after, full=True),
+                        lambda row: (row.interview_date, row.id), batch_size)
 
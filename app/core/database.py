@@ -1,7 +1,7 @@
 from sqlalchemy import create_engine
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.orm import sessionmaker, declarative_base, Session
 from sqlalchemy.exc import SQLAlchemyError
-from contextlib import contextmanager
 import os
 
 # Load from environment variables
@@ -11,21 +11,25 @@ POSTGRES_DB = os.getenv("POSTGRES_DB", "rag_system")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
 
-DATABASE_URL = (
+# DATABASE_URL overrides the POSTGRES_* settings, e.g. sqlite:///bench.db for local runs
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}"
 )
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True)
+# SQLite connections are shared with the ingestion worker threads
+connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, future=True, connect_args=connect_args)
 
 # Use future=True for SQLAlchemy 2.0 style
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, class_=Session)
 
 Base = declarative_base()
 
-@contextmanager
 def get_db() -> Session:
     """
     Yield a SQLAlchemy session and ensure proper closing/rollback.
+    Used as a FastAPI dependency, which drives the generator itself.
     """
     db = SessionLocal()
     try:
@@ -37,3 +41,32 @@ def get_db() -> Session:
     finally:
         db.close()
 
+
+def create_indexes() -> None:
+    """
+    Create the models' indexes that existing tables lack (create_all only indexes the tables it creates).
+    On Postgres they are built CONCURRENTLY, so a large table keeps taking writes meanwhile.
+    A concurrent build that failed leaves an INVALID index behind, which IF NOT EXISTS would
+    skip on every later start, so those are dropped and built again.
+    """
+    postgres = engine.dialect.name == "postgresql"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        invalid = _invalid_indexes(connection) if postgres else set()
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+                if postgres:
+                    if index.name in invalid:
+                        print(f"Rebuilding invalid index {index.name}")
+                        connection.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+                    ddl = ddl.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+                connection.exec_driver_sql(ddl)
+
+
+def _invalid_indexes(connection) -> set:
+    """ Names of the indexes in the current schema that Postgres marks INVALID (pg_index.indisvalid) """
+    rows = connection.exec_driver_sql(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid AND c.relnamespace = current_schema()::regnamespace"
+    )
+    return {row[0] for row in rows}
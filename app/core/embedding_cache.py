@@ -0,0 +1,177 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from app.config import settings
+from core import metrics
+
+
+def normalize_text(text: str) -> str:
+    """ Normalize text so trivially different copies (whitespace, unicode form) share a cache entry """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def make_key(model: str, text: str) -> bytes:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier, content-addressed embedding cache.
+    - memory: in-process LRU bounded by item count
+    - disk: SQLite file bounded by total vector bytes, least recently used rows evicted first
+    """
+
+    def __init__(self, path: str = settings.EMBEDDING_CACHE_PATH,
+                 max_memory_items: int = settings.EMBEDDING_CACHE_MAX_ITEMS,
+                 max_disk_bytes: int = settings.EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._lru: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key BLOB PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ix_embeddings_last_access ON embeddings (last_access)")
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings").fetchone()[0]
+        return self._db
+
+    def _remember(self, key: bytes, vector: List[float]) -> None:
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_memory_items:
+            self._lru.popitem(last=False)
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, List[float]]:
+        """ Look up keys in memory, then on disk; returns only the keys that were found """
+        found: Dict[bytes, List[float]] = {}
+        with self._lock:
+            missing = []
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+                    self.memory_hits += 1
+                else:
+                    missing.append(key)
+
+            if missing:
+                db = self._get_db()
+                rows = []
+                # Stay below SQLite's bound parameter limit
+                for i in range(0, len(missing), 500):
+                    part = missing[i:i + 500]
+                    rows += db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                    ).fetchall()
+                now = time.time()
+                for key, blob in rows:
+                    vector = array("f", blob).tolist()
+                    found[key] = vector
+                    self._remember(key, vector)
+                if rows:
+                    db.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows])
+                    db.commit()
+                self.disk_hits += len(rows)
+                self.misses += len(missing) - len(rows)
+        return found
+
+    def put_many(self, items: Dict[bytes, List[float]]) -> None:
+        if not items:
+            return
+        with self._lock:
+            db = self._get_db()
+            now = time.time()
+            rows = [(key, array("f", vector).tobytes(), now) for key, vector in items.items()]
+            # Replaced rows no longer count towards the stored bytes
+            keys = list(items)
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                self._disk_bytes -= db.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchone()[0]
+            db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)", rows)
+            self._disk_bytes += sum(len(blob) for _, blob, _ in rows)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict(db)
+            db.commit()
+            for key, vector in items.items():
+                self._remember(key, vector)
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        """ Drop least recently used rows until the store is back under 90% of its byte budget """
+        target = int(self.max_disk_bytes * 0.9)
+        while self._disk_bytes > target:
+            rows = db.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_access LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            evicted = []
+            for key, size in rows:
+                evicted.append((key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= target:
+                    break
+            db.executemany("DELETE FROM embeddings WHERE key = ?", evicted)
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_items": len(self._lru),
+            "disk_bytes": self._disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+embedding_cache = EmbeddingCache()
+
+
+def _collect_cache_metrics():
+    """ Expose the cache's own counters at scrape time, keeping lookups free of metric updates """
+    stats = embedding_cache.stats()
+    yield "# HELP rag_embedding_cache_lookups_total Embedding cache lookups by result"
+    yield "# TYPE rag_embedding_cache_lookups_total counter"
+    for result in ("memory_hits", "disk_hits", "misses"):
+        yield f'rag_embedding_cache_lookups_total{{result="{result}"}} {stats[result]}'
+    yield "# HELP rag_embedding_cache_memory_items Vectors held in the in-memory LRU"
+    yield "# TYPE rag_embedding_cache_memory_items gauge"
+    yield f"rag_embedding_cache_memory_items {stats['memory_items']}"
+    yield "# HELP rag_embedding_cache_disk_bytes Vector bytes stored in the SQLite tier"
+    yield "# TYPE rag_embedding_cache_disk_bytes gauge"
+    yield f"rag_embedding_cache_disk_bytes {stats['disk_bytes']}"
+
+
+metrics.register_collector(_collect_cache_metrics)
@@ -0,0 +1,276 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from app.config import settings
+from core import metrics
+from core.tokens import count_tokens
+
+retries_total = metrics.counter("rag_embedding_retries_total", "Embedding requests retried after a 429")
+query_batch_size = metrics.histogram("rag_query_embedding_batch_size",
+                                     "Distinct query texts per batched embeddings request",
+                                     buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+query_queue_wait = metrics.histogram("rag_query_embedding_queue_wait_seconds",
+                                     "Time a query embedding waited for its batch to be sent")
+
+
+class TokenBucket:
+    """
+    Reservation-based token bucket refilled continuously at rate_per_minute, holding at most one
+    minute of budget. A reservation always succeeds and may leave the bucket in debt; the caller
+    waits the returned time before sending, so concurrent callers queue up fairly.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """ Take amount tokens, returning the seconds to wait before they may be used """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+
+class _Request:
+    __slots__ = ("texts", "model", "results", "remaining", "future")
+
+    def __init__(self, texts: List[str], model: str):
+        self.texts = texts
+        self.model = model
+        self.results: List[Optional[List[float]]] = [None] * len(texts)
+        self.remaining = len(texts)
+        self.future: Future = Future()
+
+
+class EmbeddingScheduler:
+    """
+    Process-wide scheduler for embedding API calls.
+    Callers on any thread submit lists of texts; a dispatcher thread packs texts from different
+    callers (e.g. the last partial batches of many small files) into full requests, paces them
+    with requests-per-minute and tokens-per-minute token buckets, and keeps at most
+    max_concurrency requests in flight. 429 responses are retried with exponential backoff (or the
+    server's Retry-After), pausing all dispatch meanwhile.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str], str], List[List[float]]],
+        requests_per_minute: float = settings.EMBEDDING_RPM,
+        tokens_per_minute: float = settings.EMBEDDING_TPM,
+        max_items: int = settings.EMBEDDING_BATCH_SIZE,
+        max_chars: int = settings.EMBEDDING_BATCH_MAX_CHARS,
+        max_concurrency: int = settings.EMBEDDING_MAX_CONCURRENCY,
+        max_retries: int = settings.EMBEDDING_MAX_RETRIES,
+        linger: float = settings.EMBEDDING_LINGER_MS / 1000,
+        timeout: float = settings.EMBEDDING_TIMEOUT
+    ):
+        self.embed_fn = embed
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self.max_retries = max_retries
+        self.linger = linger
+        self.timeout = timeout
+        self._queue: Deque[Tuple[_Request, int]] = deque()
+        self._cond = threading.Condition()
+        self._slots = threading.Semaphore(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embed")
+        self._thread: Optional[threading.Thread] = None
+        self._paused_until = 0.0
+
+    def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        if not texts:
+            return []
+        future = self.submit(texts, model)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()  # texts still queued are then sent for nobody; their results are dropped
+            raise TimeoutError(f"Embedding request not answered within {self.timeout:.0f}s.") from None
+
+    def submit(self, texts: List[str], model: str) -> Future:
+        request = _Request(texts, model)
+        with self._cond:
+            self._queue.extend((request, i) for i in range(len(texts)))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name="embedding-scheduler", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return request.future
+
+    def reserve(self, texts: List[str], model: str) -> float:
+        """ Account for a request sent outside the scheduler (e.g. async query embeddings); returns the wait """
+        tokens = sum(count_tokens(text, model=model) for text in texts)
+        wait = max(self.requests.reserve(1), self.tokens.reserve(tokens))
+        return max(wait, self._paused_until - time.monotonic())
+
+    def _next_batch(self) -> Tuple[str, List[Tuple[_Request, int]]]:
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            # Give other callers a moment to fill the batch
+            self._cond.wait_for(lambda: len(self._queue) >= self.max_items, timeout=self.linger)
+            model = self._queue[0][0].model
+            batch: List[Tuple[_Request, int]] = []
+            chars = 0
+            while self._queue and len(batch) < self.max_items:
+                request, i = self._queue[0]
+                length = len(request.texts[i])
+                if request.model != model or (batch and chars + length > self.max_chars):
+                    break
+                batch.append(self._queue.popleft())
+                chars += length
+            return model, batch
+
+    def _dispatch(self) -> None:
+        while True:
+            model, batch = self._next_batch()
+            self._slots.acquire()
+            try:
+                texts = [request.texts[i] for request, i in batch]
+                wait = self.reserve(texts, model)
+                if wait > 0:
+                    time.sleep(wait)
+                self._pool.submit(self._send, model, texts, batch)  # _send releases the slot
+            except Exception as e:
+                # Fail this batch's callers, but keep the dispatcher (and the slot) for the next ones
+                self._slots.release()
+                self._fail(batch, e)
+
+    def _fail(self, batch: List[Tuple[_Request, int]], error: Exception) -> None:
+        with self._cond:
+            for request, _ in batch:
+                if not request.future.done():
+                    request.future.set_exception(error)
+
+    def _send(self, model: str, texts: List[str], batch: List[Tuple[_Request, int]]) -> None:
+        try:
+            vectors = self._call_with_retries(texts, model)
+            with self._cond:
+                for (request, i), vector in zip(batch, vectors):
+                    request.results[i] = vector
+                    request.remaining -= 1
+                    if request.remaining == 0 and not request.future.done():
+                        request.future.set_result(request.results)
+        except Exception as e:
+            self._fail(batch, e)
+        finally:
+            self._slots.release()
+
+    def _call_with_retries(self, texts: List[str], model: str) -> List[List[float]]:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.timed("embedding_request"):
+                    return self.embed_fn(texts, model)
+            except Exception as e:
+                # openai.RateLimitError, matched by status so the SDK is only imported by the client registry
+                if getattr(e, "status_code", None) != 429 or attempt == self.max_retries:
+                    raise
+                delay = _retry_after(e) or min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+                retries_total.inc()
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                time.sleep(delay)
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class QueryEmbeddingBatcher:
+    """
+    Cross-request micro-batching of query embeddings, the event loop counterpart of EmbeddingScheduler.
+    Texts of concurrent callers are collected for `linger` seconds after the first one arrives, or until
+    max_batch texts are waiting, then sent as one request per model through `send`, and each caller gets
+    its own vectors back. Identical texts in a batch are embedded once. A failed request fails every
+    caller in its batch. Used from a single event loop.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[List[str], str], Awaitable[List[List[float]]]],
+        linger: float = settings.QUERY_EMBEDDING_LINGER_MS / 1000,
+        max_batch: int = settings.QUERY_EMBEDDING_MAX_BATCH
+    ):
+        self.send = send
+        self.linger = linger
+        self.max_batch = max_batch
+        self._pending: List[Tuple[List[str], str, asyncio.Future, float]] = []  # texts, model, future, queued at
+        self._pending_texts = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()  # batches in flight, referenced so they are not garbage collected
+
+    async def embed(self, texts: List[str], model: str) -> List[List[float]]:
+        if not texts:
+            return []
+        if self.linger <= 0:
+            return await self.send(texts, model)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, model, future, time.perf_counter()))
+        self._pending_texts += len(texts)
+        if self._pending_texts >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending, self._pending_texts = self._pending, [], 0
+        by_model: Dict[str, List[Tuple[List[str], str, asyncio.Future, float]]] = {}
+        for item in pending:
+            by_model.setdefault(item[1], []).append(item)
+        for model, items in by_model.items():
+            # Callers are never split, so a caller with more than max_batch texts gets a batch of its own
+            batch, size = [], 0
+            for item in items:
+                if batch and size + len(item[0]) > self.max_batch:
+                    self._start(model, batch)
+                    batch, size = [], 0
+                batch.append(item)
+                size += len(item[0])
+            self._start(model, batch)
+
+    def _start(self, model: str, batch: List[Tuple[List[str], str, asyncio.Future, float]]) -> None:
+        task = asyncio.get_running_loop().create_task(self._send(model, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, model: str, batch: List[Tuple[List[str], str, asyncio.Future, float]]) -> None:
+        now = time.perf_counter()
+        texts = list(dict.fromkeys(text for item in batch for text in item[0]))
+        query_batch_size.observe(len(texts))
+        for _, _, _, queued_at in batch:
+            query_queue_wait.observe(now - queued_at)
+        try:
+            vectors = dict(zip(texts, await self.send(texts, model)))
+        except Exception as e:
+            for _, _, future, _ in batch:
+                if not future.done():  # done: the caller was cancelled meanwhile
+                    future.set_exception(e)
+            return
+        for item_texts, _, future, _ in batch:
+            if not future.done():
+                future.set_result([vectors[text] for text in item_texts])
@@ -1,50 +1,109 @@
-from typing import List, Dict
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import VectorParams, Distance, PointStruct
-from openai import OpenAI
-import uuid
+from typing import Any, Callable, List, Dict, Iterable, Iterator, Tuple
+import asyncio
 
 from app.config import settings
+from core.clients import clients
+from core.embedding_cache import embedding_cache, make_key
+from core.embedding_scheduler import EmbeddingScheduler, QueryEmbeddingBatcher
+from core.metrics import record_usage
 
-openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
-qdrant_client = QdrantClient(url=settings.QDRANT_URL)
+def generate_embeddings(chunks: list[str], model: str = settings.EMBEDDING_MODEL) -> list[list[float]]:
+    """ Generate embeddings for a list of text chunks using OpenAI, serving repeats from the embedding cache """
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return _create_embeddings(chunks, model)
 
-COLLECTION_NAME = "documents"
+    keys, cached, missing = _cache_lookup(chunks, model)
+    if missing:
+        _cache_store(cached, missing, _create_embeddings(list(missing.values()), model))
+    return [cached[key] for key in keys]
 
-def init_collection(vector_size: int = 1535):
-    """ Initialize Qdrant collection for storing embeddings """
-    qdrant_client.recreate_collection(
-        collection_name=COLLECTION_NAME,
-        vectors_config=VectorParams(size=vector_size, distance=Distance.COSINE)
-    )
+
+async def agenerate_embeddings(chunks: list[str], model: str = settings.EMBEDDING_MODEL) -> list[list[float]]:
+    """ Async variant of generate_embeddings """
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return await _acreate_embeddings(chunks, model)
+
+    # The cache's SQLite tier is blocking I/O: keep it off the event loop
+    keys, cached, missing = await asyncio.to_thread(_cache_lookup, chunks, model)
+    if missing:
+        await asyncio.to_thread(_cache_store, cached, missing, await _acreate_embeddings(list(missing.values()), model))
+    return [cached[key] for key in keys]
+
+
+def _cache_lookup(chunks: list[str], model: str) -> Tuple[List[bytes], Dict[bytes, List[float]], Dict[bytes, str]]:
+    keys = [make_key(model, chunk) for chunk in chunks]
+    cached = embedding_cache.get_many(set(keys))
+
+    # Only embed distinct texts that are not cached yet
+    missing: Dict[bytes, str] = {}
+    for key, chunk in zip(keys, chunks):
+        if key not in cached and key not in missing:
+            missing[key] = chunk
+    return keys, cached, missing
 
 
-def generate_embeddings(chunks: list[str], model: str = "text-embedding-3-small") -> list[list[float]]:
-    """ Generate embeddings for a list of text chunks using OpenAI """
-    response = openai_client.embeddings.create(
+def _cache_store(cached: Dict[bytes, List[float]], missing: Dict[bytes, str], embeddings: list[list[float]]) -> None:
+    fresh = dict(zip(missing.keys(), embeddings))
+    embedding_cache.put_many(fresh)
+    cached.update(fresh)
+
+
+def _request_embeddings(chunks: list[str], model: str) -> list[list[float]]:
+    # The scheduler retries 429s itself, pausing all dispatch, so this request does not retry
+    response = clients.openai.with_options(max_retries=0).embeddings.create(
         input=chunks,
         model=model,
         encoding_format="float"
     )
+    record_usage(model, response.usage)
     return [item.embedding for item in response.data]
 
 
+embedding_scheduler = EmbeddingScheduler(_request_embeddings)
+
+
+def _create_embeddings(chunks: list[str], model: str) -> list[list[float]]:
+    """ Embed through the shared scheduler, packed with other callers' texts and paced to the rate limits """
+    return embedding_scheduler.embed(chunks, model)
+
 
-def store_embeddings(chunks: list[str], metadata: Dict = None,
-                     model: str = "text-embedding-3-small") -> list[str]:
-    """ Generate and store embeddings in Qdrant """
-    embeddings = generate_embeddings(chunks, model=model)
-    vector_ids = [str(uuid.uuid4()) for _ in chunks]
-    points = [
-        PointStruct(
-            id=vector_ids[i],
-            vector=embeddings[i],
-            payload={"text": chunks[i], **(metadata or {})}
-        ) for i in range(len(chunks))
-    ]
-    qdrant_client.upsert(
-        collection_name=COLLECTION_NAME,
-        points=points
+async def _arequest_embeddings(chunks: list[str], model: str) -> list[list[float]]:
+    # Query embeddings skip the ingestion packing queue (latency matters) but still draw from the same budget.
+    # Reserving counts the texts' tokens and takes the limiter lock: keep it off the event loop
+    wait = await asyncio.to_thread(embedding_scheduler.reserve, chunks, model)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    response = await clients.aopenai.embeddings.create(
+        input=chunks,
+        model=model,
+        encoding_format="float"
     )
-    return vector_ids
\ No newline at end of file
+    record_usage(model, response.usage)
+    return [item.embedding for item in response.data]
+
+
+query_batcher = QueryEmbeddingBatcher(_arequest_embeddings)
+
+
+async def _acreate_embeddings(chunks: list[str], model: str) -> list[list[float]]:
+    """ Embed through the query micro-batcher: concurrent requests share one API call and one rate-limit slot """
+    return await query_batcher.embed(chunks, model)
+
+
+def iter_batches(chunks: Iterable[Any], max_items: int = settings.EMBEDDING_BATCH_SIZE,
+                 max_chars: int = settings.EMBEDDING_BATCH_MAX_CHARS,
+                 length: Callable[[Any], int] = len) -> Iterator[list]:
+    """ Yield size-bounded batches of chunks, capped by item count and total characters """
+    batch: list = []
+    batch_chars = 0
+    for chunk in chunks:
+        chunk_chars = length(chunk)
+        if batch and (len(batch) >= max_items or batch_chars + chunk_chars > max_chars):
+            yield batch
+            batch = []
+            batch_chars = 0
+        batch.append(chunk)
+        batch_chars += chunk_chars
+    if batch:
+        yield batch
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import redis
+import redis.asyncio as aredis
+
+from app.config import settings
+from core import database
+from core.pipeline import ingest_file
+from core.vector_store import get_vector_store
+
+QUEUE_KEY = "ingest:queue"
+PROCESSING_KEY = "ingest:processing"  # single processing list of earlier versions, drained at startup
+MAX_BACKOFF = 30.0  # seconds between retries while Redis is unreachable
+
+
+def _processing_key(worker_id: str) -> str:
+    return f"{PROCESSING_KEY}:{worker_id}"
+
+
+def _lease_key(worker_id: str) -> str:
+    return f"ingest:worker:{worker_id}"
+
+
+def _job_key(job_id: str) -> str:
+    return f"ingest:job:{job_id}"
+
+
+def _batch_key(batch_id: str) -> str:
+    return f"ingest:batch:{batch_id}"
+
+
+def _job_fields(job_id: str, file_name: str, path: str, chunk_strategy: str, content_hash: Optional[str],
+                tags: Optional[List[str]]) -> Dict:
+    return {
+        "job_id": job_id,
+        "file_name": file_name,
+        "path": path,
+        "chunk_strategy": chunk_strategy,
+        "content_hash": content_hash or "",
+        "tags": json.dumps(tags or []),
+        "stage": "queued",
+        "chunks_done": 0,
+        "created_at": time.time(),
+    }
+
+
+class IngestJobQueue:
+    """
+    Redis-backed ingestion job queue processed by a bounded pool of workers.
+    Jobs move atomically from the queue list to the taking worker's processing list (BLMOVE). Every
+    worker holds a lease key it renews while it runs; at startup, the processing lists of workers whose
+    lease expired (in any process) were interrupted and are re-queued, those of live workers are left alone.
+    Uploaded files are spooled to INGEST_SPOOL_DIR until their job finishes.
+    """
+
+    def __init__(self, redis_url: str = settings.REDIS_URL, workers: int = settings.INGEST_WORKERS):
+        self.redis_url = redis_url
+        self.workers = workers
+        self._aredis: Optional[aredis.Redis] = None
+        self._redis: Optional[redis.Redis] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def _get_aredis(self) -> aredis.Redis:
+        if self._aredis is None:
+            self._aredis = aredis.from_url(self.redis_url, decode_responses=True)
+        return self._aredis
+
+    def _get_redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        return self._redis
+
+    def spool_path(self, job_id: str, file_name: str) -> str:
+        os.makedirs(settings.INGEST_SPOOL_DIR, exist_ok=True)
+        return os.path.join(settings.INGEST_SPOOL_DIR, f"{job_id}_{os.path.basename(file_name)}")
+
+    async def enqueue(self, job_id: str, file_name: str, path: str, chunk_strategy: str,
+                      content_hash: Optional[str] = None, tags: Optional[List[str]] = None) -> None:
+        r = self._get_aredis()
+        await r.hset(_job_key(job_id), mapping=_job_fields(job_id, file_name, path, chunk_strategy, content_hash, tags))
+        await r.rpush(QUEUE_KEY, job_id)
+
+    async def enqueue_batch(self, batch_id: str, jobs: List[Tuple[str, str, str, Optional[str]]],
+                            chunk_strategy: str, tags: Optional[List[str]] = None) -> None:
+        """
+        Queue (job_id, file_name, path, content_hash) jobs in one round trip and record them under
+        batch_id. The workers interleave them with other jobs as usual.
+        """
+        async with self._get_aredis().pipeline(transaction=True) as pipe:
+            for job_id, file_name, path, content_hash in jobs:
+                pipe.hset(_job_key(job_id), mapping=_job_fields(job_id, file_name, path, chunk_strategy, content_hash, tags))
+            pipe.rpush(_batch_key(batch_id), *[job[0] for job in jobs])
+            pipe.expire(_batch_key(batch_id), settings.INGEST_JOB_TTL)
+            pipe.rpush(QUEUE_KEY, *[job[0] for job in jobs])
+            await pipe.execute()
+
+    async def get_batch(self, batch_id: str) -> Optional[Dict]:
+        """ Per-stage job counts and the status of every job of a batch """
+        job_ids = await self._get_aredis().lrange(_batch_key(batch_id), 0, -1)
+        if not job_ids:
+            return None
+        jobs = [job for job in await asyncio.gather(*(self.get(job_id) for job_id in job_ids)) if job]
+        stages: Dict[str, int] = {}
+        for job in jobs:
+            stages[job["stage"]] = stages.get(job["stage"], 0) + 1
+        return {"batch_id": batch_id, "total": len(job_ids), "stages": stages, "jobs": jobs}
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        job = await self._get_aredis().hgetall(_job_key(job_id))
+        if not job:
+            return None
+        job.pop("path", None)
+        job.pop("content_hash", None)
+        job["chunks_done"] = int(job["chunks_done"])
+        job["tags"] = json.loads(job.get("tags") or "[]")
+        for key in ("created_at", "started_at", "finished_at"):
+            if key in job:
+                job[key] = float(job[key])
+        if "result" in job:
+            job["result"] = json.loads(job["result"])
+        job["queue_position"] = None
+        if job["stage"] == "queued":
+            position = await self._get_aredis().lpos(QUEUE_KEY, job_id)
+            job["queue_position"] = position
+        return job
+
+    async def requeue_interrupted(self) -> int:
+        """ Move the jobs of workers whose lease expired back to the head of the queue, returns how many """
+        r = self._get_aredis()
+        keys = [PROCESSING_KEY]
+        async for key in r.scan_iter(match=_processing_key("*")):
+            if not await r.exists(_lease_key(key[len(PROCESSING_KEY) + 1:])):
+                keys.append(key)
+        moved = 0
+        for key in keys:
+            while await r.lmove(key, QUEUE_KEY, "RIGHT", "LEFT"):
+                moved += 1
+        return moved
+
+    async def start(self) -> None:
+        """ Re-queue interrupted jobs and start the workers """
+        await self.requeue_interrupted()
+        self._stopping = False
+        prefix = uuid.uuid4().hex[:12]
+        self._tasks = [asyncio.create_task(self._worker(f"{prefix}-{i}")) for i in range(self.workers)]
+
+    async def stop(self) -> None:
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._aredis:
+            await self._aredis.aclose()
+            self._aredis = None
+        if self._redis:
+            self._redis.close()
+            self._redis = None
+
+    async def _renew_lease(self, worker_id: str) -> None:
+        """ Keep the worker's lease alive while it runs a job """
+        r = self._get_aredis()
+        while True:
+            await asyncio.sleep(settings.INGEST_WORKER_LEASE / 3)
+            try:
+                await r.set(_lease_key(worker_id), 1, ex=settings.INGEST_WORKER_LEASE)
+            except redis.RedisError as e:
+                print(f"Ingestion worker {worker_id} could not renew its lease: {e}")
+
+    async def _worker(self, worker_id: str) -> None:
+        """
+        Take jobs from the queue until stopped. Redis errors are reported and retried with backoff.
+        A job is removed from the processing list only once it finished: when the worker is cancelled
+        while its job thread still runs, the job stays there and is re-queued after the lease expires.
+        A job whose run lost Redis is marked failed and removed as soon as Redis answers again.
+        """
+        r = self._get_aredis()
+        processing = _processing_key(worker_id)
+        backoff = 0.0
+        finished: Optional[Tuple[str, Optional[str]]] = None  # (job_id, error) still in the processing list
+        while not self._stopping:
+            try:
+                await r.set(_lease_key(worker_id), 1, ex=settings.INGEST_WORKER_LEASE)
+                if finished is not None:
+                    await self._finish(processing, *finished)
+                    finished = None
+                job_id = await r.blmove(QUEUE_KEY, processing, timeout=5, src="LEFT", dest="RIGHT")
+                if job_id is not None:
+                    renew = asyncio.create_task(self._renew_lease(worker_id))
+                    try:
+                        await asyncio.to_thread(self._run, job_id)
+                        finished = (job_id, None)
+                    except redis.RedisError as e:
+                        print(f"Ingestion worker {worker_id} lost Redis while running job {job_id}: {e}")
+                        finished = (job_id, f"Ingestion failed: lost Redis: {e}")
+                    finally:
+                        renew.cancel()
+                    await self._finish(processing, *finished)
+                    finished = None
+                backoff = 0.0
+            except redis.RedisError as e:
+                backoff = min(max(2 * backoff, 1.0), MAX_BACKOFF)
+                print(f"Ingestion worker {worker_id} lost Redis, retrying in {backoff:.0f}s: {e}")
+                await asyncio.sleep(backoff)
+
+    async def _finish(self, processing: str, job_id: str, error: Optional[str]) -> None:
+        """
+        Remove a job that ran from the processing list. With an error, a job left without a final
+        stage is marked failed first and its spooled file removed.
+        """
+        r = self._get_aredis()
+        if error is not None:
+            key = _job_key(job_id)
+            stage, path = await r.hmget(key, ["stage", "path"])
+            if stage is not None and stage not in ("done", "failed"):
+                await r.hset(key, mapping={"stage": "failed", "error": error, "finished_at": time.time()})
+            await r.expire(key, settings.INGEST_JOB_TTL)
+            if path and os.path.exists(path):
+                os.remove(path)
+        await r.lrem(processing, 1, job_id)
+
+    def _run(self, job_id: str) -> None:
+        """ Process one job on a worker thread; the pipeline itself is blocking code """
+        r = self._get_redis()
+        key = _job_key(job_id)
+        job = r.hgetall(key)
+        if not job:
+            return
+        r.hset(key, mapping={"stage": "processing", "started_at": time.time(), "chunks_done": 0})
+
+        db = database.SessionLocal()
+        try:
+            stats = ingest_file(
+                path=job["path"],
+                file_name=job["file_name"],
+                chunk_strategy=job["chunk_strategy"],
+                vector_store=get_vector_store(),
+                db=db,
+                on_progress=lambda done: r.hset(key, "chunks_done", done),
+                content_hash=job.get("content_hash") or None,
+                tags=json.loads(job.get("tags") or "[]"),
+                uploaded_at=datetime.fromtimestamp(float(job["created_at"]), timezone.utc)
+            )
+            db.commit()
+            stats.pop("vector_ids")
+            if stats["total_chunks"]:
+                r.hset(key, mapping={"stage": "done", "result": json.dumps(stats)})
+            else:
+                r.hset(key, mapping={"stage": "failed", "error": "No text extracted from file."})
+        except Exception as e:
+            db.rollback()
+            r.hset(key, mapping={"stage": "failed", "error": f"Ingestion failed: {e}"})
+        finally:
+            db.close()
+            r.hset(key, "finished_at", time.time())
+            r.expire(key, settings.INGEST_JOB_TTL)
+            if os.path.exists(job["path"]):
+                os.remove(job["path"])
+
+
+ingest_queue = IngestJobQueue()
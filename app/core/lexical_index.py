@@ -0,0 +1,118 @@
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+
+# Keeps codes such as "AB-1234" or "v2.1" together as one term
+_TERM = re.compile(r"\w+(?:[-.]\w+)*")
+
+# FTS5 splits the space-joined terms of tokenize() back into the same terms
+_FTS_TOKENIZER = "unicode61 remove_diacritics 0 tokenchars '-._'"
+
+
+def tokenize(text: str) -> List[str]:
+    return _TERM.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Local BM25 inverted index over ingested chunks, stored in an SQLite FTS5 table.
+    Chunks are indexed and removed incrementally at ingest time, each call in its own transaction, so
+    every worker process searches the current index and concurrent writers do not overwrite each other.
+    Ranked with FTS5's bm25() (k1 = 1.2, b = 0.75).
+    """
+
+    def __init__(self, path: str = settings.LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+    def _get_db(self) -> sqlite3.Connection:
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (id INTEGER PRIMARY KEY, vector_id TEXT NOT NULL UNIQUE, chunk TEXT NOT NULL)"
+            )
+            self._db.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(terms, tokenize=\"{_FTS_TOKENIZER}\")"
+            )
+            self._db.commit()
+        return self._db
+
+    def add(self, vector_ids: List[str], chunks: List[str]) -> None:
+        """ Index chunks under their vector ids """
+        with self._lock:
+            db = self._get_db()
+            with db:
+                for vector_id, chunk in zip(vector_ids, chunks):
+                    cursor = db.execute("INSERT OR IGNORE INTO chunks (vector_id, chunk) VALUES (?, ?)", (vector_id, chunk))
+                    if not cursor.rowcount:
+                        continue  # content-derived ids: this chunk is already indexed
+                    db.execute("INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)",
+                               (cursor.lastrowid, " ".join(tokenize(chunk))))
+
+    def remove(self, vector_ids: List[str]) -> None:
+        """ Drop the chunks indexed under these vector ids """
+        with self._lock:
+            db = self._get_db()
+            with db:
+                for i in range(0, len(vector_ids), 500):
+                    part = vector_ids[i:i + 500]
+                    placeholders = ",".join("?" * len(part))
+                    db.execute(f"DELETE FROM chunk_terms WHERE rowid IN "
+                               f"(SELECT id FROM chunks WHERE vector_id IN ({placeholders}))", part)
+                    db.execute(f"DELETE FROM chunks WHERE vector_id IN ({placeholders})", part)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, float, str]]:
+        """ Return up to top_k (vector_id, score, chunk) tuples ranked by BM25 """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._get_db().execute(
+                "SELECT chunks.vector_id, -bm25(chunk_terms), chunks.chunk FROM chunk_terms "
+                "JOIN chunks ON chunks.id = chunk_terms.rowid "
+                "WHERE chunk_terms MATCH ? ORDER BY bm25(chunk_terms) LIMIT ?",
+                (match, top_k)
+            ).fetchall()
+        return [(vector_id, score, chunk) for vector_id, score, chunk in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """ Fuse several ranked id lists: score(id) = sum over lists of 1 / (k + rank) """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def is_keyword_query(query: str) -> bool:
+    """
+    Heuristic for exact-term lookups (product codes, names) that lexical search answers
+    without an embedding call: quoted queries, or at most three terms with a code-like term.
+    """
+    stripped = query.strip()
+    if len(stripped) > 1 and stripped[0] == stripped[-1] and stripped[0] in "\"'":
+        return True
+    words = stripped.split()
+    if not words or len(words) > 3 or stripped.endswith("?"):
+        return False
+    return any(any(c.isdigit() for c in w) or (w.isupper() and len(w) > 1) for w in words) or len(words) == 1
+
+
+lexical_index = BM25Index()
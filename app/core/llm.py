@@ -1,30 +1,92 @@
-from openai import OpenAI
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from app.config import settings
+from core.clients import clients
+from core.prompt import build_prompt
+from core.metrics import atimed, observe_stage, record_usage
+
+def build_messages(query: str, context: list[str], history: list[dict],
+                   summary: Optional[str] = None) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Token-budgeted chat messages for a query, plus the token usage chosen for each prompt part.
+    """
+    return build_prompt(query=query, context=context, history=history, summary=summary)
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
 
 def generate_answer(query: str, context: list[str], history: list[dict]) -> str:
     """
     Generate an answer to a query using a language model.
     """
-    system_prompt = (
-        "You are a helpful assistant. Use the following context to answer the user's query."
-        "If you don't know the answer, just say that you don't know."
-        "Don't try to make up an answer."
+    messages, _ = build_messages(query, context, history)
+    response = clients.openai.chat.completions.create(
+        model=settings.CHAT_MODEL,
+        messages=messages,
     )
+    record_usage(settings.CHAT_MODEL, response.usage)
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"Context:\n{''.join(context)}\n\n---\n\nQuery: {query}"},
-    ]
+    return response.choices[0].message.content
 
-    # Add chat history to the prompt
-    for message in history:
-        messages.append(message)
 
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
+async def acomplete(messages: list[dict]) -> str:
+    """
+    Generate an answer for prebuilt messages.
+    """
+    response = await atimed("llm", clients.aopenai.chat.completions.create(
+        model=settings.CHAT_MODEL,
         messages=messages,
+    ))
+    record_usage(settings.CHAT_MODEL, response.usage)
+
+    return response.choices[0].message.content
+
+
+async def astream_completion(messages: list[dict]) -> AsyncIterator[str]:
+    """
+    Stream the answer for prebuilt messages token by token as the completion is generated.
+    """
+    started = time.perf_counter()
+    first_token = True
+    stream = await clients.aopenai.chat.completions.create(
+        model=settings.CHAT_MODEL,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
     )
 
-    return response.choices[0].message.content
\ No newline at end of file
+    async for event in stream:
+        if event.choices and event.choices[0].delta.content:
+            if first_token:
+                observe_stage("llm_first_token", time.perf_counter() - started)
+                first_token = False
+            yield event.choices[0].delta.content
+        record_usage(settings.CHAT_MODEL, event.usage)
+    observe_stage("llm", time.perf_counter() - started)
+
+
+async def agenerate_answer(query: str, context: list[str], history: list[dict], summary: Optional[str] = None) -> str:
+    """
+    Async variant of generate_answer.
+    """
+    messages, _ = build_messages(query, context, history, summary)
+    return await acomplete(messages)
+
+
+async def asummarize(summary: Optional[str], messages: list[dict]) -> str:
+    """
+    Fold older conversation turns into the rolling summary.
+    """
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    response = await atimed("summarize", clients.aopenai.chat.completions.create(
+        model=settings.SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": (
+                "Update the summary of a conversation with the new turns below. "
+                "Keep facts, names, decisions and open questions; be concise."
+            )},
+            {"role": "user", "content": f"Current summary:\n{summary or '(none)'}\n\nNew turns:\n{transcript}"},
+        ],
+        max_tokens=settings.SUMMARY_MAX_TOKENS,
+    ))
+    record_usage(settings.SUMMARY_MODEL, response.usage)
+
+    return response.choices[0].message.content
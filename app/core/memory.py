@@ -1,71 +1,185 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, List, Optional, Literal
+from typing import Awaitable, Callable, Dict, List, Optional, Literal
 import redis
+import redis.asyncio as aredis
 from app.config import settings
+from core.clients import clients
+
+# Messages are stored as one role byte followed by the UTF-8 content. Entries written by the
+# previous JSON encoding start with "{" and are still decoded.
+ROLE_CODES = {"user": 1, "assistant": 2, "system": 3, "tool": 4}
+ROLE_NAMES = {code: role for role, code in ROLE_CODES.items()}
+
+# Connection pools shared by every client of the same Redis URL
+_pools: Dict[str, redis.ConnectionPool] = {}
+_apools: Dict[str, aredis.ConnectionPool] = {}
+
+
+def connection_pool(redis_url: str) -> redis.ConnectionPool:
+    if redis_url not in _pools:
+        _pools[redis_url] = redis.ConnectionPool.from_url(redis_url, max_connections=settings.REDIS_MAX_CONNECTIONS)
+    return _pools[redis_url]
+
+
+def aconnection_pool(redis_url: str) -> aredis.ConnectionPool:
+    if redis_url not in _apools:
+        _apools[redis_url] = aredis.ConnectionPool.from_url(redis_url, max_connections=settings.REDIS_MAX_CONNECTIONS)
+    return _apools[redis_url]
+
+
+async def adisconnect_pools() -> None:
+    """ Close every pooled connection; the pools reconnect if used again """
+    for pool in _pools.values():
+        pool.disconnect()
+    for apool in _apools.values():
+        await apool.disconnect()
+
+
+def encode_message(role: str, content: str) -> bytes:
+    return bytes((ROLE_CODES[role],)) + content.encode("utf-8")
+
+
+def decode_message(raw: bytes) -> Optional[Dict[str, str]]:
+    if not raw:
+        return None
+    role = ROLE_NAMES.get(raw[0])
+    if role is not None:
+        return {"role": role, "content": raw[1:].decode("utf-8")}
+    try:
+        obj = json.loads(raw)
+        if isinstance(obj, dict) and "role" in obj and "content" in obj:
+            return {"role": str(obj["role"]), "content": str(obj["content"])}
+    except Exception:
+        pass
+    return None
+
 
 class RedisChatMemory:
-    def __init__(self, redis_url: str = settings.REDIS_URL, max_turns: int = settings.MAX_TURNS):
+    """
+    Per-session chat history in a capped Redis list, plus a rolling summary of compacted turns.
+    Every write appends, trims and refreshes the session TTL in a single MULTI/EXEC round trip.
+    """
+
+    def __init__(self, redis_url: str = settings.REDIS_URL, max_turns: int = settings.MAX_TURNS,
+                 ttl: int = settings.CHAT_MEMORY_TTL):
         self.redis_url = redis_url
         self.max_turns = max_turns
         self.max_messages = max(2 * self.max_turns, 2)
+        self.ttl = ttl
         self._redis: Optional[redis.Redis] = None
+        self._aredis: Optional[aredis.Redis] = None
 
     def connect(self) -> None:
-        self._redis = redis.from_url(self.redis_url, decode_responses=True)
+        self._redis = redis.Redis(connection_pool=connection_pool(self.redis_url))
 
     def close(self) -> None:
         if self._redis:
             self._redis.close()
+            self._redis = None
+
+    async def aclose(self) -> None:
+        if self._aredis:
+            await self._aredis.aclose()
+            self._aredis = None
+
+    async def aping(self) -> bool:
+        """ Open (or check) a pooled async connection """
+        return await self._get_aredis().ping()
 
     def _get_redis(self) -> redis.Redis:
         if self._redis is None:
             self.connect()
         return self._redis
 
+    def _get_aredis(self) -> aredis.Redis:
+        if self._aredis is None:
+            self._aredis = aredis.Redis(connection_pool=aconnection_pool(self.redis_url))
+        return self._aredis
+
     def _history_key(self, session_id: str) -> str:
         return f"chat:{session_id}:history"
 
+    def _summary_key(self, session_id: str) -> str:
+        return f"chat:{session_id}:summary"
+
+    def _queue_append(self, pipe, session_id: str, messages: List[Dict[str, str]]) -> None:
+        key = self._history_key(session_id)
+        pipe.rpush(key, *[encode_message(m["role"], m["content"]) for m in messages])
+        pipe.ltrim(key, -self.max_messages, -1)
+        pipe.expire(key, self.ttl)
+        pipe.expire(self._summary_key(session_id), self.ttl)
+
     def append_message(self, session_id: str, role: Literal["user", "assistant", "system", "tool"], content: str) -> None:
         """ Append a message to the chat history """
-        r = self._get_redis()
-        item = json.dumps({"role": role, "content": content})
-        r.rpush(self._history_key(session_id), item)
-        r.ltrim(self._history_key(session_id), -self.max_messages, -1)
+        self.append_messages(session_id, [{"role": role, "content": content}])
 
     def append_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
         """ Append multiple messages to the chat history """
         if not messages:
             return
-        r = self._get_redis()
-        items = [json.dumps({"role": m["role"], "content": m["content"]}) for m in messages]
-        r.rpush(self._history_key(session_id), *items)
-        r.ltrim(self._history_key(session_id), -self.max_messages, -1)
+        with self._get_redis().pipeline(transaction=True) as pipe:
+            self._queue_append(pipe, session_id, messages)
+            pipe.execute()
+
+    async def aappend_messages(self, session_id: str, messages: List[Dict[str, str]]) -> None:
+        """ Async variant of append_messages """
+        if not messages:
+            return
+        async with self._get_aredis().pipeline(transaction=True) as pipe:
+            self._queue_append(pipe, session_id, messages)
+            await pipe.execute()
 
-    def _parse_messages(self, raw_messages: List[str]) -> List[Dict[str, str]]:
+    def _parse_messages(self, raw_messages: List[bytes]) -> List[Dict[str, str]]:
         out: List[Dict[str, str]] = []
         for x in raw_messages:
-            try:
-                obj = json.loads(x)
-                if isinstance(obj, dict) and "role" in obj and "content" in obj:
-                    out.append({"role": str(obj["role"]), "content": str(obj["content"])})
-            except Exception:
-                continue
+            message = decode_message(x)
+            if message is not None:
+                out.append(message)
         return out
 
-    def get_history(self, session_id: str) -> List[Dict[str, str]]:
+    def get_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """ The whole history, or only its newest `limit` messages """
         r = self._get_redis()
-        raw = r.lrange(self._history_key(session_id), 0, -1)
+        raw = r.lrange(self._history_key(session_id), -limit if limit else 0, -1)
+        return self._parse_messages(raw)
+
+    async def aget_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """ Async variant of get_history """
+        r = self._get_aredis()
+        raw = await r.lrange(self._history_key(session_id), -limit if limit else 0, -1)
         return self._parse_messages(raw)
 
     def clear_history(self, session_id: str) -> None:
         r = self._get_redis()
-        r.delete(self._history_key(session_id))
+        r.delete(self._history_key(session_id), self._summary_key(session_id))
+
+    async def aget_summary(self, session_id: str) -> Optional[str]:
+        """ Rolling summary of turns compacted out of the history list """
+        summary = await self._get_aredis().get(self._summary_key(session_id))
+        return summary.decode("utf-8") if summary is not None else None
+
+    async def acompact(self, session_id: str, oldest: List[Dict[str, str]], keep_last: int, summary: Optional[str],
+                       summarize: Callable[[Optional[str], List[Dict[str, str]]], Awaitable[str]]) -> None:
+        """
+        Fold the oldest messages into the rolling summary, then keep only the newest keep_last messages.
+        The folded messages are passed in by the caller, since appending may already have trimmed them.
+        """
+        if not oldest:
+            return
+        new_summary = await summarize(summary, oldest)
+        async with self._get_aredis().pipeline(transaction=True) as pipe:
+            pipe.set(self._summary_key(session_id), new_summary, ex=self.ttl)
+            pipe.ltrim(self._history_key(session_id), -max(keep_last, 1), -1)
+            await pipe.execute()
 
     def get_last_n(self, session_id: str, n: int) -> List[Dict[str, str]]:
         if n <= 0:
             return []
-        r = self._get_redis()
-        raw = r.lrange(self._history_key(session_id), -n, -1)
-        return self._parse_messages(raw)
\ No newline at end of file
+        return self.get_history(session_id, limit=n)
+
+
+def get_chat_memory() -> RedisChatMemory:
+    """ Process-wide chat memory, owned by the client registry; usable as a FastAPI dependency """
+    return clients.chat_memory
@@ -0,0 +1,194 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from app.config import settings
+
+T = TypeVar("T")
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow completions
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labelvalues)} {value}"
+
+
+class Histogram:
+    """ Cumulative-bucket histogram; an observation is one bisect and a few additions under a lock """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # label values -> bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0.0] * (len(self.buckets) + 3)
+            series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(labelvalues, list(series)) for labelvalues, series in self._series.items()]
+        for labelvalues, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labelvalues, le)} {cumulative:g}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labelvalues)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.labelnames, labelvalues)} {series[-1]:g}"
+
+
+_metrics: List = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+
+def counter(name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+    metric = Counter(name, documentation, labelnames)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    metric = Histogram(name, documentation, labelnames, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collect: Callable[[], Iterable[str]]) -> None:
+    """ Add exposition lines computed at scrape time, e.g. from counters another module already keeps """
+    _collectors.append(collect)
+
+
+def render() -> str:
+    """ All metrics of this process in the Prometheus text exposition format """
+    lines: List[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collect in _collectors:
+        lines.extend(collect())
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = histogram("rag_stage_seconds", "Duration of ingestion and query stages", ("stage",))
+request_seconds = histogram("rag_http_request_seconds", "HTTP request duration", ("method", "route", "status"))
+tokens_total = counter("rag_openai_tokens_total", "Tokens billed by OpenAI", ("model", "kind"))
+
+# (stage, seconds) recorded while serving the current request, for the Server-Timing header
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_timings", default=None)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    stage_seconds.observe(seconds, stage)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+@contextmanager
+def timed(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+async def atimed(stage: str, awaitable: Awaitable[T]) -> T:
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def record_usage(model: str, usage) -> None:
+    """ Count the tokens of an OpenAI response's `usage` block, if it has one """
+    if usage is None:
+        return
+    if getattr(usage, "completion_tokens", None) is not None:
+        tokens_total.inc(usage.prompt_tokens, model, "prompt")
+        tokens_total.inc(usage.completion_tokens, model, "completion")
+    else:
+        tokens_total.inc(usage.total_tokens, model, "embedding")
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every request by route template and status, and, when SERVER_TIMING is
+    enabled, adding a Server-Timing header with the stages recorded while the request was handled
+    (for streaming responses, the stages that finished before the first byte).
+    Metrics are per process: with several uvicorn workers, scrape each worker.
+    """
+
+    def __init__(self, app, server_timing: bool = settings.SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    entries = timings + [("total", time.perf_counter() - started)]
+                    header = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in entries)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            request_seconds.observe(time.perf_counter() - started, scope["method"],
+                                    getattr(route, "path", "unmatched"), str(status))
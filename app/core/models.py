@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, func
+from sqlalchemy import Column, Index, Integer, String, DateTime, Text, JSON, func
 from sqlalchemy.dialects.postgresql import JSONB
 from core.database import Base
 
@@ -11,17 +11,41 @@ class DocumentMetadata(Base):
     chunk_index = Column(Integer, nullable=False)
     vector_id = Column(String, nullable=False, unique=True)  # Qdrant vector ID
     chunk_strategy = Column(String, nullable=False)
-    additional_metadata = Column(JSONB, nullable=True)  # e.g., author, tags
+    additional_metadata = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # e.g., author, tags
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    __table_args__ = (
+        # A document's chunks in order (keyset pagination, re-ingestion lookups, deletes by file)
+        Index("ix_document_metadata_file_name_chunk_index", "file_name", "chunk_index", "id"),
+    )
+
+
+class Document(Base):
+    __tablename__ = "document"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_name = Column(String, nullable=False, unique=True)
+    content_hash = Column(String(64), nullable=False)  # sha256 of the ingested file
+    chunk_strategy = Column(String, nullable=False)
+    total_chunks = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 
 class InterviewBooking(Base):
     __tablename__ = "interview_booking"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    email = Column(String, nullable=False, index=True)
+    email = Column(String, nullable=False)
     interview_date = Column(DateTime, nullable=False)
     time_slot = Column(String, nullable=False)
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Keyset pagination by (interview_date, id), with or without an email filter. The listed columns are
+    # included, so Postgres answers a page with an index-only scan.
+    __table_args__ = (
+        Index("ix_interview_booking_email_date", "email", "interview_date", "id",
+              postgresql_include=["name", "time_slot"]),
+        Index("ix_interview_booking_date", "interview_date", "id", postgresql_include=["name", "time_slot"]),
+    )
@@ -0,0 +1,90 @@
+from itertools import groupby
+from typing import Dict, List, Optional
+
+from sqlalchemy import Row
+
+from core import crud, database
+from core.vector_store import SearchHit
+
+
+def _stitch(rows: List[Row]) -> str:
+    """
+    Text of consecutive chunks of a document. Chunks are slices of the document text, so a chunk whose
+    span overlaps or touches the text so far only adds what lies past it; chunks whose spans are unknown
+    or leave a gap are joined with a newline.
+    """
+    text, end = "", None
+    for row in rows:
+        metadata = row.additional_metadata or {}
+        start, row_end = metadata.get("start"), metadata.get("end")
+        if not text:
+            text = row.chunk_text
+        elif start is not None and end is not None and start <= end:
+            text += row.chunk_text[end - start:]
+        else:
+            text += "\n" + row.chunk_text
+        end = None if start is None or row_end is None else row_end if end is None else max(end, row_end)
+    return text
+
+
+def merge_windows(hits: List[SearchHit], rows: List[Row]) -> List[SearchHit]:
+    """
+    Merge the hits with their neighbors (crud.get_chunk_neighbors rows): each run of consecutive chunks of
+    a document becomes one hit, the best hit it contains with the run's stitched text as its chunk, so
+    overlapping windows are sent once. The payload's chunk_ids lists the run's chunks. Windows keep the
+    order of their best hit; hits without stored rows are kept as they are.
+    """
+    rank = {hit.id: i for i, hit in enumerate(hits)}
+    windows: Dict[int, SearchHit] = {}  # rank of the window's best hit -> window
+
+    def close(run: List[Row]) -> None:
+        best: Optional[int] = min((rank[row.vector_id] for row in run if row.vector_id in rank), default=None)
+        if best is None:
+            return  # the hit it neighbored is on the other side of a missing chunk
+        first, last = run[0].additional_metadata or {}, run[-1].additional_metadata or {}
+        windows[best] = hits[best]._replace(payload={
+            **hits[best].payload,
+            "chunk": _stitch(run),
+            "chunk_index": run[0].chunk_index,
+            "start": first.get("start"),
+            "end": last.get("end"),
+            "chunk_ids": [row.vector_id for row in run],
+        })
+
+    for _, document_rows in groupby(rows, key=lambda row: row.file_name):
+        run: List[Row] = []
+        for row in document_rows:
+            if run and row.chunk_index == run[-1].chunk_index:
+                continue  # a chunk near several hits is returned once per hit
+            if run and row.chunk_index != run[-1].chunk_index + 1:
+                close(run)
+                run = []
+            run.append(row)
+        if run:
+            close(run)
+
+    found = {row.vector_id for row in rows}
+    for i, hit in enumerate(hits):
+        if hit.id not in found:
+            windows[i] = hit
+    return [windows[i] for i in sorted(windows)]
+
+
+def expand_hits(hits: List[SearchHit], window: int) -> List[SearchHit]:
+    """
+    Small-to-big retrieval: replace the hits by windows of `window` chunks on each side of them, read from
+    Postgres in a single query however many hits there are.
+    """
+    if window <= 0 or not hits:
+        return hits
+    db = database.SessionLocal()
+    try:
+        rows = crud.get_chunk_neighbors(db, [hit.id for hit in hits], window)
+    finally:
+        db.close()
+    return merge_windows(hits, rows)
+
+
+def context_chunk_ids(hits: List[SearchHit]) -> List[str]:
+    """ Ids of every chunk in the context built from the hits, expanded windows included """
+    return [chunk_id for hit in hits for chunk_id in hit.payload.get("chunk_ids", [hit.id])]
@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """ Opaque cursor holding the sort key of the last row of a page """
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> Tuple:
+    """ The sort key of an encode_cursor cursor, converted to `types`; ValueError when it is malformed """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return tuple(datetime.fromisoformat(value) if kind is datetime else kind(value)
+                     for value, kind in zip(values, types))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor.") from None
+
+
+def paginate(rows: List, limit: int, key: Callable[[Any], Sequence[Any]]) -> Tuple[List, Optional[str]]:
+    """
+    Split limit + 1 fetched rows into the page and the cursor of the next one (None on the last page);
+    the extra row only tells whether more rows follow.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    return page, encode_cursor(key(page[-1]))
+
+
+def json_array(pages: Iterable[List[dict]]) -> Iterator[bytes]:
+    """ A JSON array streamed one page of items per chunk, so exports never hold more than a page """
+    yield b"["
+    first = True
+    for page in pages:
+        if not page:
+            continue
+        body = ",".join(json.dumps(item, default=str) for item in page)
+        yield (body if first else "," + body).encode("utf-8")
+        first = False
+    yield b"]"
@@ -0,0 +1,273 @@
+import hashlib
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from core import crud
+from core.answer_cache import answer_cache
+from core.chunking import Chunk, stream_chunks
+from core.utils.pdf import pdf_extract_pages
+from core.utils.txt import txt_extract_blocks
+from core.embeddings import generate_embeddings, iter_batches
+from core.lexical_index import lexical_index
+from core.metrics import observe_stage
+from core.vector_store import VectorStore
+
+# Called on the caller's thread, in document order, once a batch is stored in Qdrant:
+# on_batch(chunk_indices, chunks, vector_ids)
+BatchCallback = Callable[[List[int], List[Chunk], List[str]], None]
+
+# A chunk with its position in the document and its deterministic vector id
+IndexedChunk = Tuple[int, Chunk, str]
+
+# Namespace of the content-derived vector ids (uuid5)
+VECTOR_ID_NAMESPACE = uuid.UUID("6f1c2d0e-8a4b-5c3d-9e7f-1a2b3c4d5e6f")
+
+# Shared by every file being ingested; the embedding scheduler packs their batches into full API requests
+_executor = ThreadPoolExecutor(max_workers=settings.INGEST_BATCH_THREADS, thread_name_prefix="ingest")
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def document_id(file_name: str) -> str:
+    """ Stable id of a document, stored in every chunk's payload for filtering """
+    return str(uuid.uuid5(VECTOR_ID_NAMESPACE, file_name))
+
+
+def chunk_vector_ids(chunks: Iterable[Chunk], namespace: str) -> Iterator[IndexedChunk]:
+    """
+    Number chunks and derive each vector id from the namespace (the file name) and the chunk text,
+    so re-ingesting unchanged content yields the same ids. Repeated texts get an occurrence suffix.
+    """
+    occurrences: Counter = Counter()
+    for index, chunk in enumerate(chunks):
+        digest = hashlib.sha256(chunk.text.encode("utf-8")).hexdigest()
+        occurrence = occurrences[digest]
+        occurrences[digest] += 1
+        yield index, chunk, str(uuid.uuid5(VECTOR_ID_NAMESPACE, f"{namespace}\0{digest}\0{occurrence}"))
+
+
+def _embed_and_upsert(vector_store: VectorStore, items: List[IndexedChunk], payload: Dict) -> Tuple[float, float]:
+    started = time.perf_counter()
+    chunks = [chunk for _, chunk, _ in items]
+    vector_ids = [vector_id for _, _, vector_id in items]
+    embeddings = generate_embeddings([chunk.text for chunk in chunks])
+    embedded = time.perf_counter()
+    vector_store.upsert_vectors(
+        vector_ids=vector_ids,
+        vectors=embeddings,
+        payloads=[
+            {**payload, "chunk": chunk.text, "chunk_index": index, "start": chunk.start, "end": chunk.end}
+            for index, chunk, _ in items
+        ]
+    )
+    lexical_index.add(vector_ids, [chunk.text for chunk in chunks])
+    upserted = time.perf_counter()
+    observe_stage("embed_batch", embedded - started)
+    observe_stage("upsert_batch", upserted - embedded)
+    return embedded - started, upserted - embedded
+
+
+def _timed_iter(items: Iterable, timings: Dict, key: str) -> Iterator:
+    """ Accumulate the time spent producing each item (e.g. extraction + chunking) into timings[key] """
+    iterator = iter(items)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            timings[key] += time.perf_counter() - started
+            return
+        timings[key] += time.perf_counter() - started
+        yield item
+
+
+def ingest_chunks(
+    chunks: Iterable[Chunk],
+    vector_store: VectorStore,
+    on_batch: Optional[BatchCallback] = None,
+    payload: Optional[Dict] = None,
+    max_in_flight: int = settings.INGEST_MAX_INFLIGHT_BATCHES,
+    known_ids: Optional[Set[str]] = None
+) -> Dict:
+    """
+    Embed and upsert chunks as they are produced; `payload` is stored with every chunk's vector.
+    Vector ids are derived from payload["file_name"] and the chunk text, and chunks whose id is in
+    known_ids (already stored) are not embedded again; they are returned under "unchanged".
+    Batches are dispatched to a thread pool while the chunk iterator (and the extraction behind it)
+    keeps running; at most max_in_flight batches are held in memory at once.
+    Stage timings are summed per stage; embedding and upserts of different batches overlap.
+    """
+    started = time.perf_counter()
+    payload = payload or {}
+    known_ids = known_ids or set()
+    timings = {"extract_chunk_seconds": 0.0, "embed_seconds": 0.0, "upsert_seconds": 0.0, "db_seconds": 0.0}
+    time_to_first_vector = None
+    vector_ids: List[str] = []  # every chunk of the document, in order
+    unchanged: List[IndexedChunk] = []
+    new_chunks = 0
+    pending = deque()  # (chunks, future)
+
+    def new_items() -> Iterator[IndexedChunk]:
+        nonlocal new_chunks
+        timed_chunks = _timed_iter(chunks, timings, "extract_chunk_seconds")
+        for item in chunk_vector_ids(timed_chunks, payload.get("file_name", "")):
+            vector_ids.append(item[2])
+            if item[2] in known_ids:
+                unchanged.append(item)
+            else:
+                new_chunks += 1
+                yield item
+
+    def collect_oldest() -> None:
+        nonlocal time_to_first_vector
+        batch, future = pending.popleft()
+        embed_seconds, upsert_seconds = future.result()
+        timings["embed_seconds"] += embed_seconds
+        timings["upsert_seconds"] += upsert_seconds
+        if time_to_first_vector is None:
+            time_to_first_vector = time.perf_counter() - started
+        if on_batch:
+            callback_started = time.perf_counter()
+            on_batch([index for index, _, _ in batch], [chunk for _, chunk, _ in batch], [vector_id for _, _, vector_id in batch])
+            db_seconds = time.perf_counter() - callback_started
+            observe_stage("db_write_batch", db_seconds)
+            timings["db_seconds"] += db_seconds
+
+    try:
+        for batch in iter_batches(new_items(), length=lambda item: len(item[1].text)):
+            pending.append((batch, _executor.submit(_embed_and_upsert, vector_store, batch, payload)))
+            while len(pending) >= max_in_flight:
+                collect_oldest()
+        while pending:
+            collect_oldest()
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+    elapsed = time.perf_counter() - started
+    return {
+        "total_chunks": len(vector_ids),
+        "new_chunks": new_chunks,
+        "unchanged_chunks": len(unchanged),
+        "vector_ids": vector_ids,
+        "unchanged": unchanged,
+        "elapsed_seconds": round(elapsed, 3),
+        "time_to_first_vector": round(time_to_first_vector, 3) if time_to_first_vector is not None else None,
+        "chunks_per_sec": round(len(vector_ids) / elapsed, 2) if elapsed > 0 else None,
+        "timings": {key: round(value, 3) for key, value in timings.items()},
+    }
+
+
+def extract_blocks(path: str, file_name: str) -> Iterator[str]:
+    """ Text of a PDF (page by page) or TXT file (block by block) """
+    if file_name.endswith(".pdf"):
+        return pdf_extract_pages(path)
+    return txt_extract_blocks(path)
+
+
+def ingest_file(
+    path: str,
+    file_name: str,
+    chunk_strategy: str,
+    vector_store: VectorStore,
+    db: Session,
+    on_progress: Optional[Callable[[int], None]] = None,
+    content_hash: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    uploaded_at: Optional[datetime] = None
+) -> Dict:
+    """
+    Extract -> chunk -> embed -> upsert a file, saving chunk metadata to Postgres batch by batch.
+    Re-ingestion is a delta: an unchanged file (same content hash and strategy) is skipped, only new
+    or changed chunks are embedded, moved chunks get their index and offsets refreshed, and chunks
+    no longer in the file are deleted from the vector store, the lexical index and Postgres in bulk.
+    on_progress(chunks_done) is called after each batch is stored. content_hash is the file's sha256
+    when the caller already computed it (e.g. while streaming the upload).
+    Every chunk's payload carries the document fields search filters apply to: file_name,
+    document_id, chunk_strategy, chunk_index, and the tags and upload time of the latest upload.
+    """
+    content_hash = content_hash or file_sha256(path)
+    uploaded = {"tags": sorted(set(tags or ())), "uploaded_at": (uploaded_at or datetime.now(timezone.utc)).isoformat()}
+    payload = {"file_name": file_name, "document_id": document_id(file_name), "chunk_strategy": chunk_strategy, **uploaded}
+
+    document = crud.get_document(db, file_name)
+    if document and document.content_hash == content_hash and document.chunk_strategy == chunk_strategy:
+        vector_store.set_document_payload(file_name, uploaded)
+        return {"document_id": payload["document_id"], "total_chunks": document.total_chunks, "new_chunks": 0,
+                "unchanged_chunks": document.total_chunks, "deleted_chunks": 0, "skipped": True, "vector_ids": []}
+
+    stored = crud.get_chunk_positions(db, file_name)  # vector id -> (row id, chunk index, start, end)
+
+    def save_batch_metadata(chunk_indices: List[int], chunks: List[Chunk], vector_ids: List[str]) -> None:
+        crud.save_document_metadata(
+            db=db,
+            file_name=file_name,
+            chunks=[chunk.text for chunk in chunks],
+            vector_ids=vector_ids,
+            chunk_strategy=chunk_strategy,
+            additional_metadata={"uploaded_by": "system", "tags": uploaded["tags"]},
+            chunk_indices=chunk_indices,
+            spans=[(chunk.start, chunk.end) for chunk in chunks]
+        )
+        if on_progress:
+            on_progress(chunk_indices[-1] + 1)
+
+    extract_timings = {"extract_seconds": 0.0}
+    blocks = _timed_iter(extract_blocks(path, file_name), extract_timings, "extract_seconds")
+    chunks = stream_chunks(blocks, strategy=chunk_strategy)
+    stats = ingest_chunks(chunks, vector_store, on_batch=save_batch_metadata, payload=payload,
+                          known_ids=set(stored))
+    unchanged = stats.pop("unchanged")
+
+    # Unchanged chunks keep their vectors: bring their document fields up to date in one request
+    if unchanged:
+        vector_store.set_document_payload(file_name, payload)
+
+    # Unchanged chunks that moved within the file: refresh their position in Postgres and the vector payload
+    moved = [
+        (vector_id, stored[vector_id][0], index, chunk)
+        for index, chunk, vector_id in unchanged
+        if stored[vector_id][1:] != (index, chunk.start, chunk.end)
+    ]
+    if moved:
+        crud.update_chunk_positions(db, [(row_id, index, chunk.start, chunk.end) for _, row_id, index, chunk in moved])
+        vector_store.set_payloads(
+            [vector_id for vector_id, _, _, _ in moved],
+            [{"chunk_index": index, "start": chunk.start, "end": chunk.end} for _, _, index, chunk in moved]
+        )
+
+    # Chunks of the previous version that are gone
+    stale = list(set(stored) - set(stats["vector_ids"]))
+    if stale:
+        vector_store.delete_vectors(stale)
+        lexical_index.remove(stale)
+        crud.delete_chunks_by_vector_ids(db, stale)
+    stats["deleted_chunks"] = len(stale)
+    stats["moved_chunks"] = len(moved)
+    stats["document_id"] = payload["document_id"]
+    crud.save_document(db, file_name, content_hash, chunk_strategy, stats["total_chunks"])
+    # Drop this process's answers built from the previous version; elsewhere they simply stop matching,
+    # since changed chunks get new ids
+    answer_cache.invalidate_documents([file_name])
+
+    # Extraction runs inside the chunk iterator, so chunking is the remainder of the combined time
+    extract_seconds = extract_timings["extract_seconds"]
+    chunk_seconds = max(stats["timings"]["extract_chunk_seconds"] - extract_seconds, 0.0)
+    stats["timings"]["extract_seconds"] = round(extract_seconds, 3)
+    stats["timings"]["chunk_seconds"] = round(chunk_seconds, 3)
+    observe_stage("extract", extract_seconds)
+    observe_stage("chunk", chunk_seconds)
+    return stats
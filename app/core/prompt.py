@@ -0,0 +1,89 @@
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from core.tokens import count_tokens
+
+SYSTEM_PROMPT = (
+    "You are a helpful assistant. Use the following context to answer the user's query. "
+    "If you don't know the answer, just say that you don't know. "
+    "Don't try to make up an answer."
+)
+
+# Per-message formatting overhead of the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def _message_tokens(content: str, model: str) -> int:
+    return count_tokens(content, model=model) + MESSAGE_OVERHEAD_TOKENS
+
+
+def build_prompt(
+    query: str,
+    context: List[str],
+    history: List[Dict[str, str]],
+    summary: Optional[str] = None,
+    budget: int = settings.PROMPT_TOKEN_BUDGET,
+    context_share: float = settings.PROMPT_CONTEXT_SHARE,
+    model: str = settings.CHAT_MODEL
+) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Fit system prompt, conversation summary, history and retrieved context into a token budget.
+
+    Messages are ordered: system, summary of older turns, recent history (oldest first), then the
+    current query with its context. The system prompt, summary and query are always kept. Context
+    chunks are added in rank order up to `context_share` of the remaining budget, then the newest
+    history messages that fit, then any context that still fits in what history left unused.
+
+    returns:
+        (messages, token usage per prompt part)
+    """
+    usage = {"budget": budget}
+    usage["system"] = _message_tokens(SYSTEM_PROMPT, model)
+    usage["summary"] = _message_tokens(summary, model) if summary else 0
+    query_prefix = "Context:\n\n\n---\n\nQuery: "
+    usage["query"] = _message_tokens(query_prefix + query, model)
+    remaining = budget - usage["system"] - usage["summary"] - usage["query"]
+
+    chunk_tokens = [count_tokens(chunk, model=model) + 1 for chunk in context]
+    kept_chunks: List[int] = []
+    context_tokens = 0
+
+    def fill_context(limit: int) -> None:
+        nonlocal context_tokens
+        for i, tokens in enumerate(chunk_tokens):
+            if i not in kept_chunks and context_tokens + tokens <= limit:
+                kept_chunks.append(i)
+                context_tokens += tokens
+
+    fill_context(int(max(remaining, 0) * context_share))
+
+    kept_history: List[Dict[str, str]] = []
+    history_tokens = 0
+    for message in reversed(history):
+        tokens = _message_tokens(message["content"], model)
+        if context_tokens + history_tokens + tokens > remaining:
+            break
+        kept_history.append(message)
+        history_tokens += tokens
+    kept_history.reverse()
+
+    fill_context(remaining - history_tokens)
+    kept_chunks.sort()
+
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+    messages.extend(kept_history)
+    context_text = "\n\n".join(context[i] for i in kept_chunks)
+    messages.append({"role": "user", "content": f"Context:\n{context_text}\n\n---\n\nQuery: {query}"})
+
+    usage.update({
+        "history": history_tokens,
+        "history_messages": len(kept_history),
+        "history_dropped": len(history) - len(kept_history),
+        "context": context_tokens,
+        "context_chunks": len(kept_chunks),
+        "context_dropped": len(context) - len(kept_chunks),
+    })
+    usage["total"] = usage["system"] + usage["summary"] + usage["history"] + usage["context"] + usage["query"]
+    return messages, usage
@@ -1,16 +1,152 @@
-from qdrant_client import QdrantClient, models
-from openai import OpenAI
+import uuid
+from typing import Dict, Optional
+from qdrant_client import QdrantClient, AsyncQdrantClient, models
 from app.config import settings
+from core.clients import clients
+from core.embeddings import generate_embeddings
+from core.vector_store import VectorStore, SearchHit, SearchFilter
 
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+COLLECTION_NAME = "documents"
 
-class QdrantClientWrapper:
-    def __init__(self):
-        self.client = QdrantClient(url=settings.QDRANT_URL)
+
+def quantization_config(mode: str = settings.QDRANT_QUANTIZATION) -> Optional[models.QuantizationConfig]:
+    """ Qdrant quantization for "scalar" (int8) or "binary" mode; None keeps full-precision vectors only """
+    if mode == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if mode == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    if mode == "none":
+        return None
+    raise ValueError("Invalid quantization mode. Use 'none', 'scalar' or 'binary'.")
+
+
+def init_collection(vector_size: int = settings.VECTOR_SIZE, recreate: bool = False,
+                    client: Optional[QdrantClient] = None, collection_name: str = COLLECTION_NAME,
+                    quantization: str = settings.QDRANT_QUANTIZATION):
+    """
+    Create the Qdrant collection for storing embeddings, or migrate an existing one in place
+    to the configured quantization, on-disk originals and HNSW parameters.
+    An existing collection of another vector size cannot be migrated: it raises ValueError
+    unless recreate drops it (and every vector in it) first.
+    """
+    client = client or clients.qdrant
+    quantization_cfg = quantization_config(quantization)
+    hnsw_cfg = models.HnswConfigDiff(m=settings.QDRANT_HNSW_M, ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT)
+
+    if recreate and client.collection_exists(collection_name):
+        client.delete_collection(collection_name)
+
+    if not client.collection_exists(collection_name):
+        client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(size=vector_size, distance=models.Distance.COSINE,
+                                               on_disk=settings.QDRANT_ON_DISK),
+            hnsw_config=hnsw_cfg,
+            quantization_config=quantization_cfg
+        )
+        return
+
+    config = client.get_collection(collection_name).config
+    vectors = config.params.vectors
+    size = (vectors.get("") if isinstance(vectors, dict) else vectors).size
+    if size != vector_size:
+        raise ValueError(
+            f"Qdrant collection '{collection_name}' stores {size}-dimensional vectors but VECTOR_SIZE is "
+            f"{vector_size}; set VECTOR_SIZE to match the embedding model of the collection, or re-create it "
+            f"with init_collection(recreate=True), which deletes every stored vector."
+        )
+
+    # Only send an update when something differs, an update can trigger re-optimization
+    if (config.quantization_config == quantization_cfg
+            and config.params.vectors.on_disk == settings.QDRANT_ON_DISK
+            and config.hnsw_config.m == hnsw_cfg.m
+            and config.hnsw_config.ef_construct == hnsw_cfg.ef_construct):
+        return
+    client.update_collection(
+        collection_name=collection_name,
+        vectors_config={"": models.VectorParamsDiff(on_disk=settings.QDRANT_ON_DISK)},
+        hnsw_config=hnsw_cfg,
+        quantization_config=quantization_cfg or models.Disabled.DISABLED
+    )
+
+
+def store_embeddings(chunks: list[str], metadata: Dict = None,
+                     model: str = settings.EMBEDDING_MODEL) -> list[str]:
+    """ Generate and store embeddings in Qdrant """
+    embeddings = generate_embeddings(chunks, model=model)
+    vector_ids = [str(uuid.uuid4()) for _ in chunks]
+    points = [
+        models.PointStruct(
+            id=vector_ids[i],
+            vector=embeddings[i],
+            payload={"text": chunks[i], **(metadata or {})}
+        ) for i in range(len(chunks))
+    ]
+    clients.qdrant.upsert(
+        collection_name=COLLECTION_NAME,
+        points=points
+    )
+    return vector_ids
+
+
+# Index type of each filterable payload field (see vector_store.FILTER_FIELDS)
+PAYLOAD_INDEXES = {
+    "file_name": models.PayloadSchemaType.KEYWORD,
+    "document_id": models.PayloadSchemaType.KEYWORD,
+    "chunk_index": models.PayloadSchemaType.INTEGER,
+    "chunk_strategy": models.PayloadSchemaType.KEYWORD,
+    "tags": models.PayloadSchemaType.KEYWORD,
+    "uploaded_at": models.PayloadSchemaType.DATETIME,
+}
+
+
+def search_params(quantization: str = settings.QDRANT_QUANTIZATION) -> models.SearchParams:
+    """ With quantization, search the compressed vectors for oversampling * limit candidates and rescore them with the originals """
+    if quantization == "none":
+        return models.SearchParams(hnsw_ef=settings.QDRANT_HNSW_EF)
+    return models.SearchParams(
+        hnsw_ef=settings.QDRANT_HNSW_EF,
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=settings.QDRANT_OVERSAMPLING)
+    )
+
+
+def ensure_payload_indexes(client: QdrantClient, collection_name: str = "documents") -> None:
+    """ Create the payload indexes the search filters use, skipping those that already exist """
+    existing = client.get_collection(collection_name).payload_schema
+    for field, schema in PAYLOAD_INDEXES.items():
+        if field not in existing:
+            client.create_payload_index(collection_name, field_name=field, field_schema=schema, wait=True)
+
+
+def to_qdrant_filter(search_filter: Optional[SearchFilter]) -> Optional[models.Filter]:
+    if search_filter is None:
+        return None
+    must = []
+    for field, values in (("file_name", search_filter.file_names), ("document_id", search_filter.document_ids),
+                          ("tags", search_filter.tags)):
+        if values is not None:
+            must.append(models.FieldCondition(key=field, match=models.MatchAny(any=values)))
+    if search_filter.chunk_strategy is not None:
+        must.append(models.FieldCondition(key="chunk_strategy", match=models.MatchValue(value=search_filter.chunk_strategy)))
+    if search_filter.uploaded_after is not None or search_filter.uploaded_before is not None:
+        must.append(models.FieldCondition(key="uploaded_at", range=models.DatetimeRange(
+            gte=search_filter.uploaded_after, lte=search_filter.uploaded_before
+        )))
+    return models.Filter(must=must)
+
+
+class QdrantClientWrapper(VectorStore):
+    def __init__(self, client: Optional[QdrantClient] = None, async_client: Optional[AsyncQdrantClient] = None):
+        # The registry's shared clients by default; the registry also closes them
+        self.client = client or clients.qdrant
+        self.async_client = async_client or clients.aqdrant
 
     def connect(self):
-        # The client is already connected in the constructor
-        pass
+        # The clients connect lazily; create or migrate the collection
+        init_collection(client=self.client)
+        ensure_payload_indexes(self.client)
 
     def upsert_vector(self, vector_id: str, vector: list[float], payload: dict):
         self.client.upsert(
@@ -25,18 +161,95 @@ class QdrantClientWrapper:
             wait=True,
         )
 
-    def semantic_search(self, query: str, top_k: int) -> list[str]:
-        response = client.embeddings.create(
-            input=query,
-            model="text-embedding-3-small",
-            encoding_format="float"
+    def upsert_vectors(self, vector_ids: list[str], vectors: list[list[float]], payloads: list[dict],
+                       batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE):
+        """ Upsert points in bulk batches, waiting only on the final batch """
+        points = [
+            models.PointStruct(id=vector_id, vector=vector, payload=payload)
+            for vector_id, vector, payload in zip(vector_ids, vectors, payloads)
+        ]
+        for start in range(0, len(points), batch_size):
+            self.client.upsert(
+                collection_name="documents",
+                points=points[start:start + batch_size],
+                wait=start + batch_size >= len(points),
+            )
+
+    def delete_vectors(self, vector_ids: list[str]):
+        if not vector_ids:
+            return
+        self.client.delete(
+            collection_name="documents",
+            points_selector=models.PointIdsList(points=vector_ids),
+            wait=True,
+        )
+
+    def set_payloads(self, vector_ids: list[str], payloads: list[dict],
+                     batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE):
+        """ Merge payload keys point by point, sending one batch request per batch_size points """
+        operations = [
+            models.SetPayloadOperation(set_payload=models.SetPayload(payload=payload, points=[vector_id]))
+            for vector_id, payload in zip(vector_ids, payloads)
+        ]
+        for start in range(0, len(operations), batch_size):
+            self.client.batch_update_points(
+                collection_name="documents",
+                update_operations=operations[start:start + batch_size],
+                wait=start + batch_size >= len(operations),
+            )
+
+    def set_document_payload(self, file_name: str, payload: dict):
+        """ One filtered request (served by the file_name index) instead of one operation per point """
+        self.client.set_payload(
+            collection_name="documents",
+            payload=payload,
+            points=models.FilterSelector(filter=to_qdrant_filter(SearchFilter(file_names=[file_name]))),
+            wait=True,
         )
-        query_vector = response.data[0].embedding
 
-        search_result = self.client.search(
+    def delete_by_document(self, file_name: str):
+        self.client.delete(
+            collection_name="documents",
+            points_selector=models.FilterSelector(filter=to_qdrant_filter(SearchFilter(file_names=[file_name]))),
+            wait=True,
+        )
+
+    def get_payloads(self, vector_ids: list[str]) -> dict[str, dict]:
+        points = self.client.retrieve(collection_name="documents", ids=vector_ids, with_vectors=False)
+        return {str(point.id): point.payload for point in points}
+
+    async def aget_payloads(self, vector_ids: list[str]) -> dict[str, dict]:
+        points = await self.async_client.retrieve(collection_name="documents", ids=vector_ids, with_vectors=False)
+        return {str(point.id): point.payload for point in points}
+
+    def search_hits(self, query_vector: list[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                    with_vectors: bool = False) -> list[SearchHit]:
+        points = self.client.query_points(
+            collection_name="documents",
+            query=query_vector,
+            query_filter=to_qdrant_filter(search_filter),
+            limit=top_k,
+            search_params=search_params(),
+            with_payload=True,
+            with_vectors=with_vectors,
+        ).points
+        return [SearchHit(str(point.id), point.score, point.payload, point.vector) for point in points]
+
+    async def asearch_points(self, query_vector: list[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                             with_vectors: bool = False) -> list[models.ScoredPoint]:
+        """ Search returning the scored points (id, score, payload) instead of only the chunk text """
+        response = await self.async_client.query_points(
             collection_name="documents",
-            query_vector=query_vector,
+            query=query_vector,
+            query_filter=to_qdrant_filter(search_filter),
             limit=top_k,
+            search_params=search_params(),
+            with_payload=True,
+            with_vectors=with_vectors,
         )
+        return response.points
 
-        return [hit.payload["chunk"] for hit in search_result]
\ No newline at end of file
+    async def asearch_hits(self, query_vector: list[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                           with_vectors: bool = False) -> list[SearchHit]:
+        points = await self.asearch_points(query_vector, top_k, search_filter, with_vectors)
+        return [SearchHit(str(point.id), point.score, point.payload, point.vector) for point in points]
@@ -0,0 +1,118 @@
+from itertools import chain
+from typing import List, Tuple
+
+import numpy as np
+
+from app.config import settings
+from core.vector_store import SearchHit
+
+RERANK_METHODS = ("none", "mmr", "dedup")
+
+
+def cosine_matrix(vectors: np.ndarray) -> np.ndarray:
+    """
+    Pairwise cosine similarities of the rows from a single matrix product; the norms come from its
+    diagonal, so the rows are never normalized in a separate pass.
+    """
+    similarity = vectors @ vectors.T
+    norms = np.sqrt(np.maximum(np.diagonal(similarity), 1e-24))
+    similarity /= norms[:, None]
+    similarity /= norms
+    return similarity
+
+
+def mmr_select(relevance: np.ndarray, similarity: np.ndarray, k: int,
+               lambda_mult: float = settings.MMR_LAMBDA) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Maximal marginal relevance: repeatedly pick the candidate maximizing
+    lambda * relevance - (1 - lambda) * max similarity(already picked).
+    The objective after a pick is the elementwise minimum of the previous one and the picked row of
+    lambda * relevance - (1 - lambda) * similarity, so each pick is one argmax and one minimum.
+    Returns the picked indices and their MMR scores, in pick order.
+    """
+    k = min(k, len(relevance))
+    gain = lambda_mult * relevance.astype(np.float32)
+    penalized = gain - (1.0 - lambda_mult) * similarity  # row i: objective if only i were picked
+    objective = gain
+    picked = np.empty(k, dtype=np.int64)
+    scores = np.empty(k, dtype=np.float32)
+    for step in range(k):
+        best = int(np.argmax(objective))
+        picked[step] = best
+        scores[step] = objective[best]
+        if step == 0:
+            objective = penalized[best].copy()  # similarities may be negative: no redundancy floor
+        else:
+            np.minimum(objective, penalized[best], out=objective)
+        objective[best] = -np.inf  # never picked again; the minimum keeps it so
+    return picked, scores
+
+
+def dedup_select(similarity: np.ndarray, documents: np.ndarray, starts: np.ndarray, ends: np.ndarray, k: int,
+                 max_overlap: float = settings.DEDUP_MAX_OVERLAP,
+                 max_similarity: float = settings.DEDUP_MAX_SIMILARITY) -> np.ndarray:
+    """
+    Walk the candidates in relevance order and keep up to k of them, skipping any that overlaps a kept
+    chunk of the same document by more than max_overlap of the shorter span, or whose similarity to a
+    kept chunk exceeds max_similarity. The pairwise tests are computed as matrices up front.
+    documents are integer document codes (-1 when unknown), starts/ends character spans.
+    """
+    lengths = ends - starts
+    intersection = np.minimum(ends[:, None], ends) - np.maximum(starts[:, None], starts)
+    shorter = np.maximum(np.minimum(lengths[:, None], lengths), 1)
+    same_document = (documents[:, None] == documents) & (documents[:, None] >= 0)
+    duplicate = (same_document & (intersection > max_overlap * shorter)) | (similarity > max_similarity)
+
+    kept: List[int] = []
+    blocked = np.zeros(len(similarity), dtype=bool)
+    for i in range(len(similarity)):
+        if blocked[i]:
+            continue
+        kept.append(i)
+        if len(kept) == k:
+            break
+        blocked |= duplicate[i]
+    return np.asarray(kept, dtype=np.int64)
+
+
+def vector_matrix(hits: List[SearchHit], dims: int = 0) -> np.ndarray:
+    """
+    The hits' vectors (their first `dims` dimensions, 0 meaning all) as one float32 matrix, built in a
+    single pass. Qdrant returns vectors as Python float lists: they are read straight into the matrix
+    rather than converted list by list, which is most of the cost of reranking them.
+    """
+    if isinstance(hits[0].vector, np.ndarray):
+        vectors = np.stack([hit.vector for hit in hits]).astype(np.float32, copy=False)
+        return vectors[:, :dims] if dims else vectors
+    width = min(dims, len(hits[0].vector)) if dims else len(hits[0].vector)
+    values = chain.from_iterable(hit.vector[:dims] if dims else hit.vector for hit in hits)
+    return np.fromiter(values, dtype=np.float32, count=len(hits) * width).reshape(len(hits), width)
+
+
+def rerank_hits(hits: List[SearchHit], k: int, method: str = settings.RERANK_METHOD,
+                lambda_mult: float = settings.MMR_LAMBDA, dims: int = settings.RERANK_DIMS) -> List[SearchHit]:
+    """
+    Diverse top-k of oversampled, relevance-ordered hits that carry their vectors.
+    "mmr" scores hits by their marginal relevance, "dedup" keeps the relevance score and drops
+    overlapping or near-identical chunks, "none" truncates. The vectors are dropped from the result.
+    Relevance is the store's cosine score; candidate-to-candidate similarity uses all dimensions, or
+    only the first `dims` (faster, but the picks can differ from a full comparison).
+    """
+    if method == "none" or len(hits) <= 1:
+        return [hit._replace(vector=None) for hit in hits[:k]]
+    if method not in RERANK_METHODS:
+        raise ValueError("Invalid rerank method. Use 'none', 'mmr' or 'dedup'.")
+
+    similarity = cosine_matrix(vector_matrix(hits, dims))
+    if method == "mmr":
+        relevance = np.fromiter((hit.score for hit in hits), dtype=np.float32, count=len(hits))
+        picked, scores = mmr_select(relevance, similarity, k, lambda_mult)
+        return [hits[i]._replace(score=float(score), vector=None) for i, score in zip(picked, scores)]
+
+    codes: dict = {}
+    documents = np.fromiter((-1 if hit.payload.get("file_name") is None
+                             else codes.setdefault(hit.payload["file_name"], len(codes)) for hit in hits),
+                            dtype=np.int64, count=len(hits))
+    starts = np.fromiter((hit.payload.get("start", 0) for hit in hits), dtype=np.int64, count=len(hits))
+    ends = np.fromiter((hit.payload.get("end", 0) for hit in hits), dtype=np.int64, count=len(hits))
+    return [hits[i]._replace(vector=None) for i in dedup_select(similarity, documents, starts, ends, k)]
@@ -0,0 +1,47 @@
+import re
+from functools import lru_cache
+from typing import List
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a word/punctuation approximation
+    tiktoken = None
+
+from app.config import settings
+
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """
+    tiktoken encoding of the model, or None when tiktoken is not installed or cannot load its
+    vocabulary (it downloads it on first use, which fails offline); callers then approximate
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # cached like an encoding, so the download is not retried on every call
+        print(f"tiktoken encoding of {model} unavailable, approximating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = settings.EMBEDDING_MODEL) -> int:
+    """ Number of tokens in text for the given model (approximate when tiktoken is unavailable) """
+    encoding = _encoding(model)
+    if encoding is None:
+        return sum(1 for _ in _APPROX_TOKEN.finditer(text))
+    return len(encoding.encode_ordinary(text))
+
+
+def token_offsets(text: str, model: str = settings.EMBEDDING_MODEL) -> List[int]:
+    """ Character offset at which each token of text starts """
+    encoding = _encoding(model)
+    if encoding is None:
+        return [m.start() for m in _APPROX_TOKEN.finditer(text)]
+    _, offsets = encoding.decode_with_offsets(encoding.encode_ordinary(text))
+    return offsets
@@ -1,16 +1,63 @@
-import fitz
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional
+
+from app.config import settings
+
+PDF_WORKERS = settings.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+
 
 def pdf_extract(pdf_path: str) -> str:
+    import fitz  # PyMuPDF is imported on first use, keeping it out of the API's startup
     try:
         doc = fitz.open(pdf_path)
-        text = ''
-        for page in doc:
-            text += page.get_text()
+        text = ''.join(page.get_text() for page in doc)
         doc.close()
     except Exception as e:
         print(f"An error occurred while extracting text from the PDF: {e}")
         return None
     return text
-	
 
 
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pool
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """ Extract the text of pages [start, end) in a worker process """
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        return [doc[i].get_text() for i in range(start, end)]
+
+
+def pdf_extract_pages(pdf_path: str, pages_per_task: int = settings.PDF_PAGES_PER_TASK) -> Iterator[str]:
+    """
+    Yield page texts in order while page ranges are extracted in parallel by a process pool.
+    Only a bounded window of page ranges is in flight, so memory does not grow with the document.
+    """
+    import fitz
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+    pool = _get_pool()
+    max_in_flight = 2 * PDF_WORKERS
+    ranges = iter(range(0, page_count, pages_per_task))
+    pending = []
+
+    def submit_next() -> None:
+        start = next(ranges, None)
+        if start is not None:
+            pending.append(pool.submit(_extract_page_range, pdf_path, start, min(start + pages_per_task, page_count)))
+
+    for _ in range(max_in_flight):
+        submit_next()
+
+    while pending:
+        pages = pending.pop(0).result()
+        submit_next()
+        yield from pages
@@ -0,0 +1,21 @@
+from typing import Iterator
+
+
+def txt_extract(txt_path: str) -> str:
+    try:
+        with open(txt_path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except Exception as e:
+        print(f"An error occurred while extracting text from the TXT file: {e}")
+        return None
+    return text
+
+
+def txt_extract_blocks(txt_path: str, block_size: int = 1 << 20) -> Iterator[str]:
+    """ Yield the text file in decoded blocks of roughly block_size characters """
+    with open(txt_path, "r", encoding="utf-8", errors="replace") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            yield block
@@ -0,0 +1,180 @@
+import hashlib
+import os
+from typing import Callable, List, NamedTuple, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+from app.config import settings
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SpooledUpload(NamedTuple):
+    file_name: str
+    path: str
+    size: int
+    content_hash: str  # sha256 of the file, computed while streaming
+
+
+# Multipart framing (boundaries, part headers) on top of the file itself
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class _Part:
+    """ A file part being spooled; data is buffered between parser writes and flushed in the threadpool """
+    __slots__ = ("file_name", "buffer", "size", "digest", "f", "path", "finished")
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.buffer = bytearray()
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.f = None
+        self.path: Optional[str] = None
+        self.finished = False
+
+
+def _too_large(max_bytes: int) -> UploadError:
+    return UploadError(413, f"File too large; the limit is {max_bytes // (1024 * 1024)} MB.")
+
+
+async def spool_multipart_file(
+    request: Request,
+    path_for: Callable[[str], str],
+    field_name: str = "file",
+    allowed_extensions: tuple = (".pdf", ".txt"),
+    max_bytes: int = settings.MAX_UPLOAD_BYTES,
+    chunk_size: int = settings.UPLOAD_CHUNK_SIZE
+) -> SpooledUpload:
+    """
+    Stream one file field of a multipart request straight to path_for(file_name).
+    The body is parsed as it arrives: nothing is buffered beyond chunk_size, writes run in the
+    threadpool, and oversized uploads are rejected from Content-Length before reading, or as soon
+    as the file part crosses max_bytes. Raises UploadError; a partial file is removed.
+    """
+    uploads = await spool_multipart_files(request, path_for, field_name, allowed_extensions, max_bytes,
+                                          max_files=1, chunk_size=chunk_size)
+    return uploads[0]
+
+
+async def spool_multipart_files(
+    request: Request,
+    path_for: Callable[[str], str],
+    field_name: str = "files",
+    allowed_extensions: tuple = (".pdf", ".txt"),
+    max_bytes: int = settings.MAX_UPLOAD_BYTES,
+    max_files: int = settings.INGEST_BATCH_MAX_FILES,
+    chunk_size: int = settings.UPLOAD_CHUNK_SIZE
+) -> List[SpooledUpload]:
+    """
+    Stream every file part named field_name to its own path_for(file_name), in request order.
+    Same guarantees as spool_multipart_file, with max_bytes applying to each file; on any error,
+    every file spooled so far is removed.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > max_files * (max_bytes + _MULTIPART_OVERHEAD):
+        raise _too_large(max_bytes)
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    if b"boundary" not in params:
+        raise UploadError(400, "Expected a multipart/form-data request.")
+
+    state = {"header_field": b"", "headers": {}, "current": None}
+    parts: List[_Part] = []
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["header_field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        field = state["header_field"].lower()
+        state["headers"][field] = state["headers"].get(field, b"") + data[start:end]
+
+    def on_header_end():
+        state["header_field"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        name = disposition.get(b"name", b"").decode("utf-8", "replace")
+        file_name = disposition.get(b"filename")
+        state["current"] = None
+        if name == field_name and file_name is not None:
+            if len(parts) == max_files:
+                raise UploadError(400, f"At most {max_files} file(s) per request.")
+            state["current"] = _Part(os.path.basename(file_name.decode("utf-8", "replace")))
+            parts.append(state["current"])
+
+    def on_part_data(data, start, end):
+        part = state["current"]
+        if part is not None:
+            part.size += end - start
+            part.buffer.extend(data[start:end])
+
+    def on_part_end():
+        if state["current"] is not None:
+            state["current"].finished = True
+        state["current"] = None
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    async def flush(part: _Part, final: bool) -> None:
+        if part.f is None:
+            if not part.file_name.endswith(allowed_extensions):
+                raise UploadError(400, "Only PDF and TXT files are allowed.")
+            part.path = path_for(part.file_name)
+            part.f = await run_in_threadpool(open, part.path, "wb")
+        if part.size > max_bytes:
+            raise _too_large(max_bytes)
+        if part.buffer and (final or len(part.buffer) >= chunk_size):
+            block = bytes(part.buffer)
+            part.buffer.clear()
+            part.digest.update(block)
+            await run_in_threadpool(part.f.write, block)
+        if final:
+            await run_in_threadpool(part.f.close)
+
+    closed = 0  # parts before this index are complete and closed
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            # One chunk may end a part and start the next, only the last part can be still open
+            for part in parts[closed:]:
+                await flush(part, final=part.finished)
+                closed += part.finished
+        parser.finalize()
+
+        if not parts:
+            raise UploadError(400, f"Missing file field '{field_name}'.")
+        for part in parts[closed:]:
+            await flush(part, final=True)
+            closed += 1
+    except BaseException as e:
+        for part in parts:
+            if part.f is not None:
+                part.f.close()
+                os.remove(part.path)
+        if isinstance(e, Exception) and not isinstance(e, UploadError):
+            raise UploadError(400, f"Invalid multipart upload: {e}") from e
+        raise
+
+    return [SpooledUpload(part.file_name, part.path, part.size, part.digest.hexdigest()) for part in parts]
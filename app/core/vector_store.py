@@ -0,0 +1,400 @@
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+
+from app.config import settings
+from core.clients import clients
+from core.embeddings import generate_embeddings, agenerate_embeddings
+
+
+class SearchHit(NamedTuple):
+    id: str
+    score: float
+    payload: dict
+    vector: Any = None  # only when searched with_vectors, e.g. for reranking
+
+
+class SearchFilter(NamedTuple):
+    """
+    Conditions on chunk payloads, all of which must hold; a None field is unconstrained.
+    List fields match any of their values; uploaded_after / uploaded_before are inclusive.
+    """
+    file_names: Optional[List[str]] = None
+    document_ids: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    chunk_strategy: Optional[str] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+    def matches(self, payload: Optional[dict]) -> bool:
+        if payload is None:
+            return False
+        if self.file_names is not None and payload.get("file_name") not in self.file_names:
+            return False
+        if self.document_ids is not None and payload.get("document_id") not in self.document_ids:
+            return False
+        if self.tags is not None and not set(self.tags).intersection(payload.get("tags") or ()):
+            return False
+        if self.chunk_strategy is not None and payload.get("chunk_strategy") != self.chunk_strategy:
+            return False
+        if self.uploaded_after is not None or self.uploaded_before is not None:
+            if not payload.get("uploaded_at"):
+                return False
+            uploaded_at = datetime.fromisoformat(payload["uploaded_at"])
+            if self.uploaded_after is not None and uploaded_at < self.uploaded_after:
+                return False
+            if self.uploaded_before is not None and uploaded_at > self.uploaded_before:
+                return False
+        return True
+
+
+# Payload fields the search filters apply to, indexed in Qdrant
+FILTER_FIELDS = ("file_name", "document_id", "chunk_index", "chunk_strategy", "tags", "uploaded_at")
+
+
+class VectorStore:
+    """
+    Interface of the vector index used by ingestion and retrieval.
+    Implementations: QdrantClientWrapper (remote Qdrant) and LocalVectorStore (in-process).
+    """
+
+    def connect(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    def upsert_vectors(self, vector_ids: List[str], vectors: List[List[float]], payloads: List[dict],
+                       batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE) -> None:
+        raise NotImplementedError
+
+    def delete_vectors(self, vector_ids: List[str]) -> None:
+        raise NotImplementedError
+
+    def set_payloads(self, vector_ids: List[str], payloads: List[dict]) -> None:
+        """ Merge the given keys into the payload of each existing vector """
+        raise NotImplementedError
+
+    def set_document_payload(self, file_name: str, payload: dict) -> None:
+        """ Merge the given keys into the payload of every vector of a document """
+        raise NotImplementedError
+
+    def delete_by_document(self, file_name: str) -> None:
+        raise NotImplementedError
+
+    def get_payloads(self, vector_ids: List[str]) -> Dict[str, dict]:
+        """ Payloads of the given vectors, by id; unknown ids are left out """
+        raise NotImplementedError
+
+    async def aget_payloads(self, vector_ids: List[str]) -> Dict[str, dict]:
+        return self.get_payloads(vector_ids)
+
+    def search_hits(self, query_vector: List[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                    with_vectors: bool = False) -> List[SearchHit]:
+        raise NotImplementedError
+
+    async def asearch_hits(self, query_vector: List[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                           with_vectors: bool = False) -> List[SearchHit]:
+        return self.search_hits(query_vector, top_k, search_filter, with_vectors)
+
+    def semantic_search(self, query: str, top_k: int) -> List[str]:
+        query_vector = generate_embeddings([query], model=settings.EMBEDDING_MODEL)[0]
+        return self.search_by_vector(query_vector, top_k)
+
+    def search_by_vector(self, query_vector: List[float], top_k: int) -> List[str]:
+        return [hit.payload["chunk"] for hit in self.search_hits(query_vector, top_k)]
+
+    async def asemantic_search(self, query: str, top_k: int) -> List[str]:
+        query_vector = (await agenerate_embeddings([query], model=settings.EMBEDDING_MODEL))[0]
+        return await self.asearch_by_vector(query_vector, top_k)
+
+    async def asearch_by_vector(self, query_vector: List[float], top_k: int) -> List[str]:
+        return [hit.payload["chunk"] for hit in await self.asearch_hits(query_vector, top_k)]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index for small deployments, tests and benchmarks.
+    Vectors are L2-normalized and kept in a memory-mapped float32/float16 matrix, so cosine
+    search is an exact top-k over blocked NumPy dot products. Payloads and deletions are kept
+    in an append-only JSON lines log that is replayed on load and compacted once most of its
+    entries are superseded.
+    Several processes can share the directory: writes hold an exclusive file lock and first
+    catch up with the entries other processes appended, so rows are never handed out twice;
+    searches catch up without the lock. Rows of deleted vectors are reused by later inserts.
+    """
+
+    _BLOCK_ROWS = 65536
+    _COMPACT_MIN_ENTRIES = 1024  # log entries below which the log is never compacted
+
+    def __init__(self, path: str = settings.LOCAL_VECTOR_STORE_PATH, dtype: str = settings.LOCAL_VECTOR_STORE_DTYPE):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._lock_file = None
+        self._lock_depth = 0
+        self._matrix: Optional[np.memmap] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._count = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._ids: List[str] = []  # row -> vector id
+        self._rows: Dict[str, int] = {}  # vector id -> row
+        self._payloads: List[Optional[dict]] = []
+        self._log_inode: Optional[int] = None
+        self._log_offset = 0  # bytes of the log replayed so far
+        self._log_entries = 0
+
+    def _meta_path(self) -> str:
+        return os.path.join(self.path, "meta.json")
+
+    def _matrix_path(self) -> str:
+        return os.path.join(self.path, "vectors.bin")
+
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "payloads.jsonl")
+
+    def connect(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            self._lock_file = open(os.path.join(self.path, "lock"), "a")
+            self._refresh()
+            self._loaded = True
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """ Hold the thread lock and the directory's file lock, with the state caught up with the files """
+        self.connect()
+        with self._lock:
+            if self._lock_depth == 0:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    self._refresh()
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self) -> None:
+        """ Reopen the matrix if another process grew it and replay the log entries not seen yet """
+        if os.path.exists(self._meta_path()):
+            with open(self._meta_path()) as f:
+                meta = json.load(f)
+            shape = (meta["capacity"], meta["dim"])
+            if self._matrix is None or self._matrix.shape != shape:
+                self.dtype = np.dtype(meta["dtype"])
+                self._matrix = np.memmap(self._matrix_path(), dtype=self.dtype, mode="r+", shape=shape)
+        try:
+            stat = os.stat(self._log_path())
+        except FileNotFoundError:
+            return
+        if stat.st_ino != self._log_inode:
+            # First load, or the log was compacted: replay it from the start
+            self._reset()
+            self._log_inode = stat.st_ino
+        if stat.st_size <= self._log_offset:
+            return
+        with open(self._log_path(), "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(stat.st_size - self._log_offset)
+        complete = data.rfind(b"\n") + 1  # a writer may be midway through a line
+        for line in data[:complete].splitlines():
+            entry = json.loads(line)
+            if "row" in entry:
+                self._set_row(entry["id"], entry["row"], entry["payload"])
+            else:
+                self._kill(entry["id"])
+            self._log_entries += 1
+        self._log_offset += complete
+
+    def _append_log(self, entries: List[dict]) -> None:
+        """ Append entries to the log (under _exclusive) and apply them, compacting the log when it is mostly stale """
+        if not entries:
+            return
+        with open(self._log_path(), "a") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self._refresh()
+        if self._log_entries > max(2 * len(self._rows), self._COMPACT_MIN_ENTRIES):
+            self._compact_log()
+
+    def _compact_log(self) -> None:
+        """ Rewrite the log with one entry per live vector; other processes replay it when they see the new file """
+        tmp_path = f"{self._log_path()}.tmp"
+        with open(tmp_path, "w") as f:
+            for vector_id, row in self._rows.items():
+                f.write(json.dumps({"id": vector_id, "row": row, "payload": self._payloads[row]}) + "\n")
+        os.replace(tmp_path, self._log_path())
+        self._refresh()
+
+    def _set_row(self, vector_id: str, row: int, payload: dict) -> None:
+        while len(self._ids) <= row:
+            self._ids.append("")
+            self._payloads.append(None)
+        if len(self._alive) <= row:
+            alive = np.zeros(max(row + 1, 2 * len(self._alive)), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+        previous = self._rows.get(vector_id)
+        if previous is not None and previous != row:
+            self._alive[previous] = False
+            self._payloads[previous] = None
+        self._ids[row] = vector_id
+        self._payloads[row] = payload
+        self._rows[vector_id] = row
+        self._alive[row] = True
+        self._count = max(self._count, row + 1)
+
+    def _kill(self, vector_id: str) -> None:
+        row = self._rows.pop(vector_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._payloads[row] = None
+
+    def _ensure_capacity(self, rows: int, dim: int) -> None:
+        if self._matrix is not None and self._matrix.shape[0] >= rows:
+            return
+        capacity = max(rows, 1024, 2 * (self._matrix.shape[0] if self._matrix is not None else 0))
+        grown = np.memmap(f"{self._matrix_path()}.tmp", dtype=self.dtype, mode="w+", shape=(capacity, dim))
+        if self._matrix is not None:
+            grown[:self._count] = self._matrix[:self._count]
+            del self._matrix
+        grown.flush()
+        del grown
+        os.replace(f"{self._matrix_path()}.tmp", self._matrix_path())
+        self._matrix = np.memmap(self._matrix_path(), dtype=self.dtype, mode="r+", shape=(capacity, dim))
+        with open(f"{self._meta_path()}.tmp", "w") as f:
+            json.dump({"dim": dim, "capacity": capacity, "dtype": self.dtype.name}, f)
+        os.replace(f"{self._meta_path()}.tmp", self._meta_path())
+
+    def upsert_vectors(self, vector_ids: List[str], vectors: List[List[float]], payloads: List[dict],
+                       batch_size: int = settings.QDRANT_UPSERT_BATCH_SIZE) -> None:
+        if not vector_ids:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        # An id repeated within the call is stored once, with its last vector and payload
+        last = {vector_id: i for i, vector_id in enumerate(vector_ids)}
+        if len(last) < len(vector_ids):
+            keep = sorted(last.values())
+            vector_ids, payloads, matrix = [vector_ids[i] for i in keep], [payloads[i] for i in keep], matrix[keep]
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        with self._exclusive():
+            # New ids take the rows of deleted vectors first, then rows past the end
+            new_ids = [vector_id for vector_id in vector_ids if vector_id not in self._rows]
+            free = np.flatnonzero(~self._alive[:self._count])[:len(new_ids)].tolist()
+            free.extend(range(self._count, self._count + len(new_ids) - len(free)))
+            new_rows = dict(zip(new_ids, free))
+            rows = [self._rows[vector_id] if vector_id in self._rows else new_rows[vector_id] for vector_id in vector_ids]
+            self._ensure_capacity(max(rows) + 1, matrix.shape[1])
+            self._matrix[rows] = matrix.astype(self.dtype)
+            self._matrix.flush()
+            self._append_log([
+                {"id": vector_id, "row": row, "payload": payload}
+                for vector_id, row, payload in zip(vector_ids, rows, payloads)
+            ])
+
+    def delete_vectors(self, vector_ids: List[str]) -> None:
+        with self._exclusive():
+            self._append_log([{"id": vector_id} for vector_id in dict.fromkeys(vector_ids) if vector_id in self._rows])
+
+    def set_payloads(self, vector_ids: List[str], payloads: List[dict]) -> None:
+        with self._exclusive():
+            merged: Dict[str, dict] = {}
+            for vector_id, payload in zip(vector_ids, payloads):
+                if vector_id in self._rows:
+                    merged[vector_id] = {**merged.get(vector_id, self._payloads[self._rows[vector_id]]), **payload}
+            self._append_log([
+                {"id": vector_id, "row": self._rows[vector_id], "payload": payload} for vector_id, payload in merged.items()
+            ])
+
+    def _document_ids(self, file_name: str) -> List[str]:
+        return [
+            self._ids[row] for row in self._rows.values()
+            if self._payloads[row] and self._payloads[row].get("file_name") == file_name
+        ]
+
+    def set_document_payload(self, file_name: str, payload: dict) -> None:
+        with self._exclusive():
+            vector_ids = self._document_ids(file_name)
+            self.set_payloads(vector_ids, [payload] * len(vector_ids))
+
+    def delete_by_document(self, file_name: str) -> None:
+        with self._exclusive():
+            self.delete_vectors(self._document_ids(file_name))
+
+    def get_payloads(self, vector_ids: List[str]) -> Dict[str, dict]:
+        self.connect()
+        with self._lock:
+            self._refresh()
+            return {vector_id: self._payloads[self._rows[vector_id]] for vector_id in vector_ids if vector_id in self._rows}
+
+    async def aget_payloads(self, vector_ids: List[str]) -> Dict[str, dict]:
+        return await asyncio.to_thread(self.get_payloads, vector_ids)
+
+    async def asearch_hits(self, query_vector: List[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                           with_vectors: bool = False) -> List[SearchHit]:
+        return await asyncio.to_thread(self.search_hits, query_vector, top_k, search_filter, with_vectors)
+
+    def search_hits(self, query_vector: List[float], top_k: int, search_filter: Optional[SearchFilter] = None,
+                    with_vectors: bool = False) -> List[SearchHit]:
+        self.connect()
+        query = np.asarray(query_vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        with self._lock:
+            self._refresh()
+            if self._matrix is None or not self._rows:
+                return []
+            # The log can name rows past the matrix read with it, if another process grew the matrix in
+            # between: those rows are searched once the next refresh reopens it
+            count = min(self._count, self._matrix.shape[0])
+            if search_filter is not None:
+                # Only score the rows whose payload passes the filter
+                rows = np.fromiter(
+                    (row for row in self._rows.values() if row < count and search_filter.matches(self._payloads[row])),
+                    dtype=np.int64
+                )
+                if not len(rows):
+                    return []
+                rows.sort()
+                scores = self._matrix[rows].astype(np.float32, copy=False) @ query
+                k = min(top_k, len(rows))
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                return self._hits(rows[top], scores[top], with_vectors)
+            alive = self._alive[:count]
+            k = min(top_k, int(np.count_nonzero(alive)))
+            if k == 0:
+                return []
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, self._BLOCK_ROWS):
+                block = self._matrix[start:min(start + self._BLOCK_ROWS, count)]
+                scores[start:start + len(block)] = block.astype(np.float32, copy=False) @ query
+            scores[~alive] = -np.inf
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return self._hits(top, scores[top], with_vectors)
+
+    def _hits(self, rows: np.ndarray, scores: np.ndarray, with_vectors: bool) -> List[SearchHit]:
+        vectors = self._matrix[rows].astype(np.float32) if with_vectors else [None] * len(rows)
+        return [
+            SearchHit(self._ids[row], float(score), self._payloads[row], vector)
+            for row, score, vector in zip(rows, scores, vectors)
+        ]
+
+
+def get_vector_store() -> VectorStore:
+    """ Process-wide vector store selected by settings.VECTOR_STORE ("qdrant" or "local"), owned by the client registry """
+    return clients.vector_store
@@ -1,14 +1,48 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from core import database
 from routers import ingest, rag
-from core.memory import RedisChatMemory
+from core.answer_cache import answer_cache
+from core.clients import clients
+from core.embedding_cache import embedding_cache
+from core.jobs import ingest_queue
+from core.metrics import MetricsMiddleware, render as render_metrics
+
+
+#Lifespan 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+
+    #Initialize Postgres tables, and the indexes added to existing ones
+    database.Base.metadata.create_all(bind=database.engine)
+    database.create_indexes()
+    print("Postgres tables created.")
+
+    #Create the shared clients and connect the vector store (Qdrant or local) before serving
+    for warning in await clients.awarm():
+        print(f"Connection warm-up failed, connecting on first use instead: {warning}")
+    print("Clients ready.")
+
+    #Start ingestion workers (re-queues jobs interrupted by a restart)
+    await ingest_queue.start()
+    print("Ingestion workers started.")
+
+    yield
+
+    await ingest_queue.stop()
+    await clients.aclose()
+    print("Clients closed.")
+
+    embedding_cache.close()
 
 
 app = FastAPI(
     title="Palm Mind RAG API",
     description="Document ingestion & conversational RAG backend",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 #CORS 
@@ -24,31 +58,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-from core.memory import RedisChatMemory
-
-redis_chat_memory = RedisChatMemory()
-
-#Event Handlers 
-@app.on_event("startup")
-def startup_event():
-
-    #Initialize Postgres tables
-    database.Base.metadata.create_all(bind=database.engine)
-    print("Postgres tables created.")
-
-    #Connect to Redis
-    redis_chat_memory.connect()
-    print("Redis connected.")
-
-    #Connect to Qdrant
-    from core.qdrant_client import QdrantClientWrapper
-    QdrantClientWrapper().connect()
-    print("Qdrant connected.")
-
-@app.on_event("shutdown")
-def shutdown_event():
-    redis_chat_memory.close()
-    print("Redis disconnected.")
+# Per-route latency histograms, and the Server-Timing header when SERVER_TIMING is enabled
+app.add_middleware(MetricsMiddleware)
 
 
 #Routers 
@@ -56,9 +67,17 @@ app.include_router(ingest.router)
 app.include_router(rag.router)
 
 
+#Metrics
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """ Prometheus metrics of this worker process """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 #Health Check 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "message": "API is running"}
+    return {"status": "ok", "message": "API is running", "embedding_cache": embedding_cache.stats(),
+            "answer_cache": answer_cache.stats()}
 
 
@@ -1,81 +1,190 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-import uuid
 import os
+import uuid
+from typing import List, Optional
 
-from core import database, crud
-from core.utils.pdf import pdf_extract
-from core.utils.txt import txt_extract
-from core.chunking import chunk_text  # your chunking strategies
-from core.embeddings import generate_embeddings as get_embedding  # embedding function
-from core.qdrant_client import QdrantClientWrapper  # wrapper for Qdrant operations
+from app.config import settings
+from core import crud, database
+from core.chunking import CHUNK_STRATEGIES  # your chunking strategies
+from core.jobs import ingest_queue  # background ingestion workers
+from core.metrics import atimed
+from core.pagination import decode_cursor, json_array, paginate
+from core.utils.upload import UploadError, spool_multipart_file, spool_multipart_files
 
 router = APIRouter(prefix="/ingest", tags=["Document Ingestion"])
 
-qdrant_client = QdrantClientWrapper()  # initialize once, reuse
+# The body is parsed by spool_multipart_file, so the multipart schema is declared here for the docs
+_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    }
+}
+
+_BATCH_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            "required": ["files"],
+        }}},
+    }
+}
+
 
 # ----------------- Upload Endpoint -----------------
-@router.post("/upload")
+@router.post("/upload", status_code=202, openapi_extra=_UPLOAD_BODY)
 async def upload_file(
-    file: UploadFile = File(...),
-    chunk_strategy: str = "simple",  # selectable strategy
-    db: Session = Depends(database.get_db)
+    request: Request,
+    chunk_strategy: str = "fixed",  # selectable strategy: "fixed", "semantic" or "token"
+    tags: Optional[List[str]] = Query(None, description="Labels stored with every chunk, usable as search filters"),
 ):
-    # Validate file type
-    if not file.filename.endswith((".pdf", ".txt")):
-        raise HTTPException(status_code=400, detail="Only PDF and TXT files are allowed.")
+    """
+    Queue a document for ingestion and return its job id immediately.
+    The upload is streamed straight to the spool file in bounded chunks (MAX_UPLOAD_BYTES limit),
+    without buffering it in memory. Extraction, chunking, embedding and the Postgres writes run
+    on the ingestion workers; poll GET /ingest/jobs/{job_id} for progress.
+    """
+    if chunk_strategy not in CHUNK_STRATEGIES:
+        raise HTTPException(status_code=400, detail="Invalid chunking strategy. Use 'fixed', 'semantic' or 'token'.")
 
-    # Save uploaded file temporarily
-    file_id = str(uuid.uuid4())
-    temp_path = f"/tmp/{file_id}_{file.filename}"
-    with open(temp_path, "wb") as f:
-        f.write(await file.read())
-
-    # Extract text
+    # Spool the upload until a worker picks it up
+    job_id = str(uuid.uuid4())
     try:
-        if file.filename.endswith(".pdf"):
-            text = pdf_extract(temp_path)
-        else:
-            text = txt_extract(temp_path)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Text extraction failed: {e}")
-    finally:
-        os.remove(temp_path)
-
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="No text extracted from file.")
-
-    # Chunk text
-    chunks = chunk_text(text, strategy=chunk_strategy)
-    if not chunks:
-        raise HTTPException(status_code=500, detail="Chunking failed.")
-
-    # Generate embeddings
-    vector_ids = []
-    for chunk in chunks:
-        embedding_vector = get_embedding(chunk)  # returns List[float]
-        vec_id = str(uuid.uuid4())
-        # Upsert into Qdrant
-        qdrant_client.upsert_vector(vector_id=vec_id, vector=embedding_vector, payload={"chunk": chunk})
-        vector_ids.append(vec_id)
-
-    # Save metadata in Postgres
-    crud.save_document_metadata(
-        db=db,
-        file_name=file.filename,
-        chunks=chunks,
-        vector_ids=vector_ids,
-        chunk_strategy=chunk_strategy,
-        additional_metadata={"uploaded_by": "system"}  # optional
+        upload = await atimed("spool", spool_multipart_file(
+            request, path_for=lambda file_name: ingest_queue.spool_path(job_id, file_name)
+        ))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    await atimed("enqueue", ingest_queue.enqueue(
+        job_id, upload.file_name, upload.path, chunk_strategy, content_hash=upload.content_hash, tags=tags
+    ))
+
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": f"File '{upload.file_name}' queued for ingestion.",
+            "job_id": job_id,
+            "stage": "queued"
+        }
     )
 
+
+# ----------------- Batch Upload Endpoint -----------------
+@router.post("/batch", status_code=202, openapi_extra=_BATCH_BODY)
+async def upload_batch(
+    request: Request,
+    chunk_strategy: str = "fixed",
+    tags: Optional[List[str]] = Query(None, description="Labels stored with every chunk of every file"),
+):
+    """
+    Queue many documents (repeated "files" fields, up to INGEST_BATCH_MAX_FILES) as one job each.
+    Every file is streamed to the spool like /ingest/upload. The ingestion workers process the jobs
+    concurrently (INGEST_WORKERS), and their embedding calls are packed into shared, rate-limited
+    API requests. Poll GET /ingest/batches/{batch_id} for progress.
+    """
+    if chunk_strategy not in CHUNK_STRATEGIES:
+        raise HTTPException(status_code=400, detail="Invalid chunking strategy. Use 'fixed', 'semantic' or 'token'.")
+
+    job_ids = []
+
+    def path_for(file_name: str) -> str:
+        job_ids.append(str(uuid.uuid4()))
+        return ingest_queue.spool_path(job_ids[-1], file_name)
+
+    try:
+        uploads = await atimed("spool", spool_multipart_files(request, path_for=path_for))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    # Documents are keyed by file name, two jobs for the same name would race each other
+    if len({upload.file_name for upload in uploads}) != len(uploads):
+        for upload in uploads:
+            os.remove(upload.path)
+        raise HTTPException(status_code=400, detail="Duplicate file names in batch.")
+
+    batch_id = str(uuid.uuid4())
+    await atimed("enqueue", ingest_queue.enqueue_batch(batch_id, [
+        (job_id, upload.file_name, upload.path, upload.content_hash) for job_id, upload in zip(job_ids, uploads)
+    ], chunk_strategy, tags))
+
     return JSONResponse(
-        status_code=200,
+        status_code=202,
         content={
-            "message": f"File '{file.filename}' ingested successfully.",
-            "total_chunks": len(chunks),
-            "vector_ids": vector_ids
+            "message": f"{len(uploads)} files queued for ingestion.",
+            "batch_id": batch_id,
+            "jobs": [{"job_id": job_id, "file_name": upload.file_name} for job_id, upload in zip(job_ids, uploads)],
+            "stage": "queued"
         }
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/batches/{batch_id}")
+async def get_batch(batch_id: str):
+    """
+    Job counts per stage and the status of each job of a batch upload.
+    """
+    batch = await ingest_queue.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found.")
+    return batch
+
+
+# ----------------- Job Status Endpoint -----------------
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Stage (queued / processing / done / failed), chunk progress and timings of an ingestion job.
+    """
+    job = await ingest_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+# ----------------- Chunk Listing Endpoints -----------------
+def _chunk_item(row) -> dict:
+    metadata = row.additional_metadata or {}
+    return {"chunk_index": row.chunk_index, "vector_id": row.vector_id, "chunk_strategy": row.chunk_strategy,
+            "text": row.chunk_text, "start": metadata.get("start"), "end": metadata.get("end")}
+
+
+@router.get("/chunks")
+def list_chunks(response: Response, file_name: str,
+                limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+                cursor: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """
+    One page of a document's stored chunks in document order. While more remain, the X-Next-Cursor
+    response header holds the `cursor` of the next page.
+    """
+    try:
+        after = decode_cursor(cursor, (int, int)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    rows, next_cursor = paginate(crud.get_document_chunks(db, file_name, limit=limit + 1, after=after), limit,
+                                 key=lambda row: (row.chunk_index, row.id))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [_chunk_item(row) for row in rows]
+
+
+@router.get("/chunks/export")
+def export_chunks(file_name: str):
+    """ Every stored chunk of a document as a JSON array, streamed in keyset-ordered batches """
+    def pages():
+        db = database.SessionLocal()
+        try:
+            for rows in crud.iter_document_chunks(db, file_name):
+                yield [_chunk_item(row) for row in rows]
+        finally:
+            db.close()
+
+    return StreamingResponse(json_array(pages()), media_type="application/json")
@@ -1,28 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pydantic import BaseModel, EmailStr
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field
 from sqlalchemy.orm import Session
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Literal, Optional
+from datetime import datetime, timezone
+import asyncio
+import json
+
+from app.config import settings
 
 from core import database, crud
-from core.memory import RedisChatMemory  # Redis memory wrapper
-from core.qdrant_client import QdrantClientWrapper  #Qdrant client
-from core.llm import generate_answer  #using embeddings & context
+from core.memory import RedisChatMemory, get_chat_memory  # Redis memory wrapper
+from core.vector_store import VectorStore, get_vector_store, SearchHit, SearchFilter  #Qdrant or local vector index
+from core.lexical_index import lexical_index, reciprocal_rank_fusion, is_keyword_query
+from core.llm import build_messages, acomplete, astream_completion, asummarize  #using embeddings & context
+from core.embeddings import agenerate_embeddings
+from core.rerank import rerank_hits
+from core.neighbors import context_chunk_ids, expand_hits
+from core.answer_cache import answer_cache
+from core.metrics import timed, atimed
+from core.pagination import decode_cursor, json_array, paginate
 
 router = APIRouter(prefix="/rag", tags=["Conversational RAG"])
 
-qdrant_client = QdrantClientWrapper()
-chat_memory = RedisChatMemory()
-
 # ----------------- Pydantic Schemas -----------------
+class SearchFilters(BaseModel):
+    """ Scope retrieval to matching chunks; every given condition must hold, list fields match any value """
+    file_names: Optional[List[str]] = None
+    document_ids: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    chunk_strategy: Optional[str] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+    def to_filter(self) -> SearchFilter:
+        # Naive datetimes are taken as UTC, like the stored upload times
+        def utc(value: Optional[datetime]) -> Optional[datetime]:
+            return value.replace(tzinfo=timezone.utc) if value and value.tzinfo is None else value
+        return SearchFilter(
+            file_names=self.file_names,
+            document_ids=self.document_ids,
+            tags=self.tags,
+            chunk_strategy=self.chunk_strategy,
+            uploaded_after=utc(self.uploaded_after),
+            uploaded_before=utc(self.uploaded_before),
+        )
+
 class ChatRequest(BaseModel):
     user_id: str
     query: str
     max_results: int = 3
+    # vector: Qdrant only, lexical: local BM25 only (no embedding call),
+    # hybrid: both fused with reciprocal rank fusion, auto: lexical for keyword-like queries, else hybrid
+    retrieval_mode: Literal["vector", "lexical", "hybrid", "auto"] = settings.RETRIEVAL_MODE
+    # Pushed down into the vector search (Qdrant payload indexes); lexical hits are filtered by payload
+    filters: Optional[SearchFilters] = None
+    # Diversify the vector hits: mmr (maximal marginal relevance) or dedup (drop overlapping chunks),
+    # over RERANK_OVERSAMPLING x candidates; mmr_lambda 1 = pure relevance, 0 = pure diversity
+    rerank: Literal["none", "mmr", "dedup"] = settings.RERANK_METHOD
+    mmr_lambda: float = Field(settings.MMR_LAMBDA, ge=0.0, le=1.0)
+    # Small-to-big: send each hit with this many neighboring chunks on each side, overlapping windows merged
+    neighbor_window: int = Field(settings.NEIGHBOR_WINDOW, ge=0, le=settings.MAX_NEIGHBOR_WINDOW)
+    # Reuse the answer of an earlier, similar query that retrieved the same chunks. Only the opening turn
+    # of a conversation is cached: an answer built on one session's history is never served to another
+    use_cache: bool = True
 
 class ChatResponse(BaseModel):
     answer: str
     context_chunks: List[str]
+    token_usage: Optional[Dict[str, int]] = None  # None when the answer came from the cache
+    cached: bool = False
 
 class BookingRequest(BaseModel):
     name: str
@@ -37,33 +84,239 @@ class BookingResponse(BaseModel):
 
 
 # ----------------- Chat Endpoint -----------------
+async def _lexical_hits(query: str, top_k: int) -> List[SearchHit]:
+    results = await atimed("lexical_search", asyncio.to_thread(lexical_index.search, query, top_k))
+    return [SearchHit(vector_id, score, {"chunk": chunk}) for vector_id, score, chunk in results]
+
+
+# The BM25 index has no payloads: filtered lexical search oversamples, then checks the hits' payloads
+_LEXICAL_FILTER_OVERSAMPLING = 4
+
+
+async def _filtered_lexical_hits(vector_store: VectorStore, query: str, top_k: int,
+                                 search_filter: Optional[SearchFilter]) -> List[SearchHit]:
+    if search_filter is None:
+        return await _lexical_hits(query, top_k)
+    hits = await _lexical_hits(query, _LEXICAL_FILTER_OVERSAMPLING * top_k)
+    payloads = await vector_store.aget_payloads([hit.id for hit in hits])
+    return [
+        hit._replace(payload=payloads[hit.id]) for hit in hits
+        if search_filter.matches(payloads.get(hit.id))
+    ][:top_k]
+
+
+async def _vector_hits(vector_store: VectorStore, request: ChatRequest, query_vector: List[float], top_k: int,
+                       search_filter: Optional[SearchFilter]) -> List[SearchHit]:
+    """ Top-k vector hits; with reranking, the top-k of oversampled candidates fetched with their vectors """
+    if request.rerank == "none":
+        return await atimed("vector_search", vector_store.asearch_hits(
+            query_vector=query_vector, top_k=top_k, search_filter=search_filter
+        ))
+    candidates = await atimed("vector_search", vector_store.asearch_hits(
+        query_vector=query_vector, top_k=settings.RERANK_OVERSAMPLING * top_k, search_filter=search_filter,
+        with_vectors=True
+    ))
+    with timed("rerank"):
+        return rerank_hits(candidates, top_k, request.rerank, request.mmr_lambda)
+
+
+async def _load_memory(chat_memory: RedisChatMemory, user_id: str):
+    """ History and rolling summary of a session, read concurrently """
+    return await atimed("history", asyncio.gather(
+        chat_memory.aget_history(session_id=user_id),
+        chat_memory.aget_summary(session_id=user_id)
+    ))
+
+
+async def _retrieve(request: ChatRequest, vector_store: VectorStore, chat_memory: RedisChatMemory):
+    """
+    Fetch the conversation history, its rolling summary, the most relevant hits for a query and the
+    query embedding. The memory is read once, concurrently with the query embedding (or with the lexical
+    search, which skips the embedding call; the returned embedding is then None), and hybrid retrieval
+    runs its vector and lexical searches concurrently. With a neighbor window, the hits are then
+    expanded with their neighboring chunks.
+    """
+    mode = request.retrieval_mode
+    search_filter = request.filters.to_filter() if request.filters else None
+    if mode == "auto":
+        mode = "lexical" if is_keyword_query(request.query) else "hybrid"
+
+    memory = None
+    query_vector = None
+    try:
+        if mode == "lexical":
+            memory, hits = await asyncio.gather(
+                _load_memory(chat_memory, request.user_id),
+                _filtered_lexical_hits(vector_store, request.query, request.max_results, search_filter)
+            )
+            if not hits and request.retrieval_mode != "lexical":
+                mode = "hybrid"  # auto mode: nothing matched lexically, fall back to the vector index
+
+        if mode != "lexical":
+            embed = atimed("embed_query", agenerate_embeddings([request.query], model=settings.EMBEDDING_MODEL))
+            if memory is None:
+                memory, query_vectors = await asyncio.gather(_load_memory(chat_memory, request.user_id), embed)
+            else:
+                query_vectors = await embed
+            query_vector = query_vectors[0]
+
+        if mode == "vector":
+            hits = await _vector_hits(vector_store, request, query_vector, request.max_results, search_filter)
+        elif mode != "lexical":
+            # Oversample both rankings, then fuse
+            vector_hits, lexical_hits = await asyncio.gather(
+                _vector_hits(vector_store, request, query_vector, 2 * request.max_results, search_filter),
+                _filtered_lexical_hits(vector_store, request.query, 2 * request.max_results, search_filter)
+            )
+            by_id = {hit.id: hit for hit in lexical_hits + vector_hits}
+            fused = reciprocal_rank_fusion([[hit.id for hit in vector_hits], [hit.id for hit in lexical_hits]])
+            hits = [by_id[hit_id]._replace(score=score) for hit_id, score in fused[:request.max_results]]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Vector search failed: {e}")
+    history, summary = memory
+
+    if request.neighbor_window and hits:
+        try:
+            hits = await atimed("expand_neighbors", asyncio.to_thread(expand_hits, hits, request.neighbor_window))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Neighbor expansion failed: {e}")
+    return history, summary, hits, query_vector
+
+
+def _use_answer_cache(request: ChatRequest, query_vector: Optional[List[float]], hits: List[SearchHit],
+                      history: List[Dict[str, str]], summary: Optional[str]) -> bool:
+    # Entries are matched by query embedding and retrieved chunks, so lexical-only queries are not cached.
+    # Neither is any turn with history or a summary: the answer may draw on that private conversation.
+    return (settings.ANSWER_CACHE_ENABLED and request.use_cache and query_vector is not None and bool(hits)
+            and not history and not summary)
+
+
+def _cached_answer(request: ChatRequest, query_vector: Optional[List[float]], hits: List[SearchHit],
+                   history: List[Dict[str, str]], summary: Optional[str]) -> Optional[str]:
+    """ Answer of an earlier query similar to this one that retrieved exactly the same chunks, if cached """
+    if not _use_answer_cache(request, query_vector, hits, history, summary):
+        return None
+    with timed("answer_cache"):
+        entry = answer_cache.get(query_vector, context_chunk_ids(hits))
+    return entry.answer if entry else None
+
+
+def _cache_answer(request: ChatRequest, query_vector: Optional[List[float]], hits: List[SearchHit],
+                  history: List[Dict[str, str]], summary: Optional[str], answer: str) -> None:
+    if answer and _use_answer_cache(request, query_vector, hits, history, summary):
+        documents = {hit.payload["file_name"] for hit in hits if "file_name" in hit.payload}
+        answer_cache.put(query_vector, context_chunk_ids(hits), documents, answer)
+
+
+# Background compaction tasks, referenced so they are not garbage collected mid-flight
+_background_tasks = set()
+
+
+async def _save_turn(chat_memory: RedisChatMemory, request: ChatRequest, answer: str, history: List[Dict[str, str]],
+                     summary: Optional[str], usage: Optional[Dict[str, int]]) -> None:
+    """
+    Append the turn to Redis memory. When history no longer fits the prompt budget, or the list is
+    about to be trimmed, the older turns are folded into the rolling summary in the background.
+    usage is None for cached answers, which built no prompt.
+    """
+    await atimed("history_write", chat_memory.aappend_messages(
+        session_id=request.user_id,
+        messages=[
+            {"role": "user", "content": request.query},
+            {"role": "assistant", "content": answer},
+        ]
+    ))
+
+    dropped = usage["history_dropped"] if usage else 0
+    overflow = len(history) + 2 - chat_memory.max_messages
+    if dropped or overflow > 0:
+        n_oldest = max(dropped, overflow, len(history) // 2)
+        task = asyncio.create_task(chat_memory.acompact(
+            request.user_id, history[:n_oldest], len(history) + 2 - n_oldest, summary, asummarize
+        ))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @router.post("/query", response_model=ChatResponse)
-def query_rag(request: ChatRequest, db: Session = Depends(database.get_db)):
+async def query_rag(request: ChatRequest, vector_store: VectorStore = Depends(get_vector_store),
+                    chat_memory: RedisChatMemory = Depends(get_chat_memory)):
     """
     Multi-turn RAG query:
     - Retrieves relevant chunks from Qdrant
     - Maintains conversation context in Redis
-    - Generates answer via LLM
+    - Generates answer via LLM, or reuses the cached answer of a similar query with the same context
+    Fully async: the history fetch and the query embedding run concurrently.
     """
-    # Fetch previous conversation from Redis
-    history = chat_memory.get_history(user_id=request.user_id)
+    history, summary, hits, query_vector = await _retrieve(request, vector_store, chat_memory)
+    chunks = [hit.payload["chunk"] for hit in hits]
 
-    # Retrieve relevant chunks from Qdrant
-    try:
-        chunks = qdrant_client.semantic_search(
-            query=request.query,
-            top_k=request.max_results
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Vector search failed: {e}")
+    cached = _cached_answer(request, query_vector, hits, history, summary)
+    if cached is not None:
+        await _save_turn(chat_memory, request, cached, history, summary, None)
+        return ChatResponse(answer=cached, context_chunks=chunks, cached=True)
 
-    # Combine context + query for LLM
-    answer = generate_answer(query=request.query, context=chunks, history=history)
+    # Fit summary + history + context + query into the prompt budget
+    with timed("prompt"):
+        messages, usage = build_messages(query=request.query, context=chunks, history=history, summary=summary)
+    answer = await acomplete(messages)
+    _cache_answer(request, query_vector, hits, history, summary, answer)
 
     # Save the interaction to Redis memory
-    chat_memory.add_message(user_id=request.user_id, query=request.query, answer=answer)
+    await _save_turn(chat_memory, request, answer, history, summary, usage)
 
-    return ChatResponse(answer=answer, context_chunks=chunks)
+    return ChatResponse(answer=answer, context_chunks=chunks, token_usage=usage)
+
+
+@router.post("/query/stream")
+async def query_rag_stream(request: ChatRequest, vector_store: VectorStore = Depends(get_vector_store),
+                           chat_memory: RedisChatMemory = Depends(get_chat_memory)):
+    """
+    Streaming RAG query over server-sent events:
+    - `context`: ids of the context chunks (expanded neighbors included), the prompt token usage and
+      whether the answer is cached, sent before generation starts
+    - `token`: answer fragments as the LLM produces them (a cached answer is a single fragment)
+    - `done` (or `error`): end of stream; the full answer is then saved to Redis memory
+    """
+    history, summary, hits, query_vector = await _retrieve(request, vector_store, chat_memory)
+    chunks = [hit.payload["chunk"] for hit in hits]
+    cached = _cached_answer(request, query_vector, hits, history, summary)
+    messages, usage = None, None
+    if cached is None:
+        with timed("prompt"):
+            messages, usage = build_messages(query=request.query, context=chunks, history=history, summary=summary)
+
+    async def event_stream():
+        yield _sse("context", {"chunk_ids": context_chunk_ids(hits), "token_usage": usage,
+                               "cached": cached is not None})
+
+        if cached is not None:
+            answer = cached
+            yield _sse("token", {"text": answer})
+        else:
+            parts = []
+            try:
+                async for token in astream_completion(messages):
+                    parts.append(token)
+                    yield _sse("token", {"text": token})
+            except Exception as e:
+                yield _sse("error", {"detail": f"Answer generation failed: {e}"})
+                return
+            answer = "".join(parts)
+            _cache_answer(request, query_vector, hits, history, summary, answer)
+
+        await _save_turn(chat_memory, request, answer, history, summary, usage)
+        yield _sse("done", {})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # ----------------- Interview Booking Endpoint -----------------
@@ -89,13 +342,43 @@ def book_interview(request: BookingRequest, db: Session = Depends(database.get_d
 
 
 @router.get("/bookings", response_model=List[BookingResponse])
-def get_user_bookings(email: Optional[str] = None, db: Session = Depends(database.get_db)):
-    bookings = crud.get_bookings(db=db, email=email)
-    response = [
+def get_user_bookings(response: Response, email: Optional[str] = None,
+                      limit: int = Query(settings.PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+                      cursor: Optional[str] = None, db: Session = Depends(database.get_db)):
+    """
+    One page of bookings in interview date order. While more remain, the X-Next-Cursor response
+    header holds the `cursor` of the next page.
+    """
+    try:
+        after = decode_cursor(cursor, (datetime, int)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    bookings, next_cursor = paginate(crud.get_bookings(db=db, email=email, limit=limit + 1, after=after), limit,
+                                     key=lambda b: (b.interview_date, b.id))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [
         BookingResponse(
             message=f"Interview booked for {b.name} on {b.interview_date.date()} at {b.time_slot}",
             booking_id=b.id
         )
         for b in bookings
     ]
-    return response
+
+
+@router.get("/bookings/export")
+def export_bookings(email: Optional[str] = None):
+    """ Every booking (of one email, if given) as a JSON array, streamed in keyset-ordered batches """
+    def pages():
+        db = database.SessionLocal()
+        try:
+            for rows in crud.iter_bookings(db, email=email):
+                yield [
+                    {"booking_id": b.id, "name": b.name, "email": b.email, "interview_date": b.interview_date,
+                     "time_slot": b.time_slot, "notes": b.notes, "created_at": b.created_at}
+                    for b in rows
+                ]
+        finally:
+            db.close()
+
+    return StreamingResponse(json_array(pages()), media_type="application/json")
@@ -0,0 +1,89 @@
+"""
+Throughput of RedisChatMemory (pipelined append + trim + TTL, binary messages, shared pool)
+against the previous implementation (separate RPUSH / LTRIM calls, JSON messages).
+Runs against a local Redis when --redis-url is given, otherwise against fakeredis,
+which has no network round trips and so mostly measures encoding and client overhead.
+
+    python benchmarks/bench_chat_memory.py --redis-url redis://localhost:6379/15 --ops 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+import redis  # noqa: E402
+
+from core.memory import RedisChatMemory  # noqa: E402
+
+
+class LegacyChatMemory:
+    """ The previous implementation, kept for comparison """
+
+    def __init__(self, client, max_messages: int):
+        self.r = client
+        self.max_messages = max_messages
+
+    def append_messages(self, session_id, messages):
+        key = f"chat:{session_id}:history"
+        self.r.rpush(key, *[json.dumps({"role": m["role"], "content": m["content"]}) for m in messages])
+        self.r.ltrim(key, -self.max_messages, -1)
+
+    def get_history(self, session_id):
+        out = []
+        for x in self.r.lrange(f"chat:{session_id}:history", 0, -1):
+            obj = json.loads(x)
+            out.append({"role": str(obj["role"]), "content": str(obj["content"])})
+        return out
+
+
+def make_clients(redis_url):
+    if redis_url:
+        return redis.from_url(redis_url, decode_responses=True), redis.from_url(redis_url)
+    import fakeredis
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeRedis(server=server, decode_responses=True), fakeredis.FakeRedis(server=server)
+
+
+def run(memory, ops: int, sessions: int, content: str):
+    turn = [{"role": "user", "content": content}, {"role": "assistant", "content": content}]
+    started = time.perf_counter()
+    for i in range(ops):
+        memory.append_messages(f"bench:{i % sessions}", turn)
+    write = ops / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for i in range(ops):
+        memory.get_history(f"bench:{i % sessions}")
+    read = ops / (time.perf_counter() - started)
+    return write, read
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", default=None, help="local Redis to use; fakeredis when omitted")
+    parser.add_argument("--ops", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--message-chars", type=int, default=400)
+    parser.add_argument("--max-turns", type=int, default=10)
+    args = parser.parse_args()
+
+    legacy_client, client = make_clients(args.redis_url)
+    content = ("retrieval augmented generation answer " * (args.message_chars // 38 + 1))[:args.message_chars]
+
+    memory = RedisChatMemory(redis_url=args.redis_url or "redis://localhost:6379/0", max_turns=args.max_turns)
+    memory._redis = client
+    candidates = (
+        ("legacy", LegacyChatMemory(legacy_client, memory.max_messages)),
+        ("pipelined", memory),
+    )
+    for label, impl in candidates:
+        for key in client.scan_iter("chat:bench:*"):
+            client.delete(key)
+        write, read = run(impl, args.ops, args.sessions, content)
+        print(f"{label:<10} append {write:10.0f} ops/s   get_history {read:10.0f} ops/s")
+    used = sum(client.memory_usage(key) or 0 for key in client.scan_iter("chat:bench:*")) if args.redis_url else None
+    if used is not None:
+        print(f"pipelined memory usage: {used / 1024:.1f} KiB for {args.sessions} sessions")
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of the offset-based chunkers over multi-megabyte texts,
+against the previous string-concatenating semantic_chunk.
+
+    python benchmarks/bench_chunking.py --sizes-mb 1 4 16
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+from core.chunking import chunk_spans, stream_chunks  # noqa: E402
+
+
+def legacy_semantic_chunk(text, min_chunk_size=200, max_chunk_size=1000):
+    """ The previous implementation, kept for comparison """
+    paragraphs = re.split(r'\n+', text)
+    chunks = []
+    current_chunk = ""
+    for paragraph in paragraphs:
+        if len(current_chunk) + len(paragraph) + 1 <= max_chunk_size:
+            current_chunk = current_chunk + "\n" + paragraph if current_chunk else paragraph
+        else:
+            if len(current_chunk) >= min_chunk_size:
+                chunks.append(current_chunk)
+                current_chunk = paragraph
+            else:
+                current_chunk = current_chunk + "\n" + paragraph if current_chunk else paragraph
+            while len(current_chunk) > max_chunk_size:
+                split_point = current_chunk.rfind('.', 0, max_chunk_size)
+                if split_point == -1 or split_point < min_chunk_size:
+                    split_point = max_chunk_size
+                chunks.append(current_chunk[:split_point + 1].strip())
+                current_chunk = current_chunk[split_point + 1:].strip()
+    if current_chunk:
+        chunks.append(current_chunk)
+    return chunks
+
+
+def make_text(size: int, long_paragraphs: bool) -> str:
+    random.seed(0)
+    words = ["retrieval", "augmented", "generation", "vector", "index", "chunk", "answer", "query"]
+    parts, total = [], 0
+    while total < size:
+        n = random.randint(2000, 20000) if long_paragraphs else random.randint(20, 120)
+        paragraph = " ".join(random.choice(words) + ("." if random.random() < 0.05 else "") for _ in range(n))
+        parts.append(paragraph)
+        total += len(paragraph) + 1
+    return "\n".join(parts)[:size]
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    for size_mb in args.sizes_mb:
+        for long_paragraphs in (False, True):
+            text = make_text(int(size_mb * 1024 * 1024), long_paragraphs)
+            label = f"{size_mb:g}MB {'long' if long_paragraphs else 'short'} paragraphs"
+            legacy, _ = timed(lambda: legacy_semantic_chunk(text))
+            print(f"{label:<28} legacy semantic   {legacy * 1000:9.1f} ms")
+            for strategy in ("fixed", "semantic", "token"):
+                elapsed, spans = timed(lambda: chunk_spans(text, strategy))
+                print(f"{label:<28} {strategy:<8} spans    {elapsed * 1000:9.1f} ms  ({len(spans)} chunks)")
+            pages = [text[i:i + 4000] for i in range(0, len(text), 4000)]
+            elapsed, chunks = timed(lambda: sum(1 for _ in stream_chunks(pages, "semantic")))
+            print(f"{label:<28} semantic stream   {elapsed * 1000:9.1f} ms  ({chunks} chunks)")
@@ -0,0 +1,392 @@
+"""
+Offline end-to-end load benchmark of app.main:app.
+
+Starts two local processes: the fake OpenAI server (benchmarks/fake_openai.py) and the app under
+uvicorn, wired to in-process stand-ins: fakeredis (or --redis-url), SQLite (or --database-url) and
+the local NumPy vector store (or --vector-store qdrant with --qdrant-url). It then drives
+/ingest/upload (waiting for every job to finish) and /rag/query at the given concurrency and writes
+throughput, p50/p95/p99 latencies and a per-stage breakdown as JSON, so runs can be diffed.
+
+    python benchmarks/bench_load.py --docs 50 --queries 500 --concurrency 16 --output run.json
+    python benchmarks/bench_load.py --compare run.json --output run2.json
+
+Qdrant's in-memory mode is per client instance (the sync ingest client and the async search client
+would not see each other's points), so the in-process stand-in for Qdrant is the local vector store.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+from benchmarks import fake_openai  # noqa: E402
+
+
+# ----------------- App process -----------------
+def install_fake_redis() -> None:
+    """ Route every Redis client of the app to one in-process fakeredis server """
+    import fakeredis
+    import redis
+    import redis.asyncio as aredis
+
+    from app.config import settings
+    from core import jobs, memory
+
+    class PollingFakeAsyncRedis(fakeredis.FakeAsyncRedis):
+        """ fakeredis answers BLMOVE immediately; poll instead so idle ingest workers do not spin """
+
+        async def blmove(self, first_list, second_list, timeout, src="LEFT", dest="RIGHT"):
+            deadline = time.monotonic() + timeout
+            while True:
+                value = await self.lmove(first_list, second_list, src, dest)
+                if value is not None or time.monotonic() >= deadline:
+                    return value
+                await asyncio.sleep(0.01)
+
+    server = fakeredis.FakeServer()
+    memory._pools[settings.REDIS_URL] = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=server,
+                                                             max_connections=settings.REDIS_MAX_CONNECTIONS)
+    memory._apools[settings.REDIS_URL] = aredis.ConnectionPool(connection_class=fakeredis.FakeAsyncConnection,
+                                                               server=server, max_connections=settings.REDIS_MAX_CONNECTIONS)
+    jobs.ingest_queue._aredis = PollingFakeAsyncRedis(server=server, decode_responses=True)
+    jobs.ingest_queue._redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+
+
+def serve(port: int) -> None:
+    """ Run the app with per-stage timers around the query path, exposed on GET /__bench/stages """
+    if os.environ.get("BENCH_FAKE_REDIS") == "1":
+        install_fake_redis()
+
+    import uvicorn
+    import main
+    from routers import rag
+
+    stages = defaultdict(list)
+
+    def timed(name, fn):
+        if asyncio.iscoroutinefunction(fn):
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    stages[name].append(time.perf_counter() - started)
+        else:
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    stages[name].append(time.perf_counter() - started)
+        return wrapper
+
+    rag._retrieve = timed("retrieve", rag._retrieve)
+    rag.agenerate_embeddings = timed("embed_query", rag.agenerate_embeddings)
+    rag.build_messages = timed("build_prompt", rag.build_messages)
+    rag.acomplete = timed("generate", rag.acomplete)
+    rag._save_turn = timed("save_turn", rag._save_turn)
+
+    main.app.add_api_route("/__bench/stages", lambda: dict(stages), methods=["GET"], include_in_schema=False)
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# ----------------- Load driver -----------------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)  # uvicorn runs the shutdown handlers on SIGINT
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def summarize(seconds) -> dict:
+    if not len(seconds):
+        return {"count": 0}
+    ms = np.asarray(seconds, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "count": int(len(ms)), "mean_ms": round(float(ms.mean()), 3), "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3), "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def make_corpus(n_docs: int, doc_kb: float, seed: int = 0):
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ra", "ten", "vo", "shi", "qu", "ba", "del", "on", "tri", "zu", "pex"]
+    vocabulary = list({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(5000)})
+    docs, sentences = [], []
+    for _ in range(n_docs):
+        parts, size = [], 0
+        while size < doc_kb * 1024:
+            sentence = " ".join(rng.choices(vocabulary, k=rng.randint(8, 24))).capitalize() + "."
+            parts.append(sentence + ("\n\n" if rng.random() < 0.2 else " "))
+            size += len(sentence) + 1
+            sentences.append(sentence)
+        docs.append("".join(parts))
+    return docs, sentences
+
+
+async def run_workers(n: int, concurrency: int, fn) -> float:
+    """ Call fn(i) for i in range(n) with at most `concurrency` calls in flight; returns the wall time """
+    indices = iter(range(n))
+    started = time.perf_counter()
+
+    async def worker():
+        for i in indices:
+            await fn(i)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return time.perf_counter() - started
+
+
+async def drive(base_url: str, args) -> dict:
+    docs, sentences = make_corpus(args.docs, args.doc_kb)
+    rng = random.Random(1)
+    queries = [" ".join(rng.choice(sentences).rstrip(".").split()[:args.query_words]) for _ in range(args.queries)]
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        # Ingestion: upload every document, then wait for every job to finish
+        upload_latencies, job_ids, upload_errors = [], [], []
+
+        async def upload(i):
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/ingest/upload", params={"chunk_strategy": args.chunk_strategy},
+                    files={"file": (f"bench_{i}.txt", docs[i].encode("utf-8"), "text/plain")}
+                )
+                response.raise_for_status()
+                job_ids.append(response.json()["job_id"])
+            except httpx.HTTPError as e:
+                upload_errors.append(repr(e))
+                return
+            upload_latencies.append(time.perf_counter() - started)
+
+        ingest_started = time.perf_counter()
+        upload_wall = await run_workers(len(docs), args.concurrency, upload)
+
+        jobs, pending = {}, set(job_ids)
+        while pending:
+            for job_id in list(pending):
+                job = (await client.get(f"/ingest/jobs/{job_id}")).json()
+                if job["stage"] in ("done", "failed"):
+                    jobs[job_id] = job
+                    pending.discard(job_id)
+            if pending:
+                await asyncio.sleep(0.1)
+        ingest_wall = time.perf_counter() - ingest_started
+
+        done = [job for job in jobs.values() if job["stage"] == "done"]
+        job_stages = defaultdict(list)
+        for job in done:
+            job_stages["queue_wait"].append(job["started_at"] - job["created_at"])
+            job_stages["processing"].append(job["finished_at"] - job["started_at"])
+            if job["result"].get("time_to_first_vector") is not None:
+                job_stages["time_to_first_vector"].append(job["result"]["time_to_first_vector"])
+            for key, value in job["result"]["timings"].items():
+                job_stages[key[:-len("_seconds")]].append(value)
+
+        # Queries
+        query_latencies, query_errors = [], []
+
+        async def query(i):
+            started = time.perf_counter()
+            try:
+                response = await client.post("/rag/query", json={
+                    "user_id": f"bench-{i % args.sessions}", "query": queries[i],
+                    "max_results": args.max_results, "retrieval_mode": args.retrieval_mode,
+                })
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                query_errors.append(repr(e))
+                return
+            query_latencies.append(time.perf_counter() - started)
+
+        query_wall = await run_workers(len(queries), args.concurrency, query)
+        query_stages = (await client.get("/__bench/stages")).json()
+
+    return {
+        "ingest": {
+            "documents": len(docs),
+            "chunks": sum(job["result"]["total_chunks"] for job in done),
+            "upload_errors": len(upload_errors),
+            "failed_jobs": len(jobs) - len(done),
+            "upload_throughput_rps": round(len(upload_latencies) / upload_wall, 3) if upload_wall else 0,
+            "docs_per_second": round(len(done) / ingest_wall, 3) if ingest_wall else 0,
+            "upload_latency": summarize(upload_latencies),
+            "job_latency": summarize([job["finished_at"] - job["created_at"] for job in done]),
+            "stages": {name: summarize(values) for name, values in sorted(job_stages.items())},
+            "errors": upload_errors[:5] + [job.get("error") for job in jobs.values() if job["stage"] == "failed"][:5],
+        },
+        "query": {
+            "requests": len(queries),
+            "errors": len(query_errors),
+            "throughput_rps": round(len(query_latencies) / query_wall, 3) if query_wall else 0,
+            "latency": summarize(query_latencies),
+            "stages": {name: summarize(values) for name, values in sorted(query_stages.items())},
+            "error_samples": query_errors[:5],
+        },
+    }
+
+
+def compare(baseline: dict, current: dict) -> None:
+    rows = [
+        ("ingest upload", ("ingest", "upload_latency")),
+        ("ingest job", ("ingest", "job_latency")),
+        ("query", ("query", "latency")),
+    ]
+    rows += [(f"query {name}", ("query", "stages", name)) for name in current["query"]["stages"]]
+    rows += [(f"ingest {name}", ("ingest", "stages", name)) for name in current["ingest"]["stages"]]
+    print(f"\n{'':<28}{'p50 ms':>22}{'p95 ms':>22}{'p99 ms':>22}")
+    for label, path in rows:
+        before, after = baseline, current
+        for key in path:
+            before, after = (before or {}).get(key), (after or {}).get(key)
+        if not before or not after or not after.get("count"):
+            continue
+        cells = []
+        for p in ("p50_ms", "p95_ms", "p99_ms"):
+            delta = (after[p] - before[p]) / before[p] * 100 if before.get(p) else 0.0
+            cells.append(f"{before.get(p, 0):8.1f} -> {after[p]:7.1f} {delta:+5.0f}%")
+        print(f"{label:<28}" + "".join(f"{cell:>22}" for cell in cells))
+
+
+def fake_openai_cmd(args, port: int) -> list:
+    return [
+        sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"), "--port", str(port),
+        "--dims", str(args.dims), "--embed-latency-ms", str(args.embed_latency_ms),
+        "--embed-item-latency-ms", str(args.embed_item_latency_ms), "--chat-latency-ms", str(args.chat_latency_ms),
+        "--token-latency-ms", str(args.token_latency_ms), "--answer-tokens", str(args.answer_tokens),
+    ]
+
+
+def app_env(args, workdir: str, openai_port: int) -> dict:
+    """ Environment of an app process wired to the fake OpenAI server and the in-process stand-ins """
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [ROOT, os.path.join(ROOT, "app"), os.environ.get("PYTHONPATH")])),
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "OPENAI_API_KEY": "bench",
+        "VECTOR_SIZE": str(args.dims),
+        "VECTOR_STORE": args.vector_store,
+        "LOCAL_VECTOR_STORE_PATH": os.path.join(workdir, "vector_store"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical_index.sqlite3"),
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embeddings.sqlite3"),
+        "INGEST_SPOOL_DIR": os.path.join(workdir, "spool"),
+        "INGEST_WORKERS": str(args.ingest_workers),
+        "DATABASE_URL": args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "BENCH_FAKE_REDIS": "0" if args.redis_url else "1",
+    }
+    if args.redis_url:
+        env["REDIS_URL"] = args.redis_url
+    if args.qdrant_url:
+        env["QDRANT_URL"] = args.qdrant_url
+    return env
+
+
+def run(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    openai_port, app_port = free_port(), free_port()
+
+    fake_cmd = fake_openai_cmd(args, openai_port)
+    env = app_env(args, workdir, openai_port)
+
+    fake = subprocess.Popen(fake_cmd, cwd=workdir)
+    server = None
+    try:
+        wait_ready(f"http://127.0.0.1:{openai_port}/stats", fake)
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(app_port)],
+                                  cwd=workdir, env=env)
+        wait_ready(f"http://127.0.0.1:{app_port}/health", server)
+        results = asyncio.run(drive(f"http://127.0.0.1:{app_port}", args))
+        results["fake_openai"] = httpx.get(f"http://127.0.0.1:{openai_port}/stats").json()
+    finally:
+        if server is not None:
+            stop(server)
+        stop(fake)
+
+    results["config"] = {key: value for key, value in vars(args).items() if key not in ("serve", "port", "output", "compare")}
+    results["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                     capture_output=True, text=True).stdout.strip() or None,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--docs", type=int, default=20)
+    parser.add_argument("--doc-kb", type=float, default=32.0)
+    parser.add_argument("--chunk-strategy", default="fixed")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-words", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--max-results", type=int, default=3)
+    parser.add_argument("--retrieval-mode", default="vector", choices=["vector", "lexical", "hybrid", "auto"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--vector-store", default="local", choices=["local", "qdrant"])
+    parser.add_argument("--qdrant-url", default=None)
+    parser.add_argument("--redis-url", default=None, help="local Redis to use; in-process fakeredis when omitted")
+    parser.add_argument("--database-url", default=None, help="SQLAlchemy URL; a temporary SQLite file when omitted")
+    parser.add_argument("--output", default=None, help="write the results JSON here")
+    parser.add_argument("--compare", default=None, help="results JSON of an earlier run to diff against")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        sys.exit(0)
+
+    results = run(args)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
@@ -0,0 +1,65 @@
+"""
+Compare the per-object ORM write path with crud.save_document_metadata's bulk INSERT ... RETURNING
+path, and bulk deletion, against the configured Postgres (POSTGRES_* env vars).
+
+    python benchmarks/bench_metadata_writes.py --chunks 10000 20000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+from core import crud, database, models  # noqa: E402
+
+
+def orm_save(db, file_name, chunks, vector_ids):
+    """ The previous implementation: one ORM object per chunk """
+    for idx, (chunk, vec_id) in enumerate(zip(chunks, vector_ids)):
+        db.add(models.DocumentMetadata(
+            file_name=file_name,
+            chunk_text=chunk,
+            chunk_index=idx,
+            vector_id=vec_id,
+            chunk_strategy="fixed",
+            additional_metadata={"uploaded_by": "bench"}
+        ))
+    db.flush()
+
+
+def bulk_save(db, file_name, chunks, vector_ids):
+    crud.save_document_metadata(db, file_name, chunks, vector_ids, "fixed", {"uploaded_by": "bench"})
+
+
+def run(n: int) -> None:
+    chunks = [f"chunk {i} " + "lorem ipsum dolor sit amet " * 18 for i in range(n)]
+    for label, save in (("orm", orm_save), ("bulk", bulk_save)):
+        db = database.SessionLocal()
+        file_name = f"bench-{uuid.uuid4()}.txt"
+        vector_ids = [str(uuid.uuid4()) for _ in range(n)]
+        try:
+            started = time.perf_counter()
+            save(db, file_name, chunks, vector_ids)
+            db.commit()
+            write = time.perf_counter() - started
+
+            started = time.perf_counter()
+            crud.delete_document_metadata(db, file_name)
+            db.commit()
+            remove = time.perf_counter() - started
+        finally:
+            db.close()
+        print(f"{label:>4} n={n:>6}  write {write:7.3f}s ({n / write:9.0f} rows/s)  bulk delete {remove:6.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, nargs="+", default=[10000])
+    args = parser.parse_args()
+
+    database.Base.metadata.create_all(bind=database.engine)
+    for n in args.chunks:
+        run(n)
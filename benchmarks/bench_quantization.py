@@ -0,0 +1,111 @@
+"""
+Recall-versus-latency report for Qdrant quantization modes on a fixed query set.
+
+Each mode gets its own scratch collection loaded with the same vectors; ground truth is an exact
+(full-scan, full-precision) search. Vectors come from a .npy file of embeddings, or are random
+unit vectors when --vectors is not given.
+
+    QDRANT_URL=http://localhost:6333 python benchmarks/bench_quantization.py --points 100000 --json report.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+from qdrant_client import QdrantClient, models  # noqa: E402
+
+from app.config import settings  # noqa: E402
+from core.qdrant_client import init_collection, search_params  # noqa: E402
+
+MODES = ("none", "scalar", "binary")
+
+
+def load_vectors(path, points, dim, seed):
+    rng = np.random.default_rng(seed)
+    if path:
+        vectors = np.load(path).astype(np.float32)[:points]
+    else:
+        vectors = rng.standard_normal((points, dim), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def make_queries(vectors, n, seed):
+    """ Perturbed copies of stored vectors, so every query has meaningful neighbours """
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.choice(len(vectors), size=n, replace=False)]
+    queries = picked + 0.3 * rng.standard_normal(picked.shape, dtype=np.float32) / np.sqrt(picked.shape[1])
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def load_collection(client, name, mode, vectors, batch_size=1024):
+    init_collection(vector_size=vectors.shape[1], recreate=True, client=client, collection_name=name, quantization=mode)
+    for start in range(0, len(vectors), batch_size):
+        block = vectors[start:start + batch_size]
+        client.upsert(
+            collection_name=name,
+            points=models.Batch(ids=list(range(start, start + len(block))), vectors=block.tolist()),
+            wait=True,
+        )
+    # Wait for indexing/quantization to finish before timing searches
+    while client.get_collection(name).status != models.CollectionStatus.GREEN:
+        time.sleep(0.5)
+
+
+def search_ids(client, name, query, k, params):
+    hits = client.query_points(collection_name=name, query=query.tolist(), limit=k, search_params=params).points
+    return [hit.id for hit in hits]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=settings.VECTOR_SIZE)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--vectors", help=".npy file with embeddings to load instead of random vectors")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch collections")
+    args = parser.parse_args()
+
+    client = QdrantClient(url=settings.QDRANT_URL)
+    vectors = load_vectors(args.vectors, args.points, args.dim, args.seed)
+    queries = make_queries(vectors, args.queries, args.seed)
+
+    report = {"points": len(vectors), "dim": vectors.shape[1], "queries": len(queries), "k": args.k, "modes": {}}
+    truth = None
+    for mode in MODES:
+        name = f"bench_quantization_{mode}"
+        load_collection(client, name, mode, vectors)
+        if truth is None:
+            exact = models.SearchParams(exact=True)
+            truth = [set(search_ids(client, name, q, args.k, exact)) for q in queries]
+
+        params = search_params(mode)
+        latencies, recalls = [], []
+        for query, expected in zip(queries, truth):
+            started = time.perf_counter()
+            found = search_ids(client, name, query, args.k, params)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(len(expected.intersection(found)) / args.k)
+
+        report["modes"][mode] = {
+            "recall_at_k": round(float(np.mean(recalls)), 4),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        }
+        print(f"{mode:>7}  recall@{args.k} {report['modes'][mode]['recall_at_k']:.4f}  "
+              f"p50 {report['modes'][mode]['p50_ms']:7.2f} ms  p95 {report['modes'][mode]['p95_ms']:7.2f} ms")
+        if not args.keep:
+            client.delete_collection(name)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
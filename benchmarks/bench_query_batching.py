@@ -0,0 +1,83 @@
+"""
+Query throughput with and without cross-request micro-batching of query embeddings.
+
+Runs the bench_load.py workload twice against the fake OpenAI server, with QUERY_EMBEDDING_LINGER_MS=0
+(one embeddings request per query) and then with --linger-ms, at --concurrency concurrent queries. The
+embedding and answer caches are off, so every query embeds. Reports query throughput, latency, the
+embed_query stage and the embeddings requests the fake server received (ingestion included).
+--embedding-rpm lowers the requests-per-minute budget, where one request per query queues behind the
+rate limit:
+
+    python benchmarks/bench_query_batching.py --concurrency 200 --queries 2000 --embedding-rpm 600
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+from benchmarks import bench_load, fake_openai  # noqa: E402
+
+
+def run(args, linger_ms: float) -> dict:
+    os.environ.update({
+        "QUERY_EMBEDDING_LINGER_MS": str(linger_ms),
+        "QUERY_EMBEDDING_MAX_BATCH": str(args.max_batch),
+        "EMBEDDING_RPM": str(args.embedding_rpm),
+        "EMBEDDING_CACHE_ENABLED": "false",
+        "ANSWER_CACHE_ENABLED": "false",
+        # One Redis connection per query in flight, so the pool does not fail queries before the embeddings
+        "REDIS_MAX_CONNECTIONS": str(max(50, 2 * args.concurrency)),
+    })
+    results = bench_load.run(args)
+    stats = results["fake_openai"]
+    return {
+        "linger_ms": linger_ms,
+        "query_errors": results["query"]["errors"],
+        "query_error_samples": results["query"]["error_samples"],
+        "throughput_rps": results["query"]["throughput_rps"],
+        "latency": results["query"]["latency"],
+        "embed_query": results["query"]["stages"].get("embed_query"),
+        "embedding_requests": stats["embedding_requests"],
+        "embedding_inputs_per_request": round(stats["embedding_inputs"] / max(stats["embedding_requests"], 1), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--linger-ms", type=float, default=5.0, help="QUERY_EMBEDDING_LINGER_MS of the batched run")
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--embedding-rpm", type=float, default=3000)
+    parser.add_argument("--docs", type=int, default=5)
+    parser.add_argument("--doc-kb", type=float, default=8.0)
+    parser.add_argument("--max-results", type=int, default=3)
+    parser.add_argument("--vector-store", default="local", choices=["local", "qdrant"])
+    parser.add_argument("--qdrant-url", default=None)
+    parser.add_argument("--redis-url", default=None, help="local Redis to use; in-process fakeredis when omitted")
+    parser.add_argument("--database-url", default=None, help="SQLAlchemy URL; a temporary SQLite file when omitted")
+    parser.add_argument("--output", default=None, help="write the results JSON here")
+    fake_openai.add_arguments(parser)
+    # A short completion, so the embedding calls are a visible share of a query
+    parser.set_defaults(chat_latency_ms=50.0, token_latency_ms=1.0)
+    args = parser.parse_args()
+    args.chunk_strategy, args.query_words, args.sessions, args.retrieval_mode = "fixed", 8, 50, "vector"
+    args.ingest_workers, args.request_timeout = 2, 300.0
+
+    results = {"unbatched": run(args, 0), "batched": run(args, args.linger_ms)}
+    before, after = results["unbatched"], results["batched"]
+    results["throughput_gain"] = (round(after["throughput_rps"] / before["throughput_rps"], 2)
+                                  if before["throughput_rps"] else None)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Cost and effect of the post-retrieval rerank stage (core.rerank) on synthetic candidate sets.
+
+Candidates mimic fixed_chunk output: groups of overlapping chunks from the same document whose
+vectors are near-duplicates of each other. For each k the stage gets RERANK_OVERSAMPLING * k
+candidates; the report shows the latency of mmr / dedup (median and p95, in ms), the mean pairwise
+cosine similarity of the returned hits compared with a plain top-k, and, for truncated comparisons
+(--dims), how many of the returned hits match a full-dimension run. The synthetic vectors are not
+trained to be truncated like text-embedding-3's, so that agreement is a pessimistic estimate.
+
+    python benchmarks/bench_rerank.py --k 5 10 50 --dim 1536 --dims 0 256 --repeat 200
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+from app.config import settings  # noqa: E402
+from core.rerank import rerank_hits  # noqa: E402
+from core.vector_store import SearchHit  # noqa: E402
+
+
+def make_candidates(n, dim, group_size, seed):
+    """ n relevance-ordered hits in groups of group_size overlapping chunks of one document """
+    rng = np.random.default_rng(seed)
+    query = rng.standard_normal(dim).astype(np.float32)
+    query /= np.linalg.norm(query)
+    hits = []
+    for group in range(0, n, group_size):
+        base = query + 1.5 * rng.standard_normal(dim).astype(np.float32) / np.sqrt(dim)
+        for j in range(min(group_size, n - group)):
+            vector = base + 0.15 * rng.standard_normal(dim).astype(np.float32) / np.sqrt(dim)
+            vector /= np.linalg.norm(vector)
+            start = 400 * j  # 500-character chunks with 100 characters of overlap
+            payload = {"chunk": "", "file_name": f"doc{group}.txt", "start": start, "end": start + 500}
+            hits.append(SearchHit(f"{group}-{j}", float(vector @ query), payload, vector))
+    hits.sort(key=lambda hit: -hit.score)
+    return hits
+
+
+def mean_pairwise_similarity(hits, vectors_by_id):
+    vectors = np.asarray([vectors_by_id[hit.id] for hit in hits])
+    similarity = vectors @ vectors.T
+    n = len(hits)
+    return float((similarity.sum() - n) / max(n * (n - 1), 1))
+
+
+def time_method(hits, k, method, dims, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = rerank_hits(hits, k, method, dims=dims)
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, float(np.median(timings)), float(np.percentile(timings, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 50])
+    parser.add_argument("--dim", type=int, default=settings.VECTOR_SIZE)
+    parser.add_argument("--oversampling", type=int, default=settings.RERANK_OVERSAMPLING)
+    parser.add_argument("--dims", type=int, nargs="+", default=[0, 256],
+                        help="leading dimensions compared between candidates, 0 = all")
+    parser.add_argument("--group-size", type=int, default=4, help="overlapping chunks per document")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    report = []
+    print(f"{'k':>4} {'n':>5} {'method':>6} {'dims':>5} {'median ms':>10} {'p95 ms':>8} {'pairwise sim':>13} {'same hits':>10}")
+    for k in args.k:
+        n = args.oversampling * k
+        hits = make_candidates(n, args.dim, args.group_size, args.seed)
+        vectors_by_id = {hit.id: hit.vector for hit in hits}
+        baseline = mean_pairwise_similarity(hits[:k], vectors_by_id)
+        print(f"{k:>4} {n:>5} {'top-k':>6} {'':>5} {'':>10} {'':>8} {baseline:>13.3f}")
+        for method in ("mmr", "dedup"):
+            exact = {hit.id for hit in rerank_hits(hits, k, method, dims=0)}
+            for dims in args.dims:
+                # Vectors arrive as arrays from the local store, as float lists from Qdrant
+                for source, candidates in (("array", hits), ("list", [hit._replace(vector=hit.vector.tolist()) for hit in hits])):
+                    result, median, p95 = time_method(candidates, k, method, dims, args.repeat)
+                    similarity = mean_pairwise_similarity(result, vectors_by_id)
+                    same = len(exact & {hit.id for hit in result}) / len(result)
+                    label = method if source == "array" else f"{method}*"
+                    print(f"{k:>4} {n:>5} {label:>6} {dims or args.dim:>5} {median:>10.3f} {p95:>8.3f} {similarity:>13.3f} {same:>10.0%}")
+                    report.append({"k": k, "candidates": n, "method": method, "dims": dims or args.dim, "vectors": source,
+                                   "median_ms": round(median, 4), "p95_ms": round(p95, 4),
+                                   "pairwise_similarity": round(similarity, 4),
+                                   "top_k_pairwise_similarity": round(baseline, 4), "same_hits_as_full": round(same, 4)})
+    print("* vectors given as Python float lists (Qdrant JSON responses), including the conversion to NumPy")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Import time, cold start and connection count of one API worker process.
+
+- import: wall time of `import main` (and `import cli`) in fresh interpreters, median of --repeat runs,
+  plus the heaviest packages of one run under -X importtime
+- cold start: time from spawning a worker (bench_load.py --serve: fakeredis, the local vector store and
+  the fake OpenAI server) until /health answers, i.e. imports plus the lifespan's warm-up, and the
+  latency of the first /rag/query after that
+- sockets: TCP connections the worker holds, by peer, once ready and after --docs uploads and
+  --queries queries at --concurrency (read from /proc, so Linux only)
+
+--root measures another checkout with this script, e.g. a git worktree of an older commit:
+
+    git worktree add /tmp/before HEAD~1
+    python benchmarks/bench_startup.py --output after.json
+    python benchmarks/bench_startup.py --root /tmp/before --output before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
+
+import httpx  # noqa: E402
+
+from benchmarks import bench_load, fake_openai  # noqa: E402
+
+_IMPORT_CODE = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+_ESTABLISHED = "01"
+_WELL_KNOWN_PORTS = {6379: "redis", 6333: "qdrant", 6334: "qdrant", 5432: "postgres"}
+
+
+def python_path(root: str) -> str:
+    return os.pathsep.join(filter(None, [root, os.path.join(root, "app"), os.environ.get("PYTHONPATH")]))
+
+
+def import_seconds(module: str, env: dict, cwd: str) -> float:
+    result = subprocess.run([sys.executable, "-c", _IMPORT_CODE.format(module=module)],
+                            env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def heaviest_imports(module: str, env: dict, cwd: str, top: int = 10) -> dict:
+    """ Cumulative import time (ms) of the top-level packages loaded by `import module` """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, cwd=cwd, capture_output=True, text=True, check=True)
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if cumulative.strip().isdigit() and name == name.split(".")[0] and name != module:
+            packages[name] = max(packages.get(name, 0), int(cumulative) / 1000)
+    return {name: round(ms, 1) for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]}
+
+
+def _proc_sockets(pid: int) -> set:
+    inodes = set()
+    for fd in os.listdir(f"/proc/{pid}/fd"):
+        try:
+            target = os.readlink(f"/proc/{pid}/fd/{fd}")
+        except OSError:
+            continue
+        if target.startswith("socket:["):
+            inodes.add(target[8:-1])
+    return inodes
+
+
+def tcp_connections(pid: int, labels: dict, app_port: int) -> dict:
+    """ Established TCP connections of a process, counted by peer label """
+    inodes = _proc_sockets(pid)
+    counts = Counter()
+    for table in ("tcp", "tcp6"):
+        try:
+            with open(f"/proc/{pid}/net/{table}") as f:
+                rows = f.read().splitlines()[1:]
+        except OSError:
+            continue
+        for row in rows:
+            fields = row.split()
+            local_port, remote_port = int(fields[1].rsplit(":", 1)[1], 16), int(fields[2].rsplit(":", 1)[1], 16)
+            if fields[3] != _ESTABLISHED or fields[9] not in inodes:
+                continue
+            if local_port == app_port:
+                counts["inbound"] += 1
+            else:
+                counts[labels.get(remote_port) or _WELL_KNOWN_PORTS.get(remote_port, f"port {remote_port}")] += 1
+    return dict(sorted(counts.items()))
+
+
+def wait_health(url: str, process: subprocess.Popen, timeout: float = 120.0) -> float:
+    """ Poll url every 10 ms; seconds until it answered 200 """
+    started = time.perf_counter()
+    with httpx.Client(timeout=1.0) as client:
+        while time.perf_counter() - started < timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"app exited with code {process.returncode} before becoming ready")
+            try:
+                if client.get(url).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+def load_args(args) -> argparse.Namespace:
+    """ Workload settings for bench_load.drive """
+    return argparse.Namespace(docs=args.docs, doc_kb=8.0, chunk_strategy="fixed", queries=args.queries,
+                              query_words=8, sessions=20, max_results=3, retrieval_mode="vector",
+                              concurrency=args.concurrency, request_timeout=120.0)
+
+
+def cold_start(args, root: str, openai_port: int, run: int, measure_load: bool) -> dict:
+    workdir = tempfile.mkdtemp(prefix="rag-startup-")
+    app_port = bench_load.free_port()
+    env = {**bench_load.app_env(args, workdir, openai_port), "PYTHONPATH": python_path(root)}
+    labels = {openai_port: "openai"}
+
+    spawned = time.perf_counter()
+    server = subprocess.Popen([sys.executable, os.path.join(root, "benchmarks", "bench_load.py"), "--serve",
+                               "--port", str(app_port)], cwd=workdir, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        ready = wait_health(f"http://127.0.0.1:{app_port}/health", server)
+        result = {"ready_ms": round(ready * 1000, 1), "sockets_ready": tcp_connections(server.pid, labels, app_port)}
+
+        started = time.perf_counter()
+        response = httpx.post(f"http://127.0.0.1:{app_port}/rag/query", timeout=60.0,
+                              json={"user_id": f"startup-{run}", "query": "first query after a cold start"})
+        response.raise_for_status()
+        result["first_query_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["spawn_to_first_answer_ms"] = round((time.perf_counter() - spawned) * 1000, 1)
+
+        if measure_load:
+            report = asyncio.run(bench_load.drive(f"http://127.0.0.1:{app_port}", load_args(args)))
+            result["sockets_after_load"] = tcp_connections(server.pid, labels, app_port)
+            result["load"] = {"query_p50_ms": report["query"]["latency"].get("p50_ms"),
+                              "query_errors": report["query"]["errors"],
+                              "failed_jobs": report["ingest"]["failed_jobs"]}
+        return result
+    finally:
+        bench_load.stop(server)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--root", default=ROOT, help="checkout to measure (default: this one)")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters / workers per measurement")
+    parser.add_argument("--modules", nargs="+", default=["main", "cli"])
+    parser.add_argument("--docs", type=int, default=10, help="uploads before counting sockets")
+    parser.add_argument("--queries", type=int, default=200, help="queries before counting sockets")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--vector-store", default="local", choices=["local", "qdrant"])
+    parser.add_argument("--qdrant-url", default=None)
+    parser.add_argument("--redis-url", default=None, help="local Redis to use; in-process fakeredis when omitted")
+    parser.add_argument("--database-url", default=None, help="SQLAlchemy URL; a temporary SQLite file when omitted")
+    parser.add_argument("--ingest-workers", type=int, default=2)
+    parser.add_argument("--output", default=None, help="write the results JSON here")
+    fake_openai.add_arguments(parser)
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    workdir = tempfile.mkdtemp(prefix="rag-startup-")
+    openai_port = bench_load.free_port()
+    env = {**bench_load.app_env(args, workdir, openai_port), "PYTHONPATH": python_path(root)}
+
+    results = {"root": root, "imports": {}}
+    for module in args.modules:
+        seconds = [import_seconds(module, env, workdir) for _ in range(args.repeat)]
+        results["imports"][module] = {
+            "median_ms": round(statistics.median(seconds) * 1000, 1),
+            "min_ms": round(min(seconds) * 1000, 1),
+            "heaviest_packages_ms": heaviest_imports(module, env, workdir),
+        }
+
+    fake = subprocess.Popen(bench_load.fake_openai_cmd(args, openai_port), cwd=workdir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        bench_load.wait_ready(f"http://127.0.0.1:{openai_port}/stats", fake)
+        # Only the last worker also runs the load, so the earlier ones measure an undisturbed cold start
+        runs = [cold_start(args, root, openai_port, run, measure_load=run == args.repeat - 1)
+                for run in range(args.repeat)]
+    finally:
+        bench_load.stop(fake)
+
+    results["cold_start"] = {
+        key: round(statistics.median(run[key] for run in runs), 1)
+        for key in ("ready_ms", "first_query_ms", "spawn_to_first_answer_ms")
+    }
+    results["sockets"] = {"ready": runs[-1]["sockets_ready"], "after_load": runs[-1]["sockets_after_load"]}
+    results["load"] = runs[-1]["load"]
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
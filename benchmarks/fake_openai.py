@@ -0,0 +1,124 @@
+"""
+Local stand-in for the OpenAI embeddings and chat completions APIs, with configurable latency.
+Embeddings are hashed bag-of-words vectors, so texts sharing words are close in cosine space
+and retrieval behaves plausibly. Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python benchmarks/fake_openai.py --port 8900 --embed-latency-ms 40 --chat-latency-ms 300
+"""
+import argparse
+import asyncio
+import base64
+import json
+import re
+import time
+import zlib
+
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+_WORD = re.compile(r"\w+")
+
+
+def embed(text: str, dims: int) -> np.ndarray:
+    vector = np.zeros(dims, dtype=np.float32)
+    for word in _WORD.findall(text.lower()):
+        h = zlib.crc32(word.encode("utf-8"))
+        vector[h % dims] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        vector[zlib.crc32(text.encode("utf-8")) % dims] = 1.0
+        return vector
+    return vector / norm
+
+
+def create_app(dims: int, embed_latency: float, embed_item_latency: float, chat_latency: float,
+               token_latency: float, answer_tokens: int) -> Starlette:
+    stats = {"embedding_requests": 0, "embedding_inputs": 0, "chat_requests": 0}
+
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        stats["embedding_requests"] += 1
+        stats["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(embed_latency + embed_item_latency * len(inputs))
+        data = []
+        for i, text in enumerate(inputs):
+            vector = embed(text, dims)
+            if body.get("encoding_format") == "base64":
+                encoded = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                encoded = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": encoded})
+        tokens = sum(len(text.split()) for text in inputs)
+        return JSONResponse({
+            "object": "list", "data": data, "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["chat_requests"] += 1
+        words = [f"token{i}" for i in range(min(answer_tokens, body.get("max_tokens") or answer_tokens))]
+        base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+        await asyncio.sleep(chat_latency)
+
+        if not body.get("stream"):
+            await asyncio.sleep(token_latency * len(words))
+            return JSONResponse({
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": " ".join(words)}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(words), "total_tokens": len(words)},
+            })
+
+        async def events():
+            for i, word in enumerate(words):
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": {"content": (" " if i else "") + word}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(token_latency)
+            done = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+            yield f"data: {json.dumps(done)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route("/v1/embeddings", embeddings, methods=["POST"]),
+        Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+        Route("/stats", get_stats),
+    ])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--embed-latency-ms", type=float, default=40.0, help="per embeddings request")
+    parser.add_argument("--embed-item-latency-ms", type=float, default=0.2, help="per input text")
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0, help="time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=10.0, help="per generated token")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    app = create_app(
+        dims=args.dims,
+        embed_latency=args.embed_latency_ms / 1000,
+        embed_item_latency=args.embed_item_latency_ms / 1000,
+        chat_latency=args.chat_latency_ms / 1000,
+        token_latency=args.token_latency_ms / 1000,
+        answer_tokens=args.answer_tokens,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
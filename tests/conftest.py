@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app imports both `app.config` and `core.*`, like uvicorn run from the app directory
+sys.path[:0] = [ROOT, os.path.join(ROOT, "app")]
@@ -0,0 +1,106 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import answer_cache as answer_cache_module
+from core.answer_cache import AnswerCache
+from core.vector_store import SearchHit
+from routers import rag
+
+
+def test_hit_needs_similar_query_and_same_chunks():
+    cache = AnswerCache(max_items=4, ttl=60, threshold=0.9)
+    cache.put([1.0, 0.0], ["c1", "c2"], ["a.txt"], "answer")
+    assert cache.get([0.99, 0.05], ["c2", "c1"]).answer == "answer"
+    assert cache.get([0.99, 0.05], ["c1"]) is None  # other context
+    assert cache.get([0.0, 1.0], ["c1", "c2"]) is None  # other question
+    assert cache.get([1.0, 0.0, 0.0], ["c1", "c2"]) is None  # other embedding model
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache_module.time, "time", lambda: now[0])
+    cache = AnswerCache(max_items=4, ttl=10, threshold=0.9)
+    cache.put([1.0, 0.0], ["c1"], ["a.txt"], "answer")
+    now[0] += 11
+    assert cache.get([1.0, 0.0], ["c1"]) is None
+    assert cache.stats()["evictions"]["expired"] == 1 and cache.stats()["items"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = AnswerCache(max_items=2, ttl=60, threshold=0.99)
+    cache.put([1.0, 0.0, 0.0], ["a"], ["a.txt"], "A")
+    cache.put([0.0, 1.0, 0.0], ["b"], ["b.txt"], "B")
+    assert cache.get([1.0, 0.0, 0.0], ["a"]).answer == "A"  # B is now the least recently used
+    cache.put([0.0, 0.0, 1.0], ["c"], ["c.txt"], "C")
+    assert cache.get([0.0, 1.0, 0.0], ["b"]) is None
+    assert cache.get([1.0, 0.0, 0.0], ["a"]).answer == "A"
+    assert cache.get([0.0, 0.0, 1.0], ["c"]).answer == "C"
+    assert cache.stats()["evictions"]["lru"] == 1
+
+
+def test_invalidate_documents():
+    cache = AnswerCache(max_items=4, ttl=60, threshold=0.9)
+    cache.put([1.0, 0.0], ["a1", "b1"], ["a.txt", "b.txt"], "AB")
+    cache.put([0.0, 1.0], ["b2"], ["b.txt"], "B")
+    cache.put([1.0, 1.0], ["c1"], ["c.txt"], "C")
+    assert cache.invalidate_documents(["b.txt"]) == 2
+    assert cache.get([1.0, 0.0], ["a1", "b1"]) is None
+    assert cache.get([1.0, 1.0], ["c1"]).answer == "C"
+    assert cache.invalidate_documents(["a.txt"]) == 0
+    cache.clear()
+    assert cache.stats()["items"] == 0
+
+
+def test_threshold_must_be_a_similarity():
+    with pytest.raises(ValueError):
+        AnswerCache(threshold=0.0)
+
+
+@pytest.fixture
+def rag_client(monkeypatch):
+    histories = {
+        "alice": [{"role": "user", "content": "my account number is 1234"}, {"role": "assistant", "content": "noted"}],
+        "bob": [{"role": "user", "content": "I live in Oslo"}, {"role": "assistant", "content": "noted"}],
+    }
+    prompts = []
+
+    async def fake_retrieve(request, vector_store, chat_memory):
+        return histories.get(request.user_id, []), None, [SearchHit("c1", 0.9, {"chunk": "text"})], [1.0, 0.0]
+
+    async def fake_complete(messages):
+        prompts.append(messages)
+        return f"answer {len(prompts)}"
+
+    async def fake_save_turn(*args):
+        pass
+
+    monkeypatch.setattr(rag, "_retrieve", fake_retrieve)
+    monkeypatch.setattr(rag, "acomplete", fake_complete)
+    monkeypatch.setattr(rag, "_save_turn", fake_save_turn)
+    monkeypatch.setattr(rag, "answer_cache", AnswerCache(max_items=4, ttl=60, threshold=0.9))
+    app = FastAPI()
+    app.include_router(rag.router)
+    app.dependency_overrides[rag.get_vector_store] = lambda: None
+    app.dependency_overrides[rag.get_chat_memory] = lambda: None
+    return TestClient(app), rag.answer_cache
+
+
+def test_answers_built_on_a_conversation_are_not_shared(rag_client):
+    client, cache = rag_client
+    alice = client.post("/rag/query", json={"user_id": "alice", "query": "what do you know about me?"}).json()
+    bob = client.post("/rag/query", json={"user_id": "bob", "query": "what do you know about me?"}).json()
+    assert (alice["answer"], alice["cached"]) == ("answer 1", False)
+    assert (bob["answer"], bob["cached"]) == ("answer 2", False)
+    assert cache.stats()["items"] == 0 and cache.stats()["hits"] == 0
+
+
+def test_opening_turns_share_answers(rag_client):
+    client, cache = rag_client
+    first = client.post("/rag/query", json={"user_id": "carol", "query": "what is it?"}).json()
+    second = client.post("/rag/query", json={"user_id": "dave", "query": "what is it?"}).json()
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["answer"] == first["answer"] == "answer 1"
+    # A session with history neither reads nor writes the shared entries
+    assert client.post("/rag/query", json={"user_id": "alice", "query": "what is it?"}).json()["cached"] is False
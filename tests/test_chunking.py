@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from core import chunking, tokens
+from core.chunking import chunk_spans, chunk_text, stream_chunks
+
+
+@pytest.fixture(autouse=True)
+def approximate_tokens(monkeypatch):
+    """ Token chunking against the word/punctuation approximation, which needs no vocabulary download """
+    monkeypatch.setattr(tokens, "_encoding", lambda model: None)
+
+
+def _random_text(rng: random.Random, length: int) -> str:
+    words = ["alpha", "beta", "gamma.", "delta,", "epsilon", "zeta!", "eta", "theta."]
+    parts = []
+    while sum(map(len, parts)) < length:
+        parts.append(rng.choice(words))
+        parts.append(rng.choice([" ", " ", " ", "  ", "\n", "\n\n"]))
+    return "".join(parts)
+
+
+def _blocks(rng: random.Random, text: str):
+    cuts = sorted(rng.sample(range(1, len(text)), min(20, len(text) - 1)))
+    return [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("strategy,kwargs", [
+    ("fixed", {"chunk_size": 120, "overlap": 30}),
+    ("fixed", {"chunk_size": 100, "overlap": 0}),
+    ("semantic", {"min_chunk_size": 50, "max_chunk_size": 200}),
+    ("token", {"max_tokens": 40, "overlap_tokens": 8}),
+])
+def test_stream_chunks_matches_chunk_text(strategy, kwargs):
+    rng = random.Random(strategy + str(kwargs))
+    for _ in range(50):
+        text = _random_text(rng, rng.randint(1, 5000))
+        streamed = list(stream_chunks(_blocks(rng, text), strategy, window=rng.randint(100, 1500), **kwargs))
+        assert [chunk.text for chunk in streamed] == chunk_text(text, strategy, **kwargs)
+        assert [(chunk.start, chunk.end) for chunk in streamed] == chunk_spans(text, strategy, **kwargs)
+
+
+@pytest.mark.parametrize("strategy", ["semantic", "token"])
+def test_stream_chunks_cuts_input_without_boundaries(strategy):
+    text = "word," * 10_000
+    chunks = stream_chunks((text[i:i + 1000] for i in range(0, len(text), 1000)), strategy,
+                           window=1000, max_buffer=5000)
+    first = next(chunks)  # yielded before the whole text was read
+    assert first.start == 0
+    rest = list(chunks)
+    assert rest[-1].end == len(text)
+
+
+def test_spans_slice_the_text():
+    text = "First paragraph. It has two sentences.\n\nSecond paragraph.\n" * 20
+    for strategy in chunking.CHUNK_STRATEGIES:
+        spans = chunk_spans(text, strategy)
+        assert chunk_text(text, strategy) == [text[start:end] for start, end in spans]
+        assert all(0 <= start < end <= len(text) for start, end in spans)
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+from core.clients import ClientRegistry
+
+
+class FakeClient:
+    def __init__(self):
+        self.closed = []
+
+    def close(self):
+        self.closed.append("close")
+
+    async def aclose(self):
+        self.closed.append("aclose")
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+def test_clients_are_created_on_first_use_and_shared():
+    registry = ClientRegistry()
+    assert registry._clients == {}
+    openai = registry.openai
+    assert registry.openai is openai
+    assert list(registry._clients) == ["openai"]
+
+
+def test_concurrent_first_use_creates_one_client():
+    registry = ClientRegistry()
+    created = []
+
+    def factory():
+        time.sleep(0.01)
+        created.append(object())
+        return created[-1]
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry._get("slow", factory))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1 and all(result is created[0] for result in results)
+
+
+def test_aclose_closes_what_was_created_and_allows_reuse():
+    registry = ClientRegistry()
+    memory, store, qdrant, aqdrant = FakeClient(), FakeClient(), FakeClient(), FakeAsyncClient()
+    for name, client in (("chat_memory", memory), ("vector_store", store), ("qdrant", qdrant), ("aqdrant", aqdrant)):
+        registry._get(name, lambda client=client: client)
+
+    asyncio.run(registry.aclose())
+    assert memory.closed == ["close", "aclose"]
+    assert store.closed == ["aclose"] and qdrant.closed == ["close"] and aqdrant.closed
+    assert registry._clients == {}
+    # Closed clients are not handed out again: the next use creates a new one
+    assert registry._get("qdrant", FakeClient) is not qdrant
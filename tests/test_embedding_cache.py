@@ -0,0 +1,34 @@
+from core.embedding_cache import EmbeddingCache, make_key
+
+
+def test_make_key_normalizes_whitespace():
+    assert make_key("m", "a  b\n") == make_key("m", "a b")
+    assert make_key("m", "a b") != make_key("other", "a b")
+
+
+def test_disk_and_memory_tiers(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = EmbeddingCache(path, max_memory_items=1)
+    cache.put_many({b"a": [1.0, 2.0], b"b": [3.0]})
+    assert cache.get_many([b"a", b"b", b"c"]) == {b"a": [1.0, 2.0], b"b": [3.0]}
+    assert (cache.memory_hits, cache.disk_hits, cache.misses) == (1, 1, 1)
+    cache.close()
+    assert EmbeddingCache(path).get_many([b"a"]) == {b"a": [1.0, 2.0]}
+
+
+def test_replaced_rows_are_not_counted_twice(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"))
+    for _ in range(3):
+        cache.put_many({b"a": [1.0, 2.0], b"b": [3.0]})
+    assert cache.stats()["disk_bytes"] == 12
+    cache.put_many({b"a": [1.0]})
+    assert cache.stats()["disk_bytes"] == 8
+
+
+def test_eviction_keeps_recently_used_rows(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_memory_items=0, max_disk_bytes=40)
+    for i in range(10):
+        cache.put_many({bytes([i]): [float(i)] * 2})  # 8 bytes each
+        cache.get_many([bytes([0])])  # keep the first row recently used
+    assert cache.stats()["disk_bytes"] <= 40
+    assert bytes([0]) in cache.get_many([bytes([0])])
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core import embedding_scheduler
+from core.embedding_scheduler import EmbeddingScheduler, QueryEmbeddingBatcher
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """ Budget accounting without the tokenizer, which may need to download its vocabulary """
+    monkeypatch.setattr(embedding_scheduler, "count_tokens", lambda text, model: len(text.split()))
+
+
+def fake_embed(texts, model):
+    return [[float(len(text))] for text in texts]
+
+
+def test_packs_callers_and_returns_their_own_vectors():
+    calls = []
+
+    def embed(texts, model):
+        calls.append(list(texts))
+        return fake_embed(texts, model)
+
+    scheduler = EmbeddingScheduler(embed, max_items=8, linger=0.05, timeout=5)
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.__setitem__(i, scheduler.embed(["x" * i, "y"], "m")))
+               for i in range(1, 4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: [[float(i)], [1.0]] for i in range(1, 4)}
+    assert len(calls) < 3  # packed into fewer requests than callers
+
+
+def test_dispatch_error_fails_the_batch_and_keeps_dispatching(monkeypatch):
+    scheduler = EmbeddingScheduler(fake_embed, max_concurrency=1, linger=0, timeout=5)
+    failures = iter([RuntimeError("tokenizer unavailable")])
+
+    def count_tokens(text, model):
+        error = next(failures, None)
+        if error is not None:
+            raise error
+        return 1
+
+    monkeypatch.setattr(embedding_scheduler, "count_tokens", count_tokens)
+    with pytest.raises(RuntimeError, match="tokenizer unavailable"):
+        scheduler.embed(["a"], "m")
+    # The dispatcher thread and its concurrency slot survived the failure
+    assert scheduler.embed(["bb", "c"], "m") == [[2.0], [1.0]]
+
+
+def test_request_errors_reach_the_caller():
+    def embed(texts, model):
+        raise ValueError("bad request")
+
+    scheduler = EmbeddingScheduler(embed, linger=0, timeout=5)
+    with pytest.raises(ValueError, match="bad request"):
+        scheduler.embed(["a"], "m")
+
+
+def test_embed_times_out_instead_of_blocking_forever():
+    release = threading.Event()
+
+    def embed(texts, model):
+        release.wait(5)
+        return fake_embed(texts, model)
+
+    scheduler = EmbeddingScheduler(embed, linger=0, timeout=0.2)
+    started = time.monotonic()
+    with pytest.raises(TimeoutError):
+        scheduler.embed(["a"], "m")
+    assert time.monotonic() - started < 2
+    release.set()
+
+
+def _batcher(calls, fail=False, **kwargs):
+    async def send(texts, model):
+        calls.append((model, list(texts)))
+        if fail:
+            raise RuntimeError("embeddings unavailable")
+        return fake_embed(texts, model)
+
+    return QueryEmbeddingBatcher(send, **kwargs)
+
+
+def test_query_batcher_sends_concurrent_callers_together():
+    calls = []
+    batcher = _batcher(calls, linger=0.01, max_batch=64)
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.embed(["a"], "m"), batcher.embed(["bb", "a"], "m"), batcher.embed(["ccc"], "other")
+        )
+
+    assert asyncio.run(scenario()) == [[[1.0]], [[2.0], [1.0]], [[3.0]]]
+    assert sorted(calls) == [("m", ["a", "bb"]), ("other", ["ccc"])]  # one request per model, "a" once
+
+
+def test_query_batcher_flushes_full_batches_without_lingering():
+    calls = []
+    batcher = _batcher(calls, linger=60, max_batch=3)
+
+    async def scenario():
+        return await asyncio.wait_for(asyncio.gather(
+            batcher.embed(["a", "b"], "m"), batcher.embed(["c", "d"], "m")
+        ), timeout=5)
+
+    assert asyncio.run(scenario()) == [[[1.0], [1.0]], [[1.0], [1.0]]]
+    assert calls == [("m", ["a", "b"]), ("m", ["c", "d"])]  # callers are not split across requests
+
+
+def test_query_batcher_fails_every_caller_of_a_failed_request():
+    batcher = _batcher([], fail=True, linger=0.01)
+
+    async def scenario():
+        return await asyncio.gather(batcher.embed(["a"], "m"), batcher.embed(["b"], "m"), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(scenario())] == ["embeddings unavailable"] * 2
+
+
+def test_query_batcher_without_linger_sends_directly():
+    calls = []
+    batcher = _batcher(calls, linger=0)
+    assert asyncio.run(batcher.embed(["a"], "m")) == [[1.0]]
+    assert asyncio.run(batcher.embed([], "m")) == []
+    assert calls == [("m", ["a"])]
+
+
+def test_query_embeddings_reserve_off_the_event_loop(monkeypatch):
+    from types import SimpleNamespace
+
+    from core import embeddings
+
+    threads = []
+
+    def reserve(texts, model):
+        threads.append(threading.current_thread())
+        return 0.0
+
+    async def create(input, model, encoding_format):
+        return SimpleNamespace(usage=None, data=[SimpleNamespace(embedding=[1.0]) for _ in input])
+
+    monkeypatch.setattr(embeddings.embedding_scheduler, "reserve", reserve)
+    monkeypatch.setattr(embeddings, "clients", SimpleNamespace(aopenai=SimpleNamespace(embeddings=SimpleNamespace(create=create))))
+    monkeypatch.setattr(embeddings, "record_usage", lambda model, usage: None)
+    assert asyncio.run(embeddings._arequest_embeddings(["a", "b"], "m")) == [[1.0], [1.0]]
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,26 @@
+from core.embeddings import iter_batches
+from core.qdrant_client import QdrantClientWrapper
+
+
+class FakeQdrant:
+    def __init__(self):
+        self.calls = []
+
+    def upsert(self, collection_name, points, wait=False):
+        self.calls.append(([point.id for point in points], wait))
+
+
+def test_iter_batches_caps_items_and_chars():
+    assert list(iter_batches(["a", "b", "c", "d", "e"], max_items=2, max_chars=100)) == [["a", "b"], ["c", "d"], ["e"]]
+    assert list(iter_batches(["aaa", "bb", "c", "dddd"], max_items=10, max_chars=5)) == [["aaa", "bb"], ["c", "dddd"]]
+    # A chunk longer than the character cap still goes out, alone
+    assert list(iter_batches(["a", "x" * 10, "b"], max_items=10, max_chars=5)) == [["a"], ["x" * 10], ["b"]]
+    assert list(iter_batches([], max_items=2, max_chars=5)) == []
+
+
+def test_upsert_vectors_waits_only_on_the_last_batch():
+    store = QdrantClientWrapper.__new__(QdrantClientWrapper)
+    store.client = FakeQdrant()
+    ids = [f"id{i}" for i in range(5)]
+    store.upsert_vectors(ids, [[float(i)] for i in range(5)], [{"chunk": i} for i in range(5)], batch_size=2)
+    assert store.client.calls == [(["id0", "id1"], False), (["id2", "id3"], False), (["id4"], True)]
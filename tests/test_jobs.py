@@ -0,0 +1,113 @@
+import asyncio
+import threading
+
+import fakeredis
+import pytest
+import redis
+
+from core import jobs
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    server = fakeredis.FakeServer()
+    queue = jobs.IngestJobQueue(workers=1)
+    queue._aredis = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    queue._redis = fakeredis.FakeRedis(server=server, decode_responses=True)
+    monkeypatch.setattr(jobs, "MAX_BACKOFF", 0.01)
+    return queue
+
+
+def test_requeue_interrupted_skips_live_workers(queue):
+    async def scenario():
+        r = queue._get_aredis()
+        await r.rpush(jobs._processing_key("dead-0"), "a", "b")
+        await r.rpush(jobs._processing_key("live-0"), "c")
+        await r.set(jobs._lease_key("live-0"), 1, ex=30)
+        await r.rpush(jobs.PROCESSING_KEY, "d")
+        assert await queue.requeue_interrupted() == 3
+        assert sorted(await r.lrange(jobs.QUEUE_KEY, 0, -1)) == ["a", "b", "d"]
+        assert await r.lrange(jobs._processing_key("live-0"), 0, -1) == ["c"]
+
+    asyncio.run(scenario())
+
+
+def test_worker_survives_redis_errors(queue, monkeypatch):
+    done = []
+
+    def run(job_id):
+        done.append(job_id)
+        queue._stopping = True
+
+    monkeypatch.setattr(queue, "_run", run)
+    r = queue._get_aredis()
+    blmove, failures = r.blmove, [redis.ConnectionError("connection reset")]
+
+    async def flaky_blmove(*args, **kwargs):
+        if failures:
+            raise failures.pop()
+        return await blmove(*args, **kwargs)
+
+    monkeypatch.setattr(r, "blmove", flaky_blmove)
+
+    async def scenario():
+        await r.rpush(jobs.QUEUE_KEY, "job-1")
+        await asyncio.wait_for(queue._worker("w-0"), timeout=5)
+        assert done == ["job-1"]
+        assert await r.llen(jobs._processing_key("w-0")) == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_worker_keeps_its_running_job(queue, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+
+    def run(job_id):
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(queue, "_run", run)
+
+    async def scenario():
+        r = queue._get_aredis()
+        await r.rpush(jobs.QUEUE_KEY, "job-1")
+        worker = asyncio.create_task(queue._worker("w-0"))
+        await asyncio.to_thread(started.wait, 5)
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        assert await r.lrange(jobs._processing_key("w-0"), 0, -1) == ["job-1"]
+        release.set()
+
+    asyncio.run(scenario())
+
+
+def test_job_that_lost_redis_is_failed_and_released(queue, monkeypatch, tmp_path):
+    spooled = tmp_path / "job-1_a.txt"
+    spooled.write_text("text")
+
+    def run(job_id):
+        queue._redis.hset(jobs._job_key(job_id), "stage", "processing")
+        raise redis.ConnectionError("connection reset")
+
+    monkeypatch.setattr(queue, "_run", run)
+    r = queue._get_aredis()
+    lrem, failures = r.lrem, [redis.ConnectionError("still down")]
+
+    async def flaky_lrem(*args):
+        if failures:
+            raise failures.pop()
+        queue._stopping = True
+        return await lrem(*args)
+
+    monkeypatch.setattr(r, "lrem", flaky_lrem)
+
+    async def scenario():
+        await r.hset(jobs._job_key("job-1"), mapping={"stage": "queued", "path": str(spooled)})
+        await r.rpush(jobs.QUEUE_KEY, "job-1")
+        await asyncio.wait_for(queue._worker("w-0"), timeout=5)
+        assert await r.llen(jobs._processing_key("w-0")) == 0
+        job = await r.hgetall(jobs._job_key("job-1"))
+        assert job["stage"] == "failed" and "lost Redis" in job["error"]
+        assert not spooled.exists()
+
+    asyncio.run(scenario())
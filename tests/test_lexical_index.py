@@ -0,0 +1,39 @@
+from core.lexical_index import BM25Index, is_keyword_query, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_keeps_codes_together():
+    assert tokenize("Order AB-1234 needs v2.1, snake_case!") == ["order", "ab-1234", "needs", "v2.1", "snake_case"]
+
+
+def test_search_ranks_and_matches_whole_codes(tmp_path):
+    index = BM25Index(str(tmp_path / "index.sqlite3"))
+    index.add(["a", "b", "c"], [
+        "Part AB-1234 ships with firmware v2.1.",
+        "Part AB-9999 replaces the old part.",
+        "Unrelated text about shipping schedules.",
+    ])
+    assert [hit[0] for hit in index.search("AB-1234", 5)] == ["a"]
+    assert [hit[0] for hit in index.search("part", 5)] == ["b", "a"]  # two occurrences rank first
+    assert index.search("missing", 5) == []
+    assert index.search("...", 5) == []
+
+
+def test_writers_do_not_lose_updates(tmp_path):
+    path = str(tmp_path / "index.sqlite3")
+    first, second = BM25Index(path), BM25Index(path)  # e.g. two worker processes
+    first.add(["a"], ["apples and pears"])
+    second.add(["b"], ["pears and plums"])
+    first.add(["a"], ["apples and pears"])  # already indexed
+    assert sorted(hit[0] for hit in second.search("pears", 5)) == ["a", "b"]
+
+    second.remove(["a"])
+    assert [hit[0] for hit in first.search("pears apples", 5)] == ["b"]
+    first.add(["a"], ["apples again"])
+    assert [hit[0] for hit in BM25Index(path).search("apples", 5)] == ["a"]
+
+
+def test_reciprocal_rank_fusion_and_keyword_queries():
+    assert [item for item, _ in reciprocal_rank_fusion([["a", "b"], ["b", "c"]])] == ["b", "a", "c"]
+    assert is_keyword_query("AB-1234")
+    assert is_keyword_query('"exact phrase here please"')
+    assert not is_keyword_query("what is the refund policy?")
@@ -0,0 +1,108 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from core import vector_store
+from core.vector_store import LocalVectorStore, SearchFilter
+
+
+def _unit(i: int, dim: int = 8) -> list:
+    vector = np.zeros(dim)
+    vector[i % dim] = 1.0
+    return vector.tolist()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "store")
+
+
+def test_search_and_filter(path):
+    store = LocalVectorStore(path)
+    store.upsert_vectors(["a", "b", "c"], [_unit(0), _unit(1), _unit(2)],
+                         [{"file_name": "x.txt"}, {"file_name": "y.txt"}, {"file_name": "x.txt"}])
+    assert [hit.id for hit in store.search_hits(_unit(1), 1)] == ["b"]
+    hits = store.search_hits(_unit(1), 3, SearchFilter(file_names=["x.txt"]))
+    assert sorted(hit.id for hit in hits) == ["a", "c"]
+    hits = asyncio.run(store.asearch_hits(_unit(2), 1, with_vectors=True))
+    assert hits[0].id == "c" and np.allclose(hits[0].vector, _unit(2))
+
+
+def test_repeated_id_in_one_upsert_is_stored_once(path):
+    store = LocalVectorStore(path)
+    store.upsert_vectors(["a", "a"], [_unit(0), _unit(1)], [{"n": 1}, {"n": 2}])
+    hits = store.search_hits(_unit(1), 5)
+    assert [(hit.id, hit.payload) for hit in hits] == [("a", {"n": 2})]
+    assert LocalVectorStore(path).get_payloads(["a"]) == {"a": {"n": 2}}
+
+
+def test_processes_sharing_a_directory_do_not_reuse_rows(path):
+    first, second = LocalVectorStore(path), LocalVectorStore(path)
+    first.upsert_vectors(["a"], [_unit(0)], [{"n": "a"}])
+    second.upsert_vectors(["b"], [_unit(1)], [{"n": "b"}])  # must not take row 0
+    first.upsert_vectors(["c"], [_unit(2)], [{"n": "c"}])
+    for store in (first, second, LocalVectorStore(path)):
+        for i, vector_id in enumerate("abc"):
+            assert [hit.id for hit in store.search_hits(_unit(i), 1)] == [vector_id]
+    second.delete_vectors(["a"])
+    assert "a" not in {hit.id for hit in first.search_hits(_unit(0), 5)}
+
+
+def test_deleted_rows_are_reused(path):
+    store, reader = LocalVectorStore(path), LocalVectorStore(path)
+    store.upsert_vectors(["a", "b", "c"], [_unit(0), _unit(1), _unit(2)], [{"n": "a"}, {"n": "b"}, {"n": "c"}])
+    assert len(reader.search_hits(_unit(0), 5)) == 3
+    store.delete_vectors(["a", "c"])
+    store.upsert_vectors(["d", "b", "e", "f"], [_unit(3), _unit(4), _unit(5), _unit(6)],
+                         [{"n": "d"}, {"n": "b2"}, {"n": "e"}, {"n": "f"}])
+    assert store._count == 4  # d and e took the rows of a and c, f the next one
+    for other in (store, reader, LocalVectorStore(path)):
+        for i, (vector_id, n) in enumerate([("d", "d"), ("b", "b2"), ("e", "e"), ("f", "f")], start=3):
+            [hit] = other.search_hits(_unit(i), 1)
+            assert (hit.id, hit.payload) == (vector_id, {"n": n})
+        assert sorted(hit.id for hit in other.search_hits(_unit(0), 10)) == ["b", "d", "e", "f"]
+
+
+def test_search_ignores_rows_past_a_stale_matrix(path, tmp_path, monkeypatch):
+    store, reader = LocalVectorStore(path), LocalVectorStore(path)
+    store.upsert_vectors([f"v{i}" for i in range(1000)], [_unit(0)] * 1000, [{}] * 1000)
+    assert len(reader.search_hits(_unit(0), 5)) == 5
+    stale_meta = tmp_path / "meta.json"
+    stale_meta.write_text(open(store._meta_path()).read())
+    store.upsert_vectors([f"w{i}" for i in range(100)], [_unit(1)] * 100, [{}] * 100)  # grows the matrix
+    # The reader replays the new log entries, but reads the metadata from before the growth
+    monkeypatch.setattr(reader, "_meta_path", lambda: str(stale_meta))
+    hits = reader.search_hits(_unit(1), 100)
+    assert reader._count > reader._matrix.shape[0]
+    assert {hit.id for hit in hits} <= {f"v{i}" for i in range(1000)} | {f"w{i}" for i in range(24)}
+    assert all(np.isfinite(hit.score) for hit in hits)
+    assert len(reader.search_hits(_unit(1), 100, SearchFilter(file_names=None))) == 100
+
+
+def test_log_is_compacted(path, monkeypatch):
+    monkeypatch.setattr(LocalVectorStore, "_COMPACT_MIN_ENTRIES", 10)
+    store, reader = LocalVectorStore(path), LocalVectorStore(path)
+    store.upsert_vectors(["a", "b"], [_unit(0), _unit(1)], [{"n": 0}, {"n": 0}])
+    assert len(reader.search_hits(_unit(0), 5)) == 2
+    for n in range(1, 50):
+        store.set_payloads(["a"], [{"n": n}])
+    store.delete_vectors(["b"])
+    with open(store._log_path()) as f:
+        assert sum(1 for _ in f) <= 10
+    assert reader.get_payloads(["a", "b"]) == {"a": {"n": 49}}
+    assert LocalVectorStore(path).get_payloads(["a"]) == {"a": {"n": 49}}
+
+
+def test_chunk_text_search_wrappers(path, monkeypatch):
+    async def agenerate_embeddings(texts, model=None):
+        return [_unit(1) for _ in texts]
+
+    monkeypatch.setattr(vector_store, "generate_embeddings", lambda texts, model=None: [_unit(0) for _ in texts])
+    monkeypatch.setattr(vector_store, "agenerate_embeddings", agenerate_embeddings)
+    store = LocalVectorStore(path)
+    store.upsert_vectors(["a", "b"], [_unit(0), _unit(1)], [{"chunk": "A"}, {"chunk": "B"}])
+    assert store.search_by_vector(_unit(1), 1) == ["B"]
+    assert store.semantic_search("query", 1) == ["A"]
+    assert asyncio.run(store.asearch_by_vector(_unit(0), 2)) == ["A", "B"]
+    assert asyncio.run(store.asemantic_search("query", 1)) == ["B"]
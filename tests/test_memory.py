@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from core.memory import RedisChatMemory, decode_message, encode_message
+
+
+@pytest.fixture
+def memory():
+    server = fakeredis.FakeServer()
+    memory = RedisChatMemory(redis_url="redis://fake", max_turns=2, ttl=60)
+    memory._redis = fakeredis.FakeRedis(server=server)
+    memory._aredis = fakeredis.FakeAsyncRedis(server=server)
+    return memory
+
+
+def test_binary_and_json_encodings_round_trip():
+    for role in ("user", "assistant", "system", "tool"):
+        assert decode_message(encode_message(role, "héllo {}")) == {"role": role, "content": "héllo {}"}
+    legacy = json.dumps({"role": "user", "content": "hi"}).encode("utf-8")
+    assert decode_message(legacy) == {"role": "user", "content": "hi"}
+    assert decode_message(b"") is None and decode_message(b"not json") is None
+
+
+def test_reads_both_encodings_from_one_list(memory):
+    memory._redis.rpush(memory._history_key("s"), json.dumps({"role": "user", "content": "old"}))
+    memory.append_message("s", "assistant", "new")
+    expected = [{"role": "user", "content": "old"}, {"role": "assistant", "content": "new"}]
+    assert memory.get_history("s") == expected
+    assert asyncio.run(memory.aget_history("s")) == expected
+
+
+def test_limit_returns_the_newest_messages(memory):
+    memory.append_messages("s", [{"role": "user", "content": str(i)} for i in range(3)])
+    assert [m["content"] for m in memory.get_history("s", limit=2)] == ["1", "2"]
+    assert [m["content"] for m in asyncio.run(memory.aget_history("s", limit=1))] == ["2"]
+    assert [m["content"] for m in memory.get_last_n("s", 2)] == ["1", "2"]
+    assert memory.get_last_n("s", 0) == []
+
+
+def test_list_is_trimmed_to_the_cap(memory):
+    messages = [{"role": "user", "content": str(i)} for i in range(3)]
+    memory.append_messages("s", messages)
+    asyncio.run(memory.aappend_messages("s", messages))
+    # max_turns=2 keeps the newest 4 messages
+    assert [m["content"] for m in memory.get_history("s")] == ["2", "0", "1", "2"]
+
+
+def test_append_refreshes_the_ttl(memory):
+    history_key, summary_key = memory._history_key("s"), memory._summary_key("s")
+    memory._redis.set(summary_key, "summary")
+    memory.append_message("s", "user", "hi")
+    assert 0 < memory._redis.ttl(history_key) <= 60 and 0 < memory._redis.ttl(summary_key) <= 60
+    memory._redis.expire(history_key, 5)
+    memory._redis.expire(summary_key, 5)
+    asyncio.run(memory.aappend_messages("s", [{"role": "assistant", "content": "hello"}]))
+    assert memory._redis.ttl(history_key) > 5 and memory._redis.ttl(summary_key) > 5
+
+
+def test_compact_folds_the_oldest_messages_into_the_summary(memory):
+    messages = [{"role": "user", "content": str(i)} for i in range(4)]
+    memory.append_messages("s", messages)
+
+    async def summarize(summary, oldest):
+        return f"{summary}+" + ",".join(m["content"] for m in oldest)
+
+    asyncio.run(memory.acompact("s", messages[:2], 2, "before", summarize))
+    assert asyncio.run(memory.aget_summary("s")) == "before+0,1"
+    assert [m["content"] for m in memory.get_history("s")] == ["2", "3"]
+    assert 0 < memory._redis.ttl(memory._summary_key("s")) <= 60
@@ -0,0 +1,84 @@
+import re
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.testclient import TestClient
+
+from core import metrics
+from core.metrics import MetricsMiddleware, counter, histogram, timed
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{(.*)\})? (\S+)$')
+
+
+def _parse(text: str):
+    """ Samples of a Prometheus text exposition, checking every metric is declared before its samples """
+    types, samples = {}, []
+    for line in text.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split(" ")
+            types[name] = kind
+            continue
+        match = SAMPLE.match(line)
+        assert match, f"not an exposition line: {line!r}"
+        name, _, labels, value = match.groups()
+        base = name if name in types else re.sub(r"_(bucket|sum|count)$", "", name)
+        assert base in types, f"{name} has no TYPE line"
+        samples.append((name, dict(re.findall(r'(\w+)="([^"]*)"', labels or "")), float(value)))
+    return types, samples
+
+
+def _app(server_timing: bool) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, server_timing=server_timing)
+
+    @app.get("/work")
+    def work():
+        with timed("prompt"):
+            pass
+        return {"ok": True}
+
+    @app.get("/metrics")
+    def scrape():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    return app
+
+
+def test_exposition_parses(monkeypatch):
+    monkeypatch.setattr(metrics, "_metrics", [])
+    monkeypatch.setattr(metrics, "_collectors", [])
+    hits = counter("test_hits_total", "Hits", ("kind",))
+    latency = histogram("test_latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    hits.inc(2, "a")
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value, "embed")
+    metrics.register_collector(lambda: ["# TYPE test_cache_items gauge", "test_cache_items 3"])
+
+    types, samples = _parse(metrics.render())
+    assert types == {"test_hits_total": "counter", "test_latency_seconds": "histogram", "test_cache_items": "gauge"}
+    assert ("test_hits_total", {"kind": "a"}, 2.0) in samples
+    buckets = [(labels["le"], value) for name, labels, value in samples if name == "test_latency_seconds_bucket"]
+    assert buckets == [("0.1", 1.0), ("1.0", 2.0), ("+Inf", 3.0)]
+    assert ("test_latency_seconds_count", {"stage": "embed"}, 3.0) in samples
+    assert ("test_latency_seconds_sum", {"stage": "embed"}, 5.55) in samples
+    assert ("test_cache_items", {}, 3.0) in samples
+
+
+def test_requests_are_timed_by_route_and_listed_in_server_timing():
+    client = TestClient(_app(server_timing=True))
+    response = client.get("/work")
+    stages = [entry.split(";dur=") for entry in response.headers["server-timing"].split(", ")]
+    assert [name for name, _ in stages] == ["prompt", "total"]
+    assert all(float(duration) >= 0 for _, duration in stages)
+
+    _, samples = _parse(client.get("/metrics").text)
+    assert any(name == "rag_http_request_seconds_count" and labels == {"method": "GET", "route": "/work", "status": "200"}
+               for name, labels, _ in samples)
+    assert any(name == "rag_stage_seconds_count" and labels == {"stage": "prompt"} for name, labels, _ in samples)
+
+
+def test_server_timing_is_off_unless_enabled():
+    response = TestClient(_app(server_timing=False)).get("/work")
+    assert response.status_code == 200 and "server-timing" not in response.headers
@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from core import crud, models
+from core.database import Base
+from core.neighbors import context_chunk_ids, merge_windows
+from core.vector_store import SearchHit
+
+# 8 chunks of 10 characters, each overlapping the previous one by 2
+TEXT = "".join(chr(ord("a") + i % 26) for i in range(66))
+SPANS = [(8 * i, 8 * i + 10) for i in range(8)]
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all(
+            models.DocumentMetadata(file_name="a.txt", chunk_text=TEXT[start:end], chunk_index=i, vector_id=f"a{i}",
+                                    chunk_strategy="fixed", additional_metadata={"start": start, "end": end})
+            for i, (start, end) in enumerate(SPANS)
+        )
+        # Spans unknown: stitched with newlines
+        db.add_all(
+            models.DocumentMetadata(file_name="b.txt", chunk_text=f"b{i}", chunk_index=i, vector_id=f"b{i}",
+                                    chunk_strategy="fixed")
+            for i in range(3)
+        )
+        db.commit()
+        yield db
+
+
+def _hits(*ids):
+    return [SearchHit(vector_id, 1.0 - 0.1 * i, {"chunk": "hit", "file_name": vector_id[0] + ".txt"})
+            for i, vector_id in enumerate(ids)]
+
+
+def _expand(db, hits, window):
+    return merge_windows(hits, crud.get_chunk_neighbors(db, [hit.id for hit in hits], window))
+
+
+def test_overlapping_windows_are_sent_once(db):
+    [window] = _expand(db, _hits("a3", "a2"), 1)
+    assert window.id == "a3" and window.score == 1.0
+    assert window.payload["chunk_ids"] == ["a1", "a2", "a3", "a4"]
+    assert window.payload["chunk"] == TEXT[8:42]
+    assert (window.payload["chunk_index"], window.payload["start"], window.payload["end"]) == (1, 8, 42)
+
+
+def test_adjacent_windows_merge(db):
+    [window] = _expand(db, _hits("a4", "a1"), 1)
+    assert window.id == "a4"
+    assert window.payload["chunk_ids"] == [f"a{i}" for i in range(6)]
+    assert window.payload["chunk"] == TEXT[0:50]
+
+
+def test_disjoint_windows_keep_hit_order_and_stop_at_document_edges(db):
+    first, last = _expand(db, _hits("a7", "a0"), 2)
+    assert first.id == "a7" and first.payload["chunk_ids"] == ["a5", "a6", "a7"]
+    assert first.payload["chunk"] == TEXT[40:66]
+    assert last.id == "a0" and last.payload["chunk_ids"] == ["a0", "a1", "a2"]
+    assert last.payload["chunk"] == TEXT[0:26]
+    assert context_chunk_ids([first, last]) == ["a5", "a6", "a7", "a0", "a1", "a2"]
+
+
+def test_unknown_spans_and_unstored_hits(db):
+    stitched, unstored = _expand(db, _hits("b1", "zz"), 1)
+    assert stitched.payload["chunk"] == "b0\nb1\nb2"
+    assert unstored == _hits("b1", "zz")[1]
+    assert context_chunk_ids([unstored]) == ["zz"]
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from core import crud, models
+from core.database import Base
+from core.pagination import decode_cursor, encode_cursor, json_array, paginate
+
+
+def test_cursor_round_trip():
+    key = (datetime(2026, 5, 1, 9, 30), 42)
+    cursor = encode_cursor(key)
+    assert "=" not in cursor
+    assert decode_cursor(cursor, (datetime, int)) == key
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", encode_cursor([1]), encode_cursor(["x", 1])])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, (int, int))
+
+
+def test_paginate_uses_the_extra_row():
+    rows = [(i,) for i in range(4)]
+    assert paginate(rows[:3], 3, key=lambda row: row) == (rows[:3], None)
+    page, cursor = paginate(rows, 3, key=lambda row: row)
+    assert page == rows[:3] and decode_cursor(cursor, (int,)) == (2,)
+
+
+def test_json_array_streams_pages():
+    body = b"".join(json_array([[{"a": 1}], [], [{"a": 2}, {"a": 3}]]))
+    assert body == b'[{"a": 1},{"a": 2},{"a": 3}]'
+    assert b"".join(json_array([])) == b"[]"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_booking_keyset_pages(db):
+    start = datetime(2026, 1, 1)
+    for i in range(25):
+        # Pairs of bookings share a date, so the id breaks ties
+        db.add(models.InterviewBooking(name=f"n{i}", email="a@b.c" if i % 2 else "x@y.z",
+                                       interview_date=start + timedelta(days=(24 - i) // 2), time_slot="10:00"))
+    db.commit()
+    expected = [(row.interview_date, row.id) for row in crud.get_bookings(db)]
+    assert expected == sorted(expected)
+
+    seen, after = [], None
+    while True:
+        page = crud.get_bookings(db, limit=4, after=after)
+        seen += [(row.interview_date, row.id) for row in page]
+        if len(page) < 4:
+            break
+        after = (page[-1].interview_date, page[-1].id)
+    assert seen == expected
+
+    exported = [row for batch in crud.iter_bookings(db, email="a@b.c", batch_size=5) for row in batch]
+    assert [row.id for row in exported] == [row.id for row in crud.get_bookings(db, email="a@b.c")]
+    assert all(row.email == "a@b.c" for row in exported)
+
+
+def test_document_chunk_keyset_pages(db):
+    vector_ids = [f"v{i}" for i in range(10)]
+    crud.save_document_metadata(db, "a.txt", [f"chunk {i}" for i in range(10)], vector_ids, "fixed")
+    crud.save_document_metadata(db, "b.txt", ["other"], ["w0"], "fixed")
+    db.commit()
+
+    first = crud.get_document_chunks(db, "a.txt", limit=4)
+    rest = crud.get_document_chunks(db, "a.txt", after=(first[-1].chunk_index, first[-1].id))
+    assert [row.vector_id for row in first + rest] == vector_ids
+    batches = list(crud.iter_document_chunks(db, "a.txt", batch_size=3))
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+
+
+class _RecordingConnection:
+    def __init__(self, invalid):
+        self.invalid, self.statements = invalid, []
+
+    def execution_options(self, **options):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def exec_driver_sql(self, sql):
+        self.statements.append(sql)
+        return [(name,) for name in self.invalid] if "indisvalid" in sql else []
+
+
+def test_create_indexes_rebuilds_invalid_postgres_indexes(monkeypatch):
+    from types import SimpleNamespace
+
+    from sqlalchemy.dialects import postgresql
+
+    from core import database
+
+    connection = _RecordingConnection(["ix_interview_booking_date"])
+    engine = SimpleNamespace(dialect=postgresql.dialect(), connect=lambda: connection)
+    monkeypatch.setattr(database, "engine", engine)
+    database.create_indexes()
+    creates = [sql for sql in connection.statements if sql.startswith("CREATE")]
+    drops = [sql for sql in connection.statements if sql.startswith("DROP")]
+    assert creates and all("INDEX CONCURRENTLY IF NOT EXISTS" in sql for sql in creates)
+    assert drops == ['DROP INDEX CONCURRENTLY IF EXISTS "ix_interview_booking_date"']
+    rebuild = connection.statements.index(drops[0])
+    assert "ix_interview_booking_date" in connection.statements[rebuild + 1]
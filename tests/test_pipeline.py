@@ -0,0 +1,92 @@
+import uuid
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from core import crud, pipeline
+from core.chunking import Chunk
+from core.database import Base
+from core.lexical_index import BM25Index
+from core.pipeline import chunk_vector_ids, ingest_chunks, ingest_file
+from core.utils.txt import txt_extract_blocks
+from core.vector_store import LocalVectorStore
+
+
+def _ids(texts, namespace="a.txt"):
+    return [vector_id for _, _, vector_id in chunk_vector_ids((Chunk(text, 0, len(text)) for text in texts), namespace)]
+
+
+def test_vector_ids_derive_from_file_and_text():
+    ids = _ids(["one", "two", "one"])
+    assert all(uuid.UUID(vector_id).version == 5 for vector_id in ids)
+    assert ids == _ids(["one", "two", "one"])  # stable across runs
+    assert len(set(ids)) == 3  # a repeated text gets its own id
+    assert _ids(["two", "one"])[:2] == [ids[1], ids[0]]  # moved chunks keep their id
+    assert _ids(["one"], namespace="b.txt") != ids[:1]
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    embedded = []
+
+    def generate_embeddings(texts, model=None):
+        embedded.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    monkeypatch.setattr(pipeline, "generate_embeddings", generate_embeddings)
+    monkeypatch.setattr(pipeline, "lexical_index", BM25Index(str(tmp_path / "lexical.sqlite3")))
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        yield tmp_path, db, LocalVectorStore(str(tmp_path / "vectors")), embedded
+
+
+def _ingest(tmp_path, db, store, text):
+    path = tmp_path / "doc.txt"
+    path.write_text(text)
+    stats = ingest_file(str(path), "doc.txt", "semantic", store, db)
+    db.commit()
+    return stats
+
+
+def test_reingest_embeds_only_changed_chunks(env):
+    tmp_path, db, store, embedded = env
+    # Each paragraph is one semantic chunk
+    paragraphs = [f"Paragraph {i}. " + "word " * 120 for i in range(5)]
+    first = _ingest(tmp_path, db, store, "\n\n".join(paragraphs))
+    assert first["new_chunks"] == first["total_chunks"] == len(embedded) == 5
+
+    assert _ingest(tmp_path, db, store, "\n\n".join(paragraphs))["skipped"]
+
+    embedded.clear()
+    changed = ["A new opening paragraph. " + "text " * 120] + paragraphs[:3]
+    second = _ingest(tmp_path, db, store, "\n\n".join(changed))
+    assert embedded == changed[:1]
+    assert (second["total_chunks"], second["new_chunks"], second["unchanged_chunks"]) == (4, 1, 3)
+    assert (second["deleted_chunks"], second["moved_chunks"]) == (2, 3)
+
+    rows = crud.get_document_chunks(db, "doc.txt")
+    assert [row.chunk_index for row in rows] == list(range(second["total_chunks"]))
+    assert {hit.id for hit in store.search_hits([1.0, 0.0], 100)} == {row.vector_id for row in rows}
+
+
+def test_txt_blocks_rebuild_the_file(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("héllo wörld\n" * 1000, encoding="utf-8")
+    blocks = list(txt_extract_blocks(str(path), block_size=1000))
+    assert len(blocks) > 1 and "".join(blocks) == path.read_text(encoding="utf-8")
+
+
+def test_ingest_chunks_reports_batches_in_document_order(env):
+    tmp_path, _, store, embedded = env
+    texts = [f"chunk number {i}" for i in range(300)]
+    chunks = (Chunk(text, 20 * i, 20 * i + len(text)) for i, text in enumerate(texts))
+    batches = []
+    stats = ingest_chunks(chunks, store, on_batch=lambda indices, batch, ids: batches.append(indices),
+                          payload={"file_name": "doc.txt"}, max_in_flight=2)
+    assert len(batches) > 1
+    assert [index for batch in batches for index in batch] == list(range(300))
+    assert sorted(embedded) == sorted(texts)
+    assert stats["vector_ids"] == _ids(texts, "doc.txt")
+    assert stats["new_chunks"] == stats["total_chunks"] == 300
@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+from core import llm, prompt
+from core.prompt import MESSAGE_OVERHEAD_TOKENS, build_prompt
+from routers import rag
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """ One token per word, so the budgets below are easy to count """
+    monkeypatch.setattr(prompt, "count_tokens", lambda text, model=None: len(text.split()))
+
+
+def _history(n: int):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "word " * 8}
+            for i in range(n)]
+
+
+def _fixed_tokens(usage):
+    return usage["system"] + usage["summary"] + usage["query"]
+
+
+def test_every_part_fits_the_budget():
+    context = ["chunk " * 30 for _ in range(10)]
+    messages, usage = build_prompt("what is it", context, _history(20), summary="earlier " * 10, budget=300,
+                                   context_share=0.5)
+    assert usage["total"] <= 300
+    assert usage["total"] == _fixed_tokens(usage) + usage["history"] + usage["context"]
+    assert usage["history_dropped"] > 0 and usage["context_dropped"] > 0
+    # system, summary, kept history, then the query with its context
+    assert messages[0]["content"] == prompt.SYSTEM_PROMPT
+    assert messages[1]["content"].endswith("earlier " * 9 + "earlier ")
+    assert len(messages) == 2 + usage["history_messages"] + 1
+    assert messages[-1]["content"].endswith("Query: what is it")
+
+
+def test_context_is_capped_at_its_share_when_history_competes():
+    context = ["chunk " * 30 for _ in range(10)]
+    _, usage = build_prompt("q", context, _history(40), budget=400, context_share=0.5)
+    remaining = 400 - _fixed_tokens(usage)
+    assert usage["context"] <= remaining * 0.5
+    assert usage["context_chunks"] == int(remaining * 0.5) // 31
+    assert usage["history_messages"] > 0
+
+
+def test_context_takes_what_history_leaves_unused():
+    context = ["chunk " * 30 for _ in range(10)]
+    _, usage = build_prompt("q", context, [], budget=300, context_share=0.5)
+    remaining = 300 - _fixed_tokens(usage)
+    assert usage["context_chunks"] == remaining // 31
+    assert usage["context"] > remaining * 0.5
+
+
+def test_oldest_history_is_dropped_first():
+    history = _history(20)
+    messages, usage = build_prompt("q", [], history, budget=150, context_share=0.5)
+    kept = usage["history_messages"]
+    assert 0 < kept < len(history)
+    assert usage["history_dropped"] == len(history) - kept
+    assert messages[1:1 + kept] == history[-kept:]
+    assert usage["history"] == kept * (10 + MESSAGE_OVERHEAD_TOKENS)
+
+
+class FakeMemory:
+    max_messages = 20
+
+    def __init__(self):
+        self.appended = []
+        self.compactions = []
+
+    async def aappend_messages(self, session_id, messages):
+        self.appended.extend(messages)
+
+    async def acompact(self, session_id, oldest, keep_last, summary, summarize):
+        self.compactions.append((session_id, oldest, keep_last, summary))
+
+
+def test_history_that_overflows_the_budget_goes_to_the_summarizer():
+    memory = FakeMemory()
+    history = _history(8)
+    _, usage = build_prompt("q", [], history, summary="before", budget=100, context_share=0.5)
+    assert usage["history_dropped"] > 0
+
+    async def save():
+        await rag._save_turn(memory, rag.ChatRequest(user_id="u1", query="q"), "answer", history, "before", usage)
+        await asyncio.gather(*rag._background_tasks)
+
+    asyncio.run(save())
+    assert memory.appended[-1] == {"role": "assistant", "content": "answer"}
+    [(session_id, oldest, keep_last, summary)] = memory.compactions
+    n_oldest = max(usage["history_dropped"], len(history) // 2)
+    assert (session_id, oldest, keep_last, summary) == ("u1", history[:n_oldest], len(history) + 2 - n_oldest, "before")
+
+
+def test_history_that_fits_is_not_summarized():
+    memory = FakeMemory()
+    history = _history(4)
+    _, usage = build_prompt("q", [], history, budget=1000)
+    asyncio.run(rag._save_turn(memory, rag.ChatRequest(user_id="u1", query="q"), "answer", history, None, usage))
+    assert memory.compactions == [] and len(memory.appended) == 2
+
+
+def test_answer_helpers_build_a_budgeted_prompt(monkeypatch):
+    sent = []
+
+    async def acomplete(messages):
+        sent.append(messages)
+        return "answer"
+
+    monkeypatch.setattr(llm, "acomplete", acomplete)
+    history = [{"role": "user", "content": "earlier"}]
+    assert asyncio.run(llm.agenerate_answer("q", ["chunk"], history, summary="before")) == "answer"
+    assert sent[0] == build_prompt("q", ["chunk"], history, summary="before")[0]
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+
+from core import qdrant_client
+from core.clients import clients
+from core.qdrant_client import QdrantClientWrapper, ensure_payload_indexes, init_collection, store_embeddings
+from core.vector_store import SearchFilter
+
+VECTORS = {
+    "00000000-0000-0000-0000-000000000001": [1.0, 0.0, 0.0, 0.0],
+    "00000000-0000-0000-0000-000000000002": [0.9, 0.1, 0.0, 0.0],
+    "00000000-0000-0000-0000-000000000003": [0.0, 0.0, 1.0, 0.0],
+}
+
+
+def _payload(i: int) -> dict:
+    return {"chunk": f"chunk {i}", "file_name": "a.txt" if i < 2 else "b.txt", "chunk_index": i}
+
+
+def _points():
+    return [models.PointStruct(id=vector_id, vector=vector, payload=_payload(i))
+            for i, (vector_id, vector) in enumerate(VECTORS.items())]
+
+
+def test_search_hits_in_memory():
+    client = QdrantClient(":memory:")
+    init_collection(vector_size=4, client=client, quantization="none")
+    ensure_payload_indexes(client)
+    client.upsert("documents", points=_points(), wait=True)
+    store = QdrantClientWrapper(client=client, async_client=AsyncQdrantClient(":memory:"))
+
+    hits = store.search_hits([1.0, 0.0, 0.0, 0.0], top_k=2)
+    assert [hit.id for hit in hits] == list(VECTORS)[:2]
+    assert hits[0].payload["chunk"] == "chunk 0"
+    assert hits[0].score > hits[1].score
+
+    filtered = store.search_hits([1.0, 0.0, 0.0, 0.0], top_k=3, search_filter=SearchFilter(file_names=["b.txt"]))
+    assert [hit.payload["file_name"] for hit in filtered] == ["b.txt"]
+
+    with_vectors = store.search_hits([1.0, 0.0, 0.0, 0.0], top_k=1, with_vectors=True)
+    assert len(with_vectors[0].vector) == 4
+
+
+def test_asearch_hits_in_memory():
+    async def run():
+        async_client = AsyncQdrantClient(":memory:")
+        await async_client.create_collection(
+            "documents", vectors_config=models.VectorParams(size=4, distance=models.Distance.COSINE)
+        )
+        await async_client.upsert("documents", points=_points(), wait=True)
+        store = QdrantClientWrapper(client=QdrantClient(":memory:"), async_client=async_client)
+        return await store.asearch_hits([0.0, 0.0, 1.0, 0.0], top_k=1)
+
+    hits = asyncio.run(run())
+    assert [hit.id for hit in hits] == list(VECTORS)[2:]
+    assert hits[0].payload["file_name"] == "b.txt"
+
+
+def test_init_collection_rejects_another_vector_size():
+    client = QdrantClient(":memory:")
+    init_collection(vector_size=4, client=client, quantization="none")
+    init_collection(vector_size=4, client=client, quantization="none")  # same size: left as it is
+
+    with pytest.raises(ValueError, match="stores 4-dimensional vectors but VECTOR_SIZE is 8"):
+        init_collection(vector_size=8, client=client, quantization="none")
+
+    init_collection(vector_size=8, recreate=True, client=client, quantization="none")
+    assert client.get_collection("documents").config.params.vectors.size == 8
+
+
+def test_single_point_and_legacy_store_helpers(monkeypatch):
+    client = QdrantClient(":memory:")
+    init_collection(vector_size=4, client=client, quantization="none")
+    store = QdrantClientWrapper(client=client, async_client=AsyncQdrantClient(":memory:"))
+    vector_id = list(VECTORS)[0]
+    store.upsert_vector(vector_id, VECTORS[vector_id], {"chunk": "one"})
+    assert store.get_payloads([vector_id]) == {vector_id: {"chunk": "one"}}
+
+    monkeypatch.setitem(clients._clients, "qdrant", client)
+    monkeypatch.setattr(qdrant_client, "generate_embeddings",
+                        lambda chunks, model=None: [[0.0, 1.0, 0.0, 0.0] for _ in chunks])
+    [stored_id] = store_embeddings(["two"], metadata={"file_name": "b.txt"})
+    assert store.get_payloads([stored_id]) == {stored_id: {"text": "two", "file_name": "b.txt"}}
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+
+from core.vector_store import SearchHit
+from routers import rag
+
+
+class FakeMemory:
+    def __init__(self):
+        self.reads = 0
+
+    async def aget_history(self, session_id):
+        self.reads += 1
+        return [{"role": "user", "content": "earlier"}]
+
+    async def aget_summary(self, session_id):
+        return "summary"
+
+
+class FakeLexicalIndex:
+    def __init__(self, results, started=None):
+        self.results = results
+        self.started = started
+
+    def search(self, query, top_k):
+        if self.started:
+            self.started.set()
+        return self.results[:top_k]
+
+
+class FakeVectorStore:
+    def __init__(self, hits, wait_for=None):
+        self.hits = hits
+        self.wait_for = wait_for
+
+    async def asearch_hits(self, query_vector, top_k, search_filter=None, with_vectors=False):
+        if self.wait_for:
+            # Only returns if the lexical search runs while this search is in flight
+            assert await asyncio.to_thread(self.wait_for.wait, 5)
+        return self.hits[:top_k]
+
+
+@pytest.fixture
+def embeddings(monkeypatch):
+    calls = []
+
+    async def agenerate_embeddings(texts, model=None):
+        calls.append(texts)
+        return [[1.0, 0.0] for _ in texts]
+
+    monkeypatch.setattr(rag, "agenerate_embeddings", agenerate_embeddings)
+    return calls
+
+
+def _retrieve(request, vector_store, memory):
+    return asyncio.run(rag._retrieve(request, vector_store, memory))
+
+
+def test_hybrid_runs_both_searches_concurrently(monkeypatch, embeddings):
+    started = threading.Event()
+    monkeypatch.setattr(rag, "lexical_index", FakeLexicalIndex([("l1", 2.0, "lexical")], started))
+    store = FakeVectorStore([SearchHit("v1", 0.9, {"chunk": "vector"})], wait_for=started)
+    memory = FakeMemory()
+    request = rag.ChatRequest(user_id="u1", query="what is the refund policy", retrieval_mode="hybrid",
+                              rerank="none", neighbor_window=0)
+    history, summary, hits, query_vector = _retrieve(request, store, memory)
+    assert {hit.id for hit in hits} == {"v1", "l1"}
+    assert (history, summary, query_vector, memory.reads) == ([{"role": "user", "content": "earlier"}], "summary",
+                                                              [1.0, 0.0], 1)
+
+
+def test_auto_fallback_to_hybrid_reads_memory_once(monkeypatch, embeddings):
+    monkeypatch.setattr(rag, "lexical_index", FakeLexicalIndex([]))
+    memory = FakeMemory()
+    request = rag.ChatRequest(user_id="u1", query="SKU-1234", retrieval_mode="auto", rerank="none", neighbor_window=0)
+    assert rag.is_keyword_query(request.query)
+    _, summary, hits, query_vector = _retrieve(request, FakeVectorStore([SearchHit("v1", 0.9, {"chunk": "x"})]),
+                                               memory)
+    assert [hit.id for hit in hits] == ["v1"] and query_vector == [1.0, 0.0]
+    assert memory.reads == 1 and embeddings == [["SKU-1234"]] and summary == "summary"
+
+
+def test_lexical_hits_skip_the_embedding(monkeypatch, embeddings):
+    monkeypatch.setattr(rag, "lexical_index", FakeLexicalIndex([("l1", 2.0, "lexical")]))
+    memory = FakeMemory()
+    request = rag.ChatRequest(user_id="u1", query="SKU-1234", retrieval_mode="auto", rerank="none", neighbor_window=0)
+    _, _, hits, query_vector = _retrieve(request, FakeVectorStore([]), memory)
+    assert [hit.id for hit in hits] == ["l1"] and query_vector is None
+    assert memory.reads == 1 and embeddings == []
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from core import prompt
+from core.answer_cache import AnswerCache
+from core.vector_store import SearchHit
+from routers import rag
+
+HITS = [SearchHit("p1", 0.9, {"chunk": "first"}), SearchHit("p2", 0.8, {"chunk": "second"})]
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """ Prompt budgeting without the tokenizer, which may need to download its vocabulary """
+    monkeypatch.setattr(prompt, "count_tokens", lambda text, model=None: len(text.split()))
+
+
+def _events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def _client(monkeypatch, tokens, fail=False):
+    saved = []
+
+    async def fake_retrieve(request, vector_store, chat_memory):
+        return [], None, HITS, [1.0, 0.0]
+
+    async def fake_stream(messages):
+        assert "first\n\nsecond" in messages[-1]["content"]
+        for token in tokens:
+            yield token
+        if fail:
+            raise RuntimeError("model went away")
+
+    async def fake_save_turn(chat_memory, request, answer, *args):
+        saved.append(answer)
+
+    monkeypatch.setattr(rag, "_retrieve", fake_retrieve)
+    monkeypatch.setattr(rag, "astream_completion", fake_stream)
+    monkeypatch.setattr(rag, "_save_turn", fake_save_turn)
+    monkeypatch.setattr(rag, "answer_cache", AnswerCache(max_items=4, ttl=60, threshold=0.9))
+    app = FastAPI()
+    app.include_router(rag.router)
+    app.dependency_overrides[rag.get_vector_store] = lambda: None
+    app.dependency_overrides[rag.get_chat_memory] = lambda: None
+    return TestClient(app), saved
+
+
+def test_stream_sends_context_then_tokens_then_done(monkeypatch):
+    client, saved = _client(monkeypatch, ["Hel", "lo"])
+    response = client.post("/rag/query/stream", json={"user_id": "u1", "query": "hi"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [event for event, _ in events] == ["context", "token", "token", "done"]
+    assert events[0][1]["chunk_ids"] == ["p1", "p2"]
+    assert events[0][1]["token_usage"]["context_chunks"] == 2 and not events[0][1]["cached"]
+    assert [data for _, data in events[1:]] == [{"text": "Hel"}, {"text": "lo"}, {}]
+    assert saved == ["Hello"]
+
+
+def test_stream_ends_with_error_and_saves_nothing(monkeypatch):
+    client, saved = _client(monkeypatch, ["Hel"], fail=True)
+    events = _events(client.post("/rag/query/stream", json={"user_id": "u1", "query": "hi"}).text)
+    assert [event for event, _ in events] == ["context", "token", "error"]
+    assert "model went away" in events[-1][1]["detail"]
+    assert saved == []
+
+
+def test_cached_answer_is_streamed_as_one_token(monkeypatch):
+    client, saved = _client(monkeypatch, ["Hel", "lo"])
+    client.post("/rag/query/stream", json={"user_id": "u1", "query": "hi"})
+    monkeypatch.setattr(rag, "astream_completion", None)  # the LLM is not called again
+    events = _events(client.post("/rag/query/stream", json={"user_id": "u2", "query": "hi"}).text)
+    assert events == [
+        ("context", {"chunk_ids": ["p1", "p2"], "token_usage": None, "cached": True}),
+        ("token", {"text": "Hello"}),
+        ("done", {}),
+    ]
+    assert saved == ["Hello", "Hello"]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from core.rerank import cosine_matrix, dedup_select, mmr_select, rerank_hits, vector_matrix
+from core.vector_store import SearchHit
+
+
+def _naive_mmr(relevance, similarity, k, lambda_mult):
+    picked, scores = [], []
+    for _ in range(min(k, len(relevance))):
+        best, best_score = None, -np.inf
+        for i in range(len(relevance)):
+            if i in picked:
+                continue
+            redundancy = max((similarity[i, j] for j in picked), default=0.0)
+            score = lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy
+            if score > best_score:
+                best, best_score = i, score
+        picked.append(best)
+        scores.append(best_score)
+    return picked, scores
+
+
+def test_cosine_matrix():
+    vectors = np.random.default_rng(0).normal(size=(6, 5)).astype(np.float32)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    assert np.allclose(cosine_matrix(vectors.copy()), unit @ unit.T, atol=1e-5)
+
+
+@pytest.mark.parametrize("lambda_mult", [0.0, 0.5, 0.7, 1.0])
+def test_mmr_select_matches_the_definition(lambda_mult):
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        vectors = rng.normal(size=(12, 8)).astype(np.float32)
+        similarity = cosine_matrix(vectors)
+        relevance = rng.uniform(0, 1, size=12).astype(np.float32)
+        picked, scores = mmr_select(relevance, similarity, 5, lambda_mult)
+        expected, expected_scores = _naive_mmr(relevance, similarity, 5, lambda_mult)
+        assert picked.tolist() == expected
+        assert np.allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_dedup_select_skips_overlaps_and_near_duplicates():
+    similarity = np.eye(4, dtype=np.float32)
+    similarity[0, 3] = similarity[3, 0] = 0.99
+    documents = np.array([0, 0, 1, 2])
+    starts, ends = np.array([0, 50, 60, 0]), np.array([100, 150, 160, 100])
+    # 1 overlaps 0 by half its span, 3 is a near-duplicate of 0; 2 is another document
+    assert dedup_select(similarity, documents, starts, ends, 3, max_overlap=0.4, max_similarity=0.95).tolist() == [0, 2]
+    assert dedup_select(similarity, documents, starts, ends, 3, max_overlap=0.6, max_similarity=0.95).tolist() == [0, 1, 2]
+
+
+def test_rerank_hits_drops_vectors():
+    hits = [
+        SearchHit("a", 0.9, {"file_name": "x", "start": 0, "end": 100}, [1.0, 0.0]),
+        SearchHit("b", 0.89, {"file_name": "x", "start": 0, "end": 100}, [1.0, 0.01]),
+        SearchHit("c", 0.5, {"file_name": "y", "start": 0, "end": 100}, [0.0, 1.0]),
+    ]
+    assert [hit.id for hit in rerank_hits(hits, 2, "dedup")] == ["a", "c"]
+    assert [hit.id for hit in rerank_hits(hits, 2, "mmr", lambda_mult=0.5)] == ["a", "c"]
+    assert [hit.id for hit in rerank_hits(hits, 2, "none")] == ["a", "b"]
+    assert all(hit.vector is None for hit in rerank_hits(hits, 3, "mmr"))
+    with pytest.raises(ValueError):
+        rerank_hits(hits, 2, "other")
+
+
+def test_vector_matrix_reads_lists_and_arrays_alike():
+    vectors = np.random.default_rng(2).normal(size=(5, 6))
+    as_lists = [SearchHit(str(i), 1.0, {}, vector.tolist()) for i, vector in enumerate(vectors)]
+    as_arrays = [SearchHit(str(i), 1.0, {}, vector.astype(np.float16)) for i, vector in enumerate(vectors)]
+    for dims in (0, 4, 10):
+        matrix = vector_matrix(as_lists, dims)
+        assert matrix.dtype == np.float32 and matrix.shape == (5, min(dims or 6, 6))
+        assert np.allclose(matrix, vectors[:, :dims or 6], atol=1e-6)
+        assert np.allclose(vector_matrix(as_arrays, dims), matrix, atol=1e-2)
+
+
+def test_default_compares_whole_vectors():
+    # Near-identical in their first two dimensions only: a truncated comparison drops the second chunk
+    hits = [
+        SearchHit("a", 0.9, {}, [1.0, 0.0, 1.0, 0.0]),
+        SearchHit("b", 0.8, {}, [1.0, 0.0, -1.0, 0.0]),
+    ]
+    assert [hit.id for hit in rerank_hits(hits, 2, "dedup")] == ["a", "b"]
+    assert [hit.id for hit in rerank_hits(hits, 2, "dedup", dims=2)] == ["a"]
@@ -0,0 +1,38 @@
+import pytest
+
+from core import tokens
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    """ tiktoken installed, but its vocabulary cannot be downloaded """
+    if tokens.tiktoken is None:
+        pytest.skip("tiktoken is not installed")
+
+    def fail(*args, **kwargs):
+        raise OSError("vocabulary download failed")
+
+    monkeypatch.setattr(tokens.tiktoken, "encoding_for_model", fail)
+    monkeypatch.setattr(tokens.tiktoken, "get_encoding", fail)
+    tokens._encoding.cache_clear()
+    yield
+    tokens._encoding.cache_clear()
+
+
+def test_falls_back_to_approximation_when_encoding_cannot_load(offline_tiktoken):
+    text = "Hello, world! Tokens: 42"
+    assert tokens.count_tokens(text) == 7
+    assert tokens.token_offsets(text) == [0, 5, 7, 12, 14, 20, 22]
+
+
+def test_failed_load_is_cached(offline_tiktoken, monkeypatch):
+    calls = []
+
+    def fail(*args, **kwargs):
+        calls.append(args)
+        raise OSError("vocabulary download failed")
+
+    monkeypatch.setattr(tokens.tiktoken, "encoding_for_model", fail)
+    for _ in range(3):
+        tokens.count_tokens("some text", model="text-embedding-3-small")
+    assert len(calls) == 1
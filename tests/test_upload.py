@@ -0,0 +1,83 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from core.utils.upload import spool_multipart_file, UploadError
+
+BOUNDARY = "testboundary"
+
+
+def _multipart(file_name: str, data: bytes, field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="chunk_strategy"\r\n\r\nsemantic\r\n'
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{file_name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        try:
+            spooled = await spool_multipart_file(request, path_for=lambda name: str(tmp_path / name),
+                                                 max_bytes=1024 * 1024, chunk_size=4096)
+        except UploadError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        return spooled._asdict()
+
+    return TestClient(app)
+
+
+def _post(client, body, **kwargs):
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    return client.post("/upload", content=body, headers=headers, **kwargs)
+
+
+def test_file_is_spooled_with_its_sha256(client, tmp_path):
+    data = os.urandom(50_000)
+    response = _post(client, _multipart("../doc.pdf", data))
+    assert response.status_code == 200
+    spooled = response.json()
+    assert spooled["file_name"] == "doc.pdf" and spooled["size"] == len(data)
+    assert spooled["content_hash"] == hashlib.sha256(data).hexdigest()
+    with open(spooled["path"], "rb") as f:
+        assert f.read() == data
+
+
+def test_oversize_content_length_is_refused_before_reading(client, tmp_path):
+    def body():
+        raise AssertionError("the body should not be read")
+        yield b""
+
+    headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", "Content-Length": str(2 * 1024 * 1024)}
+    response = client.post("/upload", content=body(), headers=headers)
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_oversize_stream_is_cut_off_and_removed(client, tmp_path):
+    body = _multipart("big.txt", b"x" * (2 * 1024 * 1024))
+    # Chunked, so there is no Content-Length to refuse up front
+    response = _post(client, (body[i:i + 65536] for i in range(0, len(body), 65536)))
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_missing_file_part(client):
+    response = _post(client, _multipart("doc.pdf", b"data", field="other"))
+    assert response.status_code == 400
+    assert "Missing file field" in response.json()["detail"]
+
+
+def test_wrong_extension_and_non_multipart(client):
+    assert _post(client, _multipart("doc.exe", b"data")).status_code == 400
+    response = client.post("/upload", content=b"data", headers={"Content-Type": "application/octet-stream"})
+    assert response.status_code == 400